@@ -0,0 +1,81 @@
+import hashlib
+import orjson
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+from fastapi.encoders import jsonable_encoder
+from metrics import Metrics
+
+class CachedResponse:
+    """A serialized response body with the generation it was built for"""
+    __slots__ = ("body", "etag", "generation", "built_at")
+
+    def __init__(self, body: bytes, generation: int, built_at: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        self.generation = generation
+        self.built_at = built_at
+
+class AnalyticsCache:
+    """LRU cache of serialized analytics responses.
+
+    Entries are keyed by (endpoint, commodity, timeframe, company), price
+    series also by their point limit. Analytics only change when the trade
+    history grows, so `invalidate` is registered
+    as a trade and history listener and bumps a generation counter; entries
+    built for an older generation are rebuilt on their next read. The
+    analytics windows also slide with the clock, so entries expire after
+    `max_age` seconds even without new trades.
+
+    The ETag is a hash of the body, so a rebuild that produces the same JSON
+    still answers If-None-Match with a 304.
+    """
+
+    def __init__(self, max_entries: int = 256, max_age: float = 60.0, metrics: Optional[Metrics] = None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.metrics = metrics
+        if metrics:
+            metrics.histogram("siphon_analytics_compute_seconds", "Time to compute and encode an analytics response on a cache miss")
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+
+    def invalidate(self, *args) -> None:
+        """Mark every entry stale; takes any arguments so it can be used as a listener"""
+        self.generation += 1
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> CachedResponse:
+        """Cached response for `key`, calling `build` and serializing its result on a miss"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation == self.generation and now - entry.built_at < self.max_age:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        body = orjson.dumps(jsonable_encoder(build()))
+        if self.metrics:
+            # Keys start with the endpoint name
+            self.metrics.observe("siphon_analytics_compute_seconds", time.monotonic() - now, endpoint=str(key[0]))
+        entry = self._entries[key] = CachedResponse(body, self.generation, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header value covers the given ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,108 @@
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from models import Trade, Amount, Price, Commodity, TradeType, TradeStatus
+from positions import PositionBook
+from price_aggregator import PriceAggregator
+from trading_logic import DUST
+from units import canonical_unit
+
+# How incoming orders are matched: immediately, or only when an auction runs
+MATCHING_MODES = ("continuous", "auction")
+
+def clearing_price(
+    bids: List[Tuple[float, float]],
+    asks: List[Tuple[float, float]],
+    reference: Optional[float] = None
+) -> Optional[Tuple[float, float]]:
+    """Uniform price and volume at which aggregated supply and demand intersect.
+
+    `bids` and `asks` are (price, amount) levels, best price first, as kept by
+    the order book. Demand at a price is the amount bid at or above it and
+    supply the amount offered at or below it; both are cumulative sums
+    evaluated at every limit price with a binary search, so the cost depends
+    on the number of levels rather than on pairs of orders. The price that
+    executes the most volume wins, then the one leaving the smallest
+    imbalance. Any price between the remaining candidates executes the same
+    volume, so the reference price is used when it lies between them and the
+    midpoint otherwise. Returns None when the book does not cross.
+    """
+    if not bids or not asks or bids[0][0] < asks[0][0]:
+        return None
+
+    bid_prices = np.array([price for price, _ in reversed(bids)])
+    ask_prices = np.array([price for price, _ in asks])
+    # Cumulative amounts from the best price outwards
+    demand_total = np.cumsum([amount for _, amount in bids])
+    supply_total = np.cumsum([amount for _, amount in asks])
+
+    candidates = np.unique(np.concatenate((bid_prices, ask_prices)))
+    candidates = candidates[(candidates >= ask_prices[0]) & (candidates <= bid_prices[-1])]
+    bids_at_or_above = len(bid_prices) - np.searchsorted(bid_prices, candidates, side="left")
+    asks_at_or_below = np.searchsorted(ask_prices, candidates, side="right")
+    demand = np.where(bids_at_or_above > 0, demand_total[np.maximum(bids_at_or_above - 1, 0)], 0.0)
+    supply = np.where(asks_at_or_below > 0, supply_total[np.maximum(asks_at_or_below - 1, 0)], 0.0)
+
+    volume = np.minimum(demand, supply)
+    best = volume >= volume.max() - DUST
+    imbalance = np.abs(demand - supply)
+    best &= imbalance <= imbalance[best].min() + DUST
+    low, high = candidates[best].min(), candidates[best].max()
+    if reference is not None and low <= reference <= high:
+        price = reference
+    else:
+        price = (low + high) / 2
+    return float(price), float(volume.max())
+
+
+class CallAuction:
+    """Uniform-price call auction over every order book.
+
+    Each run turns the companies' current surpluses and deficits (from the
+    position book) into orders at the commodity's reference price, the mean
+    of its latest hourly price bucket. Those orders and everything resting in
+    the books are then cleared at one price per commodity in a single pass.
+    Generated orders that are not filled are withdrawn again, so they never
+    pile up between runs.
+    """
+
+    def __init__(self, trading_system, position_book: Optional[PositionBook] = None, aggregator: Optional[PriceAggregator] = None):
+        self.trading_system = trading_system
+        self.position_book = position_book
+        self.aggregator = aggregator
+        trading_system.auction = self
+
+    def reference_prices(self) -> Dict[Commodity, float]:
+        prices = {}
+        for commodity in Commodity:
+            bucket = self.aggregator.latest(commodity) if self.aggregator else None
+            if bucket is not None:
+                prices[commodity] = bucket.mean
+        return prices
+
+    def orders(self, reference_prices: Dict[Commodity, float]) -> List[Trade]:
+        """An order for every open surplus (sell) and deficit (buy) of a commodity with a reference price"""
+        if self.position_book is None:
+            return []
+        orders = []
+        for company in self.trading_system.get_all_companies():
+            for commodity, amount in self.position_book.open_amounts(company, self.trading_system.trade_history).items():
+                price = reference_prices.get(commodity)
+                if price is None or abs(amount) <= DUST:
+                    continue
+                orders.append(Trade.model_construct(
+                    id=f"auction-{uuid.uuid4().hex[:12]}",
+                    commodity=commodity,
+                    type=TradeType.SELL if amount > 0 else TradeType.BUY,
+                    amount=Amount.model_construct(value=abs(amount), measurement_unit=canonical_unit(commodity)),
+                    price=Price.model_construct(value=price, currency="EUR"),
+                    status=TradeStatus.PENDING,
+                    time=None,
+                    requester_company=company.name,
+                    fulfiller_company=None
+                ))
+        return orders
+
+    def run(self) -> List[dict]:
+        reference_prices = self.reference_prices()
+        return self.trading_system.run_auction(self.orders(reference_prices), reference_prices)
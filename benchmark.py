@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from models import Commodity, TimeFrame
+from trading_system import TradingSystem
+from price_analytics import PriceAnalytics
+from price_aggregator import PriceAggregator
+from savings_calculator import SavingsCalculator
+from synthetic_data import generate_history, generate_orders, COMPANY_NAMES
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr)
+
+def _latency(durations: List[float]) -> dict:
+    """Latency summary in milliseconds"""
+    durations_ms = np.array(durations) * 1000
+    return {
+        "p50_ms": float(np.percentile(durations_ms, 50)),
+        "p99_ms": float(np.percentile(durations_ms, 99)),
+        "mean_ms": float(durations_ms.mean()),
+    }
+
+def _repeat(fn: Callable, repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def bench_matching(order_count: int, seed: int) -> dict:
+    """Orders through TradingSystem.add_trade one by one, and the same volume via add_trades"""
+    trading_system = TradingSystem()
+    orders = generate_orders(order_count, seed)
+    start = time.perf_counter()
+    for order in orders:
+        trading_system.add_trade(order)
+    elapsed = time.perf_counter() - start
+
+    batch_system = TradingSystem()
+    batch = generate_orders(order_count, seed + 1)
+    batch_start = time.perf_counter()
+    batch_system.add_trades(batch)
+    batch_elapsed = time.perf_counter() - batch_start
+
+    return {
+        "orders": order_count,
+        "orders_per_sec": order_count / elapsed,
+        "batch_orders_per_sec": order_count / batch_elapsed,
+        "history_rows": len(trading_system.trade_history),
+        "resting_orders": len(trading_system.get_offers()) + len(trading_system.get_requests()),
+    }
+
+def bench_aggregation(history, repeat: int) -> Tuple[dict, PriceAnalytics]:
+    """Folding a history into price buckets, then reading every chart window"""
+    price_analytics = PriceAnalytics()
+    start = time.perf_counter()
+    price_analytics.record_history(history)
+    elapsed = time.perf_counter() - start
+
+    def read_all():
+        for commodity in Commodity:
+            for timeframe in TimeFrame:
+                price_analytics.calculate_average_prices([], commodity, timeframe)
+
+    def read_year_downsampled():
+        for commodity in Commodity:
+            price_analytics.calculate_average_prices([], commodity, TimeFrame.YEAR, max_points=500)
+
+    return {
+        "rows_per_sec": len(history) / elapsed if elapsed else float("inf"),
+        "all_windows": _latency(_repeat(read_all, repeat)),
+        "year_500_points": _latency(_repeat(read_year_downsampled, repeat)),
+    }, price_analytics
+
+def bench_savings(history, price_analytics: PriceAnalytics, repeat: int) -> dict:
+    savings_calculator = SavingsCalculator(price_analytics)
+    results = {}
+    for timeframe in TimeFrame:
+        results[timeframe.value] = _latency(_repeat(
+            lambda: savings_calculator.calculate_savings(history, timeframe), repeat
+        ))
+    results["company_1y"] = _latency(_repeat(
+        lambda: savings_calculator.calculate_savings(history, TimeFrame.YEAR, COMPANY_NAMES[0]), repeat
+    ))
+    return results
+
+def bench_history(history, repeat: int) -> dict:
+    """Index build plus paginated, filtered history queries"""
+    trading_system = TradingSystem()
+    start = time.perf_counter()
+    trading_system.restore_history(history)
+    index_seconds = time.perf_counter() - start
+
+    return {
+        "index_build_s": index_seconds,
+        "latest_page": _latency(_repeat(
+            lambda: trading_system.query_trade_history_json(limit=100, descending=True), repeat
+        )),
+        "company_commodity_page": _latency(_repeat(
+            lambda: trading_system.query_trade_history_json(
+                limit=100, company=COMPANY_NAMES[1], commodity=Commodity.GAS
+            ), repeat
+        )),
+    }
+
+async def _asgi_request(app, method: str, path: str, body: bytes = b"") -> int:
+    """Call an ASGI app directly, without sockets, and return the status code"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"benchmark"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    received = False
+    status = 0
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def _load_test(app, requests: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    orders = iter(generate_orders(requests, seed + 2))
+    mix = [
+        ("GET", "/trades/history?limit=100&order=desc"),
+        ("GET", "/trades/offers"),
+        ("GET", "/trades/requests"),
+        ("GET", "/trades/matching/Electricity"),
+        ("GET", "/analytics/prices/electricity/7d"),
+        ("GET", "/analytics/market-prices/gas/30d"),
+        ("GET", "/analytics/savings/30d"),
+        ("POST", "/trades"),
+    ]
+    plan = [rng.choice(mix) for _ in range(requests)]
+    durations: Dict[str, List[float]] = {f"{method} {path}": [] for method, path in mix}
+    errors = 0
+    queue = iter(plan)
+
+    async def client():
+        nonlocal errors
+        for method, path in queue:
+            body = next(orders).model_dump_json().encode() if method == "POST" else b""
+            start = time.perf_counter()
+            status = await _asgi_request(app, method, path, body)
+            durations[f"{method} {path}"].append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+            # Without sockets a request may never suspend; yield like a real
+            # client would so queued commands are not starved
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "requests_per_sec": requests / elapsed,
+        "errors": errors,
+        "endpoints": {name: _latency(values) for name, values in durations.items() if values},
+    }
+
+def bench_api(history, requests: int, concurrency: int, seed: int) -> dict:
+    """In-process load test of the FastAPI app over the synthetic history"""
+    # The app prints LED animations and startup timings; keep stdout for results
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        main.price_analytics.aggregator = PriceAggregator()
+        main.trading_system.restore_history(history)
+
+        async def run():
+            await main.app.router.startup()
+            try:
+                return await _load_test(main.app, requests, concurrency, seed)
+            finally:
+                await main.app.router.shutdown()
+
+        return asyncio.run(run())
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+def _flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Metrics that got worse than the baseline by more than `tolerance` (a fraction).
+
+    Throughput metrics end in _per_sec and should not drop; median latencies
+    and durations end in p50_ms or _s and should not grow. Tail latencies
+    are reported but too noisy to gate on.
+    """
+    old = _flatten(baseline["results"])
+    new = _flatten(current["results"])
+    regressions = []
+    for name, old_value in old.items():
+        new_value = new.get(name)
+        if new_value is None or not old_value:
+            continue
+        if name.endswith("_per_sec"):
+            change = (old_value - new_value) / old_value
+        elif name.endswith("p50_ms") or name.endswith("_s"):
+            change = (new_value - old_value) / old_value
+        else:
+            continue
+        if change > tolerance:
+            regressions.append(f"{name}: {old_value:.4g} -> {new_value:.4g} ({change:+.0%})")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark matching, analytics and the API")
+    parser.add_argument("--scale", type=float, default=1e5, help="synthetic history size, 1e3 to 1e7")
+    parser.add_argument("--orders", type=int, default=20000, help="orders for the matching benchmark")
+    parser.add_argument("--requests", type=int, default=2000, help="requests for the API load test")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=20, help="repetitions per latency measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=["matching", "aggregation", "savings", "history", "api"])
+    parser.add_argument("--output", type=Path, help="write the JSON results here as well as to stdout")
+    parser.add_argument("--compare", type=Path, help="baseline results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression as a fraction")
+    args = parser.parse_args()
+
+    selected = set(args.only or ["matching", "aggregation", "savings", "history", "api"])
+    size = int(args.scale)
+    results = {}
+
+    _log(f"Generating {size} historical trades")
+    start = time.perf_counter()
+    history = generate_history(size, args.seed)
+    results["generate_history_s"] = time.perf_counter() - start
+
+    if "matching" in selected:
+        _log(f"Matching {args.orders} orders")
+        results["matching"] = bench_matching(args.orders, args.seed)
+    if selected & {"aggregation", "savings"}:
+        _log("Aggregating prices")
+        results["aggregation"], price_analytics = bench_aggregation(history, args.repeat)
+        if "savings" in selected:
+            _log("Calculating savings")
+            results["savings"] = bench_savings(history, price_analytics, args.repeat)
+    if "history" in selected:
+        _log("Querying history")
+        results["history"] = bench_history(history, args.repeat)
+    if "api" in selected:
+        _log(f"Load testing the API with {args.requests} requests")
+        results["api"] = bench_api(history, args.requests, args.concurrency, args.seed)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "scale": size,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output)
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), report, args.tolerance)
+        for regression in regressions:
+            _log(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
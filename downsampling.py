@@ -0,0 +1,37 @@
+import numpy as np
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of at most `points` samples that keep the shape of a series.
+
+    Largest-Triangle-Three-Buckets: the first and last samples are kept, the
+    rest are split into `points - 2` equal buckets and from each bucket the
+    sample forming the largest triangle with the previously kept sample and
+    the mean of the next bucket is kept. Peaks and troughs survive, unlike
+    with plain averaging or striding. `x` must be sorted.
+    """
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points <= 2:
+        return np.array([0, n - 1][:max(points, 1)])
+
+    # Bucket i covers samples [edges[i], edges[i + 1]); the first and last
+    # samples are buckets of their own
+    edges = np.arange(points - 1, dtype=np.int64) * (n - 2) // (points - 2) + 1
+    edges[-1] = n - 1
+    counts = np.diff(np.append(edges, n))
+    mean_x = np.add.reduceat(x, edges) / counts
+    mean_y = np.add.reduceat(y, edges) / counts
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle areas; the factor does not change the argmax
+        area = np.abs(
+            (x[previous] - mean_x[i + 1]) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (mean_y[i + 1] - y[previous])
+        )
+        previous = selected[i + 1] = lo + int(np.argmax(area))
+    return selected
@@ -0,0 +1,61 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+from models import Trade, Commodity, TradeType
+from units import canonical
+
+class Fill(NamedTuple):
+    """One execution between a resting (maker) and an incoming (taker) order.
+
+    Fills are produced by the matcher and never change afterwards. Quantity
+    and price are in the commodity's canonical unit: the price is the maker's
+    limit price per canonical unit, and the quantity is what changed hands in
+    this execution only. Orders that are filled in several steps produce one
+    fill per step.
+    """
+    id: str
+    commodity: Commodity
+    price: float
+    quantity: float
+    maker_order_id: Optional[str]
+    taker_order_id: str
+    maker_company: Optional[str]
+    taker_company: str
+    taker_side: TradeType
+    unit: str
+    currency: str
+    time: Optional[datetime]
+
+    @classmethod
+    def from_trade(cls, trade: Trade) -> "Fill":
+        """A trade submitted as already completed, with its requester as the taker"""
+        trade = canonical(trade)
+        return cls(
+            id=trade.id,
+            commodity=trade.commodity,
+            price=trade.price.value,
+            quantity=trade.amount.value,
+            maker_order_id=None,
+            taker_order_id=trade.id,
+            maker_company=trade.fulfiller_company,
+            taker_company=trade.requester_company,
+            taker_side=trade.type,
+            unit=trade.amount.measurement_unit,
+            currency=trade.price.currency,
+            time=trade.time
+        )
+
+    def to_dict(self) -> dict:
+        data = self._asdict()
+        data["commodity"] = self.commodity.value
+        data["taker_side"] = self.taker_side.value
+        data["time"] = self.time.isoformat() if self.time else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Fill":
+        return cls(**dict(
+            data,
+            commodity=Commodity(data["commodity"]),
+            taker_side=TradeType(data["taker_side"]),
+            time=datetime.fromisoformat(data["time"]) if data["time"] else None
+        ))
@@ -0,0 +1,465 @@
+import json
+import os
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from bisect import insort
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from models import Trade, Commodity, TradeType
+from fills import Fill
+from trade_store import TradeStore, COMMODITIES, COMMODITY_CODES, NO_TIME, to_epoch_us
+from history_index import HistoryIndex, decode_cursor, encode_cursor
+
+DAY_US = 24 * 3600 * 1_000_000
+# Day number of the partition holding trades without a timestamp
+UNDATED = NO_TIME // DAY_US
+
+def _day_name(day: int) -> str:
+    if day == UNDATED:
+        return "undated"
+    return (date(1970, 1, 1) + timedelta(days=day)).isoformat()
+
+class Partition:
+    """One day of history plus the metadata used to skip it in queries.
+
+    A hot partition keeps its rows in a TradeStore. A cold one only knows
+    the compressed segment file its rows were spilled to.
+    """
+    __slots__ = ("day", "size", "min_time", "max_time", "commodities", "companies", "segment", "generation", "store", "index")
+
+    def __init__(self, day: int):
+        self.day = day
+        self.size = 0
+        self.min_time = NO_TIME
+        self.max_time = NO_TIME
+        self.commodities = [0] * len(COMMODITIES)
+        self.companies = set()
+        self.segment: Optional[str] = None
+        self.generation = 0
+        self.store: Optional[TradeStore] = TradeStore(capacity=64)
+        # Built on the first query against the partition
+        self.index: Optional[HistoryIndex] = None
+
+    @property
+    def hot(self) -> bool:
+        return self.store is not None
+
+    def note_rows(self, start: int) -> None:
+        """Fold store rows from `start` onwards into the metadata and the index"""
+        store = self.store
+        times = store.times[start:]
+        self.min_time = int(times.min()) if not self.size else min(self.min_time, int(times.min()))
+        self.max_time = max(self.max_time, int(times.max()))
+        counts = np.bincount(store.commodities[start:], minlength=len(COMMODITIES)).tolist()
+        self.commodities = [total + count for total, count in zip(self.commodities, counts)]
+        codes = np.unique(np.concatenate([store.requesters[start:], store.fulfillers[start:]]))
+        self.companies.update(store.companies.value(int(code)) for code in codes if code >= 0)
+        self.size = len(store)
+        if self.index is not None:
+            self.index.add_rows(store, start)
+
+    def note_fill(self, fill: Fill, time: int, row: int) -> None:
+        """Same as note_rows for a single appended fill, without going through NumPy"""
+        if not self.size or time < self.min_time:
+            self.min_time = time
+        if time > self.max_time:
+            self.max_time = time
+        self.commodities[COMMODITY_CODES[fill.commodity]] += 1
+        self.companies.add(fill.taker_company)
+        if fill.maker_company is not None:
+            self.companies.add(fill.maker_company)
+        self.size += 1
+        if self.index is not None:
+            self.index.add_rows(self.store, row)
+
+    def matches(self, start_us: Optional[int], end_us: Optional[int], commodity: Optional[Commodity], company: Optional[str]) -> bool:
+        """Whether the partition can hold rows for these filters"""
+        if start_us is not None and self.max_time < start_us:
+            return False
+        if end_us is not None and self.min_time >= end_us:
+            return False
+        if commodity is not None and not self.commodities[COMMODITY_CODES[commodity]]:
+            return False
+        if company is not None and company not in self.companies:
+            return False
+        return True
+
+    def to_meta(self) -> dict:
+        return {
+            "day": self.day,
+            "size": self.size,
+            "min_time": self.min_time,
+            "max_time": self.max_time,
+            "commodities": self.commodities,
+            "companies": sorted(self.companies),
+            "segment": self.segment,
+            "generation": self.generation,
+        }
+
+    @classmethod
+    def from_meta(cls, meta: dict) -> "Partition":
+        partition = cls(meta["day"])
+        partition.size = meta["size"]
+        partition.min_time = meta["min_time"]
+        partition.max_time = meta["max_time"]
+        partition.commodities = list(meta["commodities"])
+        partition.companies = set(meta["companies"])
+        partition.segment = meta["segment"]
+        partition.generation = meta["generation"]
+        partition.store = None
+        return partition
+
+class HistoryArchive:
+    """Completed trade history partitioned by trade day, with old days on disk.
+
+    Rows are routed to the partition of their UTC day. The newest `hot_days`
+    days stay in memory as TradeStores with their own history indexes. Older
+    days are spilled to immutable compressed segment files in `directory`
+    and only their metadata (row count, time range, commodity counts and
+    companies) stays in memory. Queries walk the partitions in day order and
+    skip any whose metadata rules them out, so a query only opens the days
+    it can return rows from. A few cold partitions are kept loaded after
+    being read.
+
+    Without a directory nothing is spilled and every partition stays hot.
+    Read-only archives (API workers) never write segments. They adopt the
+    ones the engine writes instead.
+    """
+
+    def __init__(self, directory=None, hot_days: int = 7, read_only: bool = False, max_loaded: int = 4):
+        self.directory = Path(directory) if directory else None
+        if self.directory and not read_only:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.hot_days = hot_days
+        self.read_only = read_only
+        self.max_loaded = max_loaded
+        self._partitions: Dict[int, Partition] = {}
+        self._days: List[int] = []
+        self._size = 0
+        self._newest_day: Optional[int] = None
+        # Day -> [store, index] of recently read cold partitions
+        self._loaded: "OrderedDict[int, list]" = OrderedDict()
+        # Called with a partition's metadata after it has been spilled
+        self.spill_listeners: List[Callable[[dict], None]] = []
+        # Segments replaced by a newer generation that a snapshot may still refer to
+        self._superseded: List[str] = []
+
+    def clear(self) -> None:
+        self._partitions.clear()
+        self._days.clear()
+        self._loaded.clear()
+        self._size = 0
+        self._newest_day = None
+
+    def _writable(self, day: int) -> Partition:
+        """The hot partition for a day, creating it or reading it back from disk"""
+        partition = self._partitions.get(day)
+        if partition is None:
+            partition = self._partitions[day] = Partition(day)
+            insort(self._days, day)
+        elif not partition.hot:
+            partition.store = self._read_segment(partition)
+            self._loaded.pop(day, None)
+        return partition
+
+    def append_fill(self, fill: Fill) -> None:
+        time = to_epoch_us(fill.time)
+        day = time // DAY_US
+        partition = self._writable(day)
+        partition.note_fill(fill, time, partition.store.append_fill(fill))
+        self._size += 1
+        self._advance([day])
+
+    def extend_store(self, store: TradeStore) -> None:
+        """Add every row of a store, routing each to the partition of its day"""
+        if not len(store):
+            return
+        days = store.times // DAY_US
+        order = np.argsort(days, kind="stable")
+        boundaries = np.flatnonzero(np.diff(days[order])) + 1
+        written = []
+        for rows in np.split(order, boundaries):
+            written.append(int(days[rows[0]]))
+            partition = self._writable(written[-1])
+            partition.note_rows(partition.store.extend_from(store, rows))
+        self._size += len(store)
+        self._advance(written)
+
+    def _advance(self, days: List[int]) -> None:
+        """Move the hot window up to the newest of the days just written to.
+
+        Late rows for a day outside the window read its partition back into
+        memory, so it is spilled again straight away.
+        """
+        newest = max(days)
+        if self._newest_day is None or newest > self._newest_day:
+            self._newest_day = newest
+            self.spill()
+        elif self.directory is not None and not self.read_only:
+            cutoff = self._newest_day - self.hot_days
+            for day in days:
+                if day <= cutoff:
+                    self._spill(self._partitions[day])
+
+    def spill(self) -> None:
+        """Write hot partitions older than the hot window to segment files and drop them from memory"""
+        if self.directory is None or self.read_only or self._newest_day is None:
+            return
+        cutoff = self._newest_day - self.hot_days
+        for day in self._days:
+            if day > cutoff:
+                break
+            self._spill(self._partitions[day])
+
+    def _spill(self, partition: Partition) -> None:
+        if partition.hot:
+            self._write_segment(partition)
+            self._write_encoded(partition, partition.store)
+            partition.store = None
+            partition.index = None
+            for listener in self.spill_listeners:
+                listener(partition.to_meta())
+
+    def _write_segment(self, partition: Partition) -> None:
+        # Segments are never rewritten: a partition that is spilled again
+        # goes to a new file, so the snapshot on disk still finds its own
+        # until release_segments is called after the next one
+        if partition.segment is not None:
+            self._superseded.append(partition.segment)
+        partition.generation += 1
+        name = f"{_day_name(partition.day)}-{partition.generation}.npz"
+        data = partition.store.to_columns()
+        staging = self.directory / f"{name}.tmp"
+        with open(staging, "wb") as f:
+            np.savez_compressed(
+                f,
+                ids=np.array(data["ids"], dtype=str),
+                companies=np.array(data["companies"], dtype=str),
+                units=np.array(data["units"], dtype=str),
+                currencies=np.array(data["currencies"], dtype=str),
+                **data["columns"]
+            )
+        os.replace(staging, self.directory / name)
+        partition.segment = name
+
+    def release_segments(self) -> None:
+        """Delete segment files replaced by a newer generation, once no snapshot refers to them"""
+        for name in self._superseded:
+            (self.directory / name).unlink(missing_ok=True)
+            self._encoded_path(name).unlink(missing_ok=True)
+        self._superseded.clear()
+
+    def _encoded_path(self, segment: str) -> Path:
+        return self.directory / (Path(segment).stem + ".json")
+
+    def _write_encoded(self, partition: Partition, store: TradeStore) -> bytes:
+        """Encode a cold partition's rows once into a file next to its segment.
+
+        The segment never changes, so neither does its encoding, and full
+        history reads use the file instead of decompressing the segment.
+        """
+        data = b",".join(store.encoded_rows())
+        path = self._encoded_path(partition.segment)
+        staging = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            staging.write_bytes(data)
+            os.replace(staging, path)
+        except OSError as e:
+            print(f"Warning: could not cache encoded rows of {partition.segment}: {e}")
+        return data
+
+    def _encoded(self, partition: Partition) -> bytes:
+        """A cold partition's rows as comma-separated JSON objects"""
+        try:
+            return self._encoded_path(partition.segment).read_bytes()
+        except FileNotFoundError:
+            return self._write_encoded(partition, self._open(partition)[0])
+
+    def _read_segment(self, partition: Partition) -> TradeStore:
+        with np.load(self.directory / partition.segment) as segment:
+            return TradeStore.from_columns({
+                "size": partition.size,
+                "columns": {name: segment[name] for name in segment.files if name not in ("ids", "companies", "units", "currencies")},
+                "ids": segment["ids"].tolist(),
+                "companies": segment["companies"].tolist(),
+                "units": segment["units"].tolist(),
+                "currencies": segment["currencies"].tolist(),
+            })
+
+    def adopt(self, meta: dict) -> None:
+        """Treat a partition as spilled to a segment written by another process"""
+        partition = Partition.from_meta(meta)
+        if partition.day not in self._partitions:
+            insort(self._days, partition.day)
+        self._partitions[partition.day] = partition
+        self._loaded.pop(partition.day, None)
+
+    def _open(self, partition: Partition, indexed: bool = False) -> Tuple[TradeStore, Optional[HistoryIndex]]:
+        """The rows of a partition, loading a cold one (and indexing it if asked)"""
+        if partition.hot:
+            if indexed and partition.index is None:
+                partition.index = HistoryIndex()
+                partition.index.add_rows(partition.store, 0)
+            return partition.store, partition.index
+
+        entry = self._loaded.get(partition.day)
+        if entry is None:
+            entry = self._loaded[partition.day] = [self._read_segment(partition), None]
+            if len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        else:
+            self._loaded.move_to_end(partition.day)
+        if indexed and entry[1] is None:
+            entry[1] = HistoryIndex()
+            entry[1].add_rows(entry[0], 0)
+        return entry[0], entry[1]
+
+    def partitions(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        commodity: Optional[Commodity] = None,
+        company: Optional[str] = None
+    ) -> Iterator[TradeStore]:
+        """Stores of the partitions that can hold rows for these filters, oldest day first"""
+        start_us = to_epoch_us(start) if start is not None else None
+        end_us = to_epoch_us(end) if end is not None else None
+        for day in list(self._days):
+            partition = self._partitions[day]
+            if partition.matches(start_us, end_us, commodity, company):
+                yield self._open(partition)[0]
+
+    def query(
+        self,
+        commodity: Optional[Commodity] = None,
+        company: Optional[str] = None,
+        side: Optional[TradeType] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[List[Tuple[TradeStore, List[int]]], Optional[str]]:
+        """Matching rows as (store, rows) pages in (time, row) order plus the cursor for the next page.
+
+        Row numbers are local to their partition; the time in a cursor says
+        which partition it points into.
+        """
+        start_us = to_epoch_us(start) if start is not None else None
+        end_us = to_epoch_us(end) if end is not None else None
+        cursor_day = decode_cursor(cursor)[0] // DAY_US if cursor is not None else None
+        days = list(reversed(self._days) if descending else self._days)
+        pages = []
+        remaining = limit
+        for day in days:
+            if cursor_day is not None and (day > cursor_day if descending else day < cursor_day):
+                continue
+            partition = self._partitions[day]
+            if not partition.matches(start_us, end_us, commodity, company):
+                continue
+            store, index = self._open(partition, indexed=True)
+            day_cursor = cursor if day == cursor_day else None
+
+            if remaining == 0:
+                # The page is full; only check whether anything comes after it
+                rows, _ = index.query(store, commodity, company, side, start, end, day_cursor, 1, descending)
+                if rows:
+                    last_store, last_rows = pages[-1]
+                    return pages, encode_cursor(int(last_store.times[last_rows[-1]]), last_rows[-1])
+                continue
+
+            rows, next_cursor = index.query(store, commodity, company, side, start, end, day_cursor, remaining, descending)
+            if rows:
+                pages.append((store, rows))
+                if remaining is not None:
+                    remaining -= len(rows)
+            if next_cursor is not None:
+                return pages, next_cursor
+        return pages, None
+
+    def trades(self) -> List[Trade]:
+        return [trade for store in self.partitions() for trade in store]
+
+    def trades_json(self) -> bytes:
+        """Every row as one JSON array, oldest day first"""
+        parts = []
+        for day in list(self._days):
+            partition = self._partitions[day]
+            if partition.hot:
+                parts.extend(partition.store.encoded_rows())
+            elif partition.size:
+                parts.append(self._encoded(partition))
+        return b"[" + b",".join(parts) + b"]"
+
+    def summary(self) -> Dict[str, int]:
+        hot = [partition for partition in self._partitions.values() if partition.hot]
+        return {
+            "hot_partitions": len(hot),
+            "cold_partitions": len(self._partitions) - len(hot),
+            "hot_rows": sum(partition.size for partition in hot),
+        }
+
+    def save(self, directory: Path) -> None:
+        """Write hot partitions as TradeStores plus the metadata of every partition.
+
+        Cold partitions are referenced by segment name, so a snapshot never
+        copies them.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        metas = []
+        for day in self._days:
+            partition = self._partitions[day]
+            meta = partition.to_meta()
+            meta["hot"] = partition.hot
+            if partition.hot:
+                partition.store.save(directory / _day_name(day))
+            metas.append(meta)
+        (directory / "partitions.json").write_text(json.dumps(metas))
+
+    def load(self, directory: Path) -> None:
+        """Replace the contents with an archive written by save, or a single TradeStore"""
+        self.clear()
+        if not (directory / "partitions.json").exists():
+            self.extend_store(TradeStore.load(directory))
+            return
+        for meta in json.loads((directory / "partitions.json").read_text()):
+            partition = Partition.from_meta(meta)
+            if meta["hot"]:
+                partition.store = TradeStore.load(directory / _day_name(partition.day))
+            self._partitions[partition.day] = partition
+            self._size += partition.size
+        self._days = sorted(self._partitions)
+        if self._days:
+            self._advance([self._days[-1]])
+
+    def to_columns(self) -> dict:
+        """Plain data for another process: hot partitions' columns and cold partitions' segment names"""
+        return {
+            "directory": str(self.directory) if self.directory else None,
+            "hot_days": self.hot_days,
+            "partitions": [
+                dict(partition.to_meta(), columns=partition.store.to_columns() if partition.hot else None)
+                for partition in (self._partitions[day] for day in self._days)
+            ],
+        }
+
+    @classmethod
+    def from_columns(cls, data: dict, read_only: bool = True) -> "HistoryArchive":
+        archive = cls(data["directory"], data["hot_days"], read_only=read_only)
+        for meta in data["partitions"]:
+            partition = Partition.from_meta(meta)
+            if meta["columns"] is not None:
+                partition.store = TradeStore.from_columns(meta["columns"])
+            archive._partitions[partition.day] = partition
+            archive._size += partition.size
+        archive._days = sorted(archive._partitions)
+        archive._newest_day = archive._days[-1] if archive._days else None
+        return archive
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Trade]:
+        for store in self.partitions():
+            yield from store
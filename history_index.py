@@ -0,0 +1,167 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from models import Commodity, TradeType
+from trade_store import TradeStore, COMMODITIES, COMMODITY_CODES, TRADE_TYPE_CODES, to_epoch_us
+
+class _TimeIndex:
+    """Row numbers ordered by (time, row) with the times kept alongside for bisecting"""
+    __slots__ = ("times", "rows")
+
+    def __init__(self):
+        self.times: List[int] = []
+        self.rows: List[int] = []
+
+    def add(self, time: int, row: int) -> None:
+        # Rows only ever grow, so among equal times a new row always goes last
+        if not self.times or self.times[-1] <= time:
+            self.times.append(time)
+            self.rows.append(row)
+        else:
+            position = bisect_right(self.times, time)
+            self.times.insert(position, time)
+            self.rows.insert(position, row)
+
+    def bounds(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        lo = bisect_left(self.times, start) if start is not None else 0
+        hi = bisect_left(self.times, end) if end is not None else len(self.times)
+        return lo, hi
+
+    def before(self, time: int, row: int) -> int:
+        """Position of the first entry not ordered before (time, row)"""
+        lo = bisect_left(self.times, time)
+        hi = bisect_right(self.times, time, lo=lo)
+        return bisect_left(self.rows, row, lo=lo, hi=hi)
+
+    def after(self, time: int, row: int) -> int:
+        """Position of the first entry ordered after (time, row)"""
+        lo = bisect_left(self.times, time)
+        hi = bisect_right(self.times, time, lo=lo)
+        return bisect_right(self.rows, row, lo=lo, hi=hi)
+
+def encode_cursor(time: int, row: int) -> str:
+    return f"{time}_{row}"
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    time, row = cursor.split("_")
+    return int(time), int(row)
+
+class HistoryIndex:
+    """Secondary indexes over a TradeStore for paginated history queries.
+
+    There is one time-ordered index over all rows, one per commodity and one
+    per company (as requester or fulfiller). A query bisects the most
+    selective index for its time range and cursor, then reads rows from there,
+    so a page costs O(log n + k) instead of a scan over the whole history.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[Hashable, _TimeIndex] = {}
+
+    def _index(self, key: Hashable) -> _TimeIndex:
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = _TimeIndex()
+        return index
+
+    def clear(self) -> None:
+        self._indexes.clear()
+
+    def add_rows(self, store: TradeStore, start: int) -> None:
+        """Index every store row from `start` onwards"""
+        if start == 0 and not self._indexes:
+            self._build(store)
+            return
+        times = store.times[start:].tolist()
+        commodities = store.commodities[start:].tolist()
+        requesters = store.requesters[start:].tolist()
+        fulfillers = store.fulfillers[start:].tolist()
+        for offset, time in enumerate(times):
+            row = start + offset
+            self._index("all").add(time, row)
+            self._index(("commodity", commodities[offset])).add(time, row)
+            self._index(("company", requesters[offset])).add(time, row)
+            if fulfillers[offset] >= 0 and fulfillers[offset] != requesters[offset]:
+                self._index(("company", fulfillers[offset])).add(time, row)
+
+    def _build(self, store: TradeStore) -> None:
+        """Build every index at once with a single stable sort of the time column"""
+        order = np.argsort(store.times, kind="stable")
+        times = store.times[order]
+        self._set("all", times, order)
+        for code in range(len(COMMODITIES)):
+            selected = store.commodities[order] == code
+            self._set(("commodity", code), times[selected], order[selected])
+        requesters = store.requesters[order]
+        fulfillers = store.fulfillers[order]
+        for code in range(len(store.companies.values)):
+            selected = (requesters == code) | (fulfillers == code)
+            self._set(("company", code), times[selected], order[selected])
+
+    def _set(self, key: Hashable, times: np.ndarray, rows: np.ndarray) -> None:
+        if len(rows):
+            index = self._index(key)
+            index.times = times.tolist()
+            index.rows = rows.tolist()
+
+    def query(
+        self,
+        store: TradeStore,
+        commodity: Optional[Commodity] = None,
+        company: Optional[str] = None,
+        side: Optional[TradeType] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[List[int], Optional[str]]:
+        """Matching rows in (time, row) order plus the cursor for the next page"""
+        commodity_code = COMMODITY_CODES[commodity] if commodity is not None else None
+        side_code = TRADE_TYPE_CODES[side] if side is not None else None
+
+        if company is not None:
+            company_code = store.companies.lookup(company)
+            if company_code < 0:
+                return [], None
+            index = self._indexes.get(("company", company_code))
+        elif commodity is not None:
+            index = self._indexes.get(("commodity", commodity_code))
+            # The commodity index already guarantees this filter
+            commodity_code = None
+        else:
+            index = self._indexes.get("all")
+        if index is None:
+            return [], None
+
+        lo, hi = index.bounds(
+            to_epoch_us(start) if start is not None else None,
+            to_epoch_us(end) if end is not None else None
+        )
+        if cursor is not None:
+            cursor_time, cursor_row = decode_cursor(cursor)
+            if descending:
+                hi = min(hi, index.before(cursor_time, cursor_row))
+            else:
+                lo = max(lo, index.after(cursor_time, cursor_row))
+
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        commodities = store.commodities
+        types = store.types
+        rows = []
+        last_position = None
+        for position in positions:
+            row = index.rows[position]
+            if commodity_code is not None and commodities[row] != commodity_code:
+                continue
+            if side_code is not None and types[row] != side_code:
+                continue
+            if limit is not None and len(rows) == limit:
+                break
+            rows.append(row)
+            last_position = position
+        else:
+            return rows, None
+
+        return rows, encode_cursor(index.times[last_position], index.rows[last_position])
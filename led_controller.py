@@ -1,7 +1,8 @@
 import time
-from threading import Thread
-from typing import Dict
-from models import Trade, Company
+from collections import OrderedDict
+from threading import Condition, Thread
+from typing import Dict, Tuple
+from models import Company
 import serial
 
 class MockLEDStrip:
@@ -19,13 +20,26 @@ class MockLEDStrip:
     def __setitem__(self, key, value):
         self.leds[key] = value
 
+# Per-LED step delay of the trail animation in trade_visualizer.ino
+ARDUINO_STEP_SECONDS = 0.05
+
 class LEDController:
-    def __init__(self, is_dev_mode=True):
+    def __init__(self, is_dev_mode=True, max_pending=32):
         self.is_dev_mode = is_dev_mode
         self.company_to_led_map: Dict[str, int] = {}
         self.current_led = 0
         self.num_leds = 0
         self.leds = None
+
+        # Animations waiting for the dispatcher, keyed by LED pair so repeats merge
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._condition = Condition()
+        self._dispatcher = None
+        self._running = True
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
         
         if not is_dev_mode:
             try:
@@ -87,14 +101,67 @@ class LEDController:
             print(f"Error sending command to Arduino: {e}")
 
 
-    def visualize_trade(self, offer: Trade, request: Trade):
-        """Trigger LED animation for a trade in a non-blocking way"""
+    def _animation_seconds(self, offer_led: int, request_led: int) -> float:
+        """How long the Arduino is busy with one animation and not reading serial"""
+        if self.is_dev_mode:
+            return 0
+        return (offer_led + request_led + 2) * ARDUINO_STEP_SECONDS
+
+    def _run_dispatcher(self):
+        """Play queued animations one at a time at the pace the strip can render"""
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                (offer_led, request_led), _ = self._pending.popitem(last=False)
+
+            self._animate_trade(offer_led, request_led)
+            self.sent += 1
+            time.sleep(self._animation_seconds(offer_led, request_led))
+
+    def visualize_trade(self, offer_company: str, request_company: str):
+        """Queue an LED animation for a trade without blocking the caller.
+
+        A trade between a pair of LEDs that is already queued is merged into
+        the queued animation, and when the queue is full the oldest animation
+        is dropped.
+        """
         if not self.leds:
             print("Warning: LED controller not initialized with companies yet")
             return
-            
-        offer_led = self.company_to_led_map[offer.requester_company]
-        request_led = self.company_to_led_map[request.requester_company] + 1
-        
-        # Run animation in a separate thread to not block the main process
-        Thread(target=self._animate_trade, args=(offer_led, request_led)).start()
\ No newline at end of file
+
+        offer_led = self.company_to_led_map.get(offer_company)
+        request_led = self.company_to_led_map.get(request_company)
+        if offer_led is None or request_led is None:
+            return
+        key = (offer_led, request_led + 1)
+
+        with self._condition:
+            if key in self._pending:
+                self._pending[key] += 1
+                self.coalesced += 1
+                return
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[key] = 1
+            if self._dispatcher is None:
+                self._dispatcher = Thread(target=self._run_dispatcher, name="led-dispatcher", daemon=True)
+                self._dispatcher.start()
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": len(self._pending),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped
+        }
+
+    def close(self):
+        """Stop the dispatcher, abandoning any animations still queued"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
\ No newline at end of file
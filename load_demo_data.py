@@ -1,30 +1,56 @@
 import json
+import time
 from datetime import datetime
-from models import Company, Trade, ResourceState
+from pathlib import Path
+from typing import List
+from pydantic import TypeAdapter
+from models import Company, Trade, TradeStatus
 from trading_system import TradingSystem
 
-def load_demo_data(trading_system: TradingSystem):
+DATA_DIR = Path(__file__).parent
+
+company_list_adapter = TypeAdapter(List[Company])
+trade_list_adapter = TypeAdapter(List[Trade])
+
+def _read_json(path: Path):
+    with open(path, 'rb') as f:
+        return json.loads(f.read())
+
+def load_demo_data(trading_system: TradingSystem, data_dir: Path = DATA_DIR):
+    """Parse the demo files once and bulk-load them into the trading system.
+
+    Companies and trades are validated as whole lists. Completed trades go
+    straight into the history as one batch, which the history listeners
+    (e.g. PriceAnalytics) pick up in a single pass, and only pending trades
+    go through matching.
+    """
+    start = time.perf_counter()
+
     # Load companies
-    with open('demo_companies.json', 'r') as f:
-        companies_data = json.load(f)
-        
+    companies_data = _read_json(data_dir / 'demo_companies.json')
+    last_active = datetime.now()
     for company_data in companies_data:
-        company = Company(
-            name=company_data['name'],
-            location=company_data['location'],
-            statuses=[ResourceState(**status) for status in company_data['statuses']],
-            last_active=datetime.now()
-        )
+        company_data['last_active'] = last_active
+    for company in company_list_adapter.validate_python(companies_data):
         trading_system.add_company(company)
-    
+    companies_done = time.perf_counter()
+
     # Load historical trades
-    with open('demo_trades.json', 'r') as f:
-        trades_data = json.load(f)
-        
-    for trade_data in trades_data:
-        trade_data['time'] = datetime.fromisoformat(trade_data['time'].replace('Z', '+00:00'))
-        trade = Trade(**trade_data)
-        trading_system.add_trade(trade)
-
-    print(f"Loaded {len(companies_data)} companies")
-    print(f"Loaded {len(trades_data)} historical trades")
\ No newline at end of file
+    trades_data = _read_json(data_dir / 'demo_trades.json')
+    parsed = time.perf_counter()
+    trades = trade_list_adapter.validate_python(trades_data)
+    validated = time.perf_counter()
+
+    completed = [trade for trade in trades if trade.status == TradeStatus.COMPLETED]
+    pending = [trade for trade in trades if trade.status != TradeStatus.COMPLETED]
+    trading_system.extend_history(completed)
+    if pending:
+        trading_system.add_trades(pending)
+    loaded = time.perf_counter()
+
+    print(f"Loaded {len(companies_data)} companies in {companies_done - start:.3f}s")
+    print(
+        f"Loaded {len(trades)} historical trades in {loaded - companies_done:.3f}s "
+        f"(parse {parsed - companies_done:.3f}s, validate {validated - parsed:.3f}s, "
+        f"insert {loaded - validated:.3f}s)"
+    )
@@ -1,13 +1,33 @@
-from fastapi import FastAPI, HTTPException
-from models import Trade, Company, Commodity, TimeFrame, SavingsResult
+from fastapi import FastAPI, HTTPException, Request, Response, Query
+from pydantic import TypeAdapter, ValidationError
+from typing import List, Optional
+from datetime import datetime
+from models import Trade, Company, Commodity, TimeFrame, SavingsResult, TradeType
 from trading_system import TradingSystem
+from history_archive import HistoryArchive
 from price_analytics import PriceAnalytics
 from savings_calculator import SavingsCalculator
+from positions import PositionBook
+from auction import CallAuction
 from load_demo_data import load_demo_data
 from fastapi.middleware.cors import CORSMiddleware  
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import uvicorn
-import math
+import asyncio
+import os
+import json
+import time
+import gzip
+import orjson
 from led_controller import LEDController
+from trade_journal import TradeJournal
+from market_feed import MarketFeed
+from sequencer import MatchingSequencer
+from multiprocess import EngineServer, ReplicaTradingSystem, ReplicaSequencer
+from analytics_cache import AnalyticsCache, etag_matches
+from metrics import Metrics, MetricsMiddleware, SamplingProfiler
+
+startup_started = time.perf_counter()
 
 app = FastAPI()
 app.add_middleware(
@@ -16,43 +36,272 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Initialize LED controller in development mode
-led_controller = LEDController(is_dev_mode=True)
+# Request latency, matching, cache and queue metrics served on /metrics
+metrics = Metrics()
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+# SIPHON_ROLE=api marks a worker process started by the multi-process
+# launcher below: the engine process owns the book, the worker forwards writes
+role = os.environ.get("SIPHON_ROLE", "standalone")
+
+# Streaming feed of book, trade and price bucket updates
+market_feed = MarketFeed()
+
+# Journal, snapshots and spilled history partitions are kept here when set
+data_dir = os.environ.get("SIPHON_DATA_DIR")
 
-# Initialize trading system with LED controller
-trading_system = TradingSystem(led_controller=led_controller)
+# SIPHON_MATCHING=auction rests incoming orders and clears the books in a
+# call auction every SIPHON_AUCTION_INTERVAL seconds instead of matching them
+matching = os.environ.get("SIPHON_MATCHING", "continuous")
+auction_interval = float(os.environ.get("SIPHON_AUCTION_INTERVAL", "5"))
+# How often expired orders are looked for, in seconds
+expiry_interval = float(os.environ.get("SIPHON_EXPIRY_INTERVAL", "1"))
 
-price_analytics = PriceAnalytics()
+if role == "api":
+    # The LEDs and the journal belong to the engine process
+    led_controller = None
+    trading_system = ReplicaTradingSystem.from_environment(market_feed=market_feed)
+    sequencer = ReplicaSequencer(trading_system)
+    # Price bucket events are relayed from the engine instead of published here
+    price_analytics = PriceAnalytics()
+else:
+    # Initialize LED controller in development mode
+    led_controller = LEDController(is_dev_mode=True)
+
+    # History days older than SIPHON_HOT_DAYS move from memory to compressed files
+    history = HistoryArchive(
+        directory=os.path.join(data_dir, "archive") if data_dir else None,
+        hot_days=int(os.environ.get("SIPHON_HOT_DAYS", "7"))
+    )
+
+    # Initialize trading system with LED controller
+    trading_system = TradingSystem(
+        led_controller=led_controller,
+        market_feed=market_feed,
+        metrics=metrics,
+        allocation=os.environ.get("SIPHON_ALLOCATION", "fifo"),
+        history=history,
+        matching=matching
+    )
+
+    # Every mutation of the trading system goes through this single writer
+    sequencer = MatchingSequencer()
+
+    price_analytics = PriceAnalytics(market_feed=market_feed)
 savings_calculator = SavingsCalculator(price_analytics)
+position_book = PositionBook(price_analytics.aggregator)
+# Declared surpluses and deficits take part in every call auction
+auction = CallAuction(trading_system, position_book, price_analytics.aggregator)
+analytics_cache = AnalyticsCache(metrics=metrics)
+
+# Keep the price buckets up to date as orders are filled
+trading_system.add_fill_listener(price_analytics.record_fill)
+trading_system.add_history_listener(price_analytics.record_history)
+# Company positions, whose savings are priced against those buckets when read
+trading_system.add_fill_listener(position_book.record_fill)
+trading_system.add_history_listener(position_book.record_history)
+# and drop cached analytics responses whenever the history grows
+trading_system.add_fill_listener(analytics_cache.invalidate)
+trading_system.add_history_listener(analytics_cache.invalidate)
+
+# Restore state from the journal when a data directory is configured,
+# otherwise (or on first boot) start from the demo data. API workers copy
+# the engine's history instead when they connect on startup.
+if role != "api":
+    if data_dir:
+        journal = TradeJournal(
+            data_dir,
+            snapshot_every=int(os.environ.get("SIPHON_SNAPSHOT_EVERY", "10000")),
+            fsync=os.environ.get("SIPHON_JOURNAL_FSYNC") == "1"
+        )
+        if not journal.recover(trading_system):
+            load_demo_data(trading_system)
+            journal.snapshot(trading_system)
+        journal.attach(trading_system)
+    else:
+        load_demo_data(trading_system)
+
+    # After loading demo data, assign LEDs to companies
+    led_controller.assign_company_leds(trading_system.companies)
+
+print(f"Startup completed in {time.perf_counter() - startup_started:.3f}s")
+
+async def run_auctions():
+    while True:
+        await asyncio.sleep(auction_interval)
+        try:
+            await sequencer.submit(trading_system.call_auction)
+        except Exception as e:
+            print(f"Warning: call auction failed: {e!r}")
 
-# Load demo data on startup
-load_demo_data(trading_system)
+async def expire_orders():
+    while True:
+        await asyncio.sleep(expiry_interval)
+        # Only go through the sequencer (and invalidate read snapshots) when something is due
+        due = trading_system.next_expiry()
+        if due is not None and due <= time.time():
+            await sequencer.submit(trading_system.expire_orders)
 
-# After loading demo data, assign LEDs to companies
-led_controller.assign_company_leds(trading_system.companies)
+background_tasks = []
+
+@app.on_event("startup")
+async def start_sequencer():
+    sequencer.start()
+    # With API workers the engine process runs auctions and expiry instead
+    if role != "api":
+        loop = asyncio.get_running_loop()
+        background_tasks.append(loop.create_task(expire_orders()))
+        if matching == "auction":
+            background_tasks.append(loop.create_task(run_auctions()))
+
+@app.on_event("shutdown")
+async def snapshot_on_shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await sequencer.stop()
+    # Leave a fresh snapshot behind so the next cold start has nothing to replay
+    if trading_system.journal:
+        trading_system.journal.snapshot(trading_system)
+        trading_system.journal.close()
+    if led_controller:
+        led_controller.close()
+    profiler.stop()
+
+# Bodies at least this big are gzipped for clients that accept it
+GZIP_MIN_SIZE = 1024
+
+trade_list_adapter = TypeAdapter(List[Trade])
+company_list_adapter = TypeAdapter(List[Company])
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip; q=0 refuses a coding"""
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+def _json_response(request: Request, body: bytes, headers: Optional[dict] = None) -> Response:
+    """Send already-encoded JSON, skipping FastAPI's per-item validation and encoding"""
+    headers = dict(headers or {}, Vary="Accept-Encoding")
+    if len(body) >= GZIP_MIN_SIZE and _accepts_gzip(request.headers.get("accept-encoding", "")):
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.post("/trades")
 async def create_trade(trade: Trade):
-    trading_system.add_trade(trade)
-    return {"status": "success", "trade": trade}
+    order, fills = await sequencer.submit(trading_system.add_trade, trade)
+    return {"status": "success", "trade": order, "fills": [fill.to_dict() for fill in fills]}
+
+async def _read_batch(request: Request) -> list:
+    """Raw trade dicts from a JSON array body or an NDJSON stream"""
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            items = []
+            buffer = b""
+            async for chunk in request.stream():
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                items.extend(json.loads(line) for line in lines if line.strip())
+            if buffer.strip():
+                items.append(json.loads(buffer))
+            return items
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed JSON in trade batch")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Trade batch must be a JSON array")
+    return items
+
+@app.post("/trades/batch")
+async def create_trades_batch(request: Request):
+    items = await _read_batch(request)
+
+    # Validate the whole batch in one pass and only split it up if some items fail
+    errors = {}
+    try:
+        trades = trade_list_adapter.validate_python(items)
+        valid_indexes = list(range(len(items)))
+    except ValidationError as e:
+        for error in e.errors():
+            errors.setdefault(error["loc"][0], []).append(
+                {"loc": list(error["loc"][1:]), "msg": error["msg"]}
+            )
+        valid_indexes = [index for index in range(len(items)) if index not in errors]
+        trades = trade_list_adapter.validate_python([items[index] for index in valid_indexes])
+
+    results = [None] * len(items)
+    for index, result in zip(valid_indexes, await sequencer.submit(trading_system.add_trades, trades)):
+        results[index] = {"index": index, **result}
+    for index, item_errors in errors.items():
+        results[index] = {"index": index, "status": "rejected", "errors": item_errors}
+
+    return {
+        "status": "success",
+        "accepted": len(trades),
+        "rejected": len(errors),
+        "results": results
+    }
 
 @app.get("/trades/offers")
-async def get_offers():
-    return trading_system.get_offers()
+async def get_offers(request: Request):
+    return _json_response(request, sequencer.read("offers", trading_system.get_offers_json))
 
 @app.get("/trades/requests")
-async def get_requests():
-    return trading_system.get_requests()
+async def get_requests(request: Request):
+    return _json_response(request, sequencer.read("requests", trading_system.get_requests_json))
 
 @app.get("/trades/history")
-async def get_trade_history():
-    return trading_system.get_trade_history()
+async def get_trade_history(
+    request: Request,
+    commodity: Optional[Commodity] = None,
+    company: Optional[str] = None,
+    side: Optional[TradeType] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    order: str = Query("asc", pattern="^(asc|desc)$")
+):
+    """Trade history, optionally filtered and paginated in (time, id) order.
+
+    Without any parameters the whole history is returned as before. When a
+    page is cut short by `limit`, the cursor for the next page is sent in the
+    X-Next-Cursor header.
+    """
+    if not any((commodity, company, side, start, end, cursor, limit)) and order == "asc":
+        return _json_response(request, trading_system.get_trade_history_json())
+
+    try:
+        body, next_cursor = trading_system.query_trade_history_json(
+            commodity=commodity,
+            company=company,
+            side=side,
+            start=start,
+            end=end,
+            cursor=cursor,
+            limit=limit,
+            descending=order == "desc"
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _json_response(request, body, {"X-Next-Cursor": next_cursor} if next_cursor else None)
 
 @app.post("/companies")
 async def create_company(company: Company):
-    trading_system.add_company(company)
+    await sequencer.submit(trading_system.add_company, company)
     return {"status": "success", "company": company}
 
 @app.get("/companies/{name}")
@@ -62,103 +311,254 @@ async def get_company(name: str):
         raise HTTPException(status_code=404, detail="Company not found")
     return company
 
+@app.get("/companies/{name}/positions")
+async def get_company_positions(request: Request, name: str):
+    """Volume bought and sold, VWAP, realized savings and current surplus or deficit per commodity"""
+    company = trading_system.get_company(name)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    # Not cached per name: the names clients ask for are unbounded
+    return _json_response(request, orjson.dumps(position_book.positions(company, trading_system.trade_history)))
+
+@app.get("/stream/market")
+async def stream_market(request: Request):
+    """Server-Sent Events feed of order, fill and price bucket updates"""
+    subscription = market_feed.subscribe()
+
+    async def events():
+        try:
+            yield "retry: 2000\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(timeout=15)
+                if batch is None:
+                    # Keep idle connections open through proxies
+                    yield ": keep-alive\n\n"
+                else:
+                    yield "".join(batch)
+        finally:
+            market_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/led/stats")
+async def get_led_stats():
+    if not led_controller:
+        raise HTTPException(status_code=404, detail="LEDs are driven by the engine process")
+    return led_controller.stats()
+
+metrics.gauge("siphon_book_orders", "Resting orders per commodity and side")
+metrics.gauge("siphon_trade_history_rows", "Completed trades in the history")
+metrics.gauge("siphon_history_partitions", "History day partitions in memory (hot) and on disk (cold)")
+metrics.gauge("siphon_history_hot_rows", "History rows held in memory")
+metrics.gauge("siphon_sequencer_pending", "Commands waiting for the matching sequencer")
+metrics.gauge("siphon_stream_subscribers", "Open market stream connections")
+metrics.counter("siphon_analytics_cache_hits_total", "Analytics responses served from the cache")
+metrics.counter("siphon_analytics_cache_misses_total", "Analytics responses computed")
+metrics.gauge("siphon_led_queue_depth", "LED animations waiting to be played")
+metrics.counter("siphon_led_animations_total", "LED animations by outcome")
+
+def _collect_gauges():
+    """Values read at scrape time instead of being tracked on every change"""
+    for commodity, sides in trading_system.book_depth().items():
+        for side, depth in sides.items():
+            yield "siphon_book_orders", {"commodity": commodity.value, "side": side}, depth
+    yield "siphon_trade_history_rows", {}, len(trading_system.trade_history)
+    archive = trading_system.trade_history.summary()
+    yield "siphon_history_partitions", {"tier": "hot"}, archive["hot_partitions"]
+    yield "siphon_history_partitions", {"tier": "cold"}, archive["cold_partitions"]
+    yield "siphon_history_hot_rows", {}, archive["hot_rows"]
+    yield "siphon_sequencer_pending", {}, sequencer.pending
+    yield "siphon_stream_subscribers", {}, len(market_feed.subscribers)
+    yield "siphon_analytics_cache_hits_total", {}, analytics_cache.hits
+    yield "siphon_analytics_cache_misses_total", {}, analytics_cache.misses
+    if led_controller:
+        led_stats = led_controller.stats()
+        yield "siphon_led_queue_depth", {}, led_stats["queue_depth"]
+        for outcome in ("sent", "coalesced", "dropped"):
+            yield "siphon_led_animations_total", {"outcome": outcome}, led_stats[outcome]
+
+metrics.add_collector(_collect_gauges)
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Sampling profiler, only reachable when SIPHON_PROFILER=1
+profiler = SamplingProfiler()
+
+def _require_profiler():
+    if os.environ.get("SIPHON_PROFILER") != "1":
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+
+@app.post("/debug/profiler/start")
+async def start_profiler(interval: float = Query(0.005, gt=0, le=1)):
+    _require_profiler()
+    profiler.start(interval)
+    return {"status": "running", "interval": profiler.interval}
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler():
+    _require_profiler()
+    profiler.stop()
+    return {"status": "stopped", "samples": sum(profiler.samples.values())}
+
+@app.get("/debug/profiler")
+async def get_profile():
+    """Samples so far in collapsed-stack format, e.g. for flamegraph.pl"""
+    _require_profiler()
+    return PlainTextResponse(profiler.collapsed())
+
+@app.get("/trades/depth/{commodity}")
+async def get_market_depth(request: Request, commodity: Commodity, levels: int = Query(10, ge=1, le=1000)):
+    """Total resting amount and order count per price, best `levels` prices on each side"""
+    def build():
+        return orjson.dumps(trading_system.market_depth(commodity, levels))
+    return _json_response(request, sequencer.read(("depth", commodity, levels), build))
+
+@app.post("/auction/run")
+async def run_auction():
+    """Run a call auction now, in either matching mode"""
+    results = await sequencer.submit(trading_system.call_auction)
+    return {"status": "success", "results": results}
+
 @app.get("/trades/matching/{commodity}")
-async def find_matching_trades(commodity: Commodity):
-    return trading_system.find_matching_trades(commodity)
+async def find_matching_trades(request: Request, commodity: Commodity):
+    def build():
+        match = trading_system.find_matching_trades(commodity)
+        return orjson.dumps({
+            key: value.model_dump(mode="json") if isinstance(value, Trade) else value
+            for key, value in match.items()
+        })
+    return _json_response(request, sequencer.read(("matching", commodity), build))
+
+def _cached_analytics(request: Request, key, build) -> Response:
+    """Serve an analytics response from the cache, or a 304 if the client already has it"""
+    entry = analytics_cache.get(key, build)
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return _json_response(request, entry.body, headers)
+
+def _average_prices(request: Request, commodity: Commodity, timeframe: TimeFrame, max_points: Optional[int]) -> Response:
+    return _cached_analytics(
+        request,
+        ("prices", commodity, timeframe, None, max_points),
+        lambda: price_analytics.calculate_average_prices(trading_system.trade_history, commodity, timeframe, max_points)
+    )
+
+def _market_prices(request: Request, commodity: Commodity, timeframe: TimeFrame, max_points: Optional[int]) -> Response:
+    return _cached_analytics(
+        request,
+        ("market-prices", commodity, timeframe, None, max_points),
+        lambda: price_analytics.get_market_prices(commodity, timeframe, max_points)
+    )
 
 # Price analytics endpoints for actual trade prices
 @app.get("/analytics/prices/electricity/{timeframe}")
-async def get_electricity_prices(timeframe: TimeFrame):
-    return price_analytics.calculate_average_prices(
-        trading_system.trade_history,
-        Commodity.ELECTRICITY,
-        timeframe
-    )
+async def get_electricity_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _average_prices(request, Commodity.ELECTRICITY, timeframe, max_points)
 
 @app.get("/analytics/prices/gas/{timeframe}")
-async def get_gas_prices(timeframe: TimeFrame):
-    return price_analytics.calculate_average_prices(
-        trading_system.trade_history,
-        Commodity.GAS,
-        timeframe
-    )
+async def get_gas_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _average_prices(request, Commodity.GAS, timeframe, max_points)
 
 @app.get("/analytics/prices/heat/{timeframe}")
-async def get_heat_prices(timeframe: TimeFrame):
-    return price_analytics.calculate_average_prices(
-        trading_system.trade_history,
-        Commodity.HEAT,
-        timeframe
-    )
+async def get_heat_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _average_prices(request, Commodity.HEAT, timeframe, max_points)
 
 @app.get("/analytics/prices/hydrogen/{timeframe}")
-async def get_hydrogen_prices(timeframe: TimeFrame):
-    return price_analytics.calculate_average_prices(
-        trading_system.trade_history,
-        Commodity.HYDROGEN,
-        timeframe
-    )
+async def get_hydrogen_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _average_prices(request, Commodity.HYDROGEN, timeframe, max_points)
 
 # Market price endpoints
 @app.get("/analytics/market-prices/electricity/{timeframe}")
-async def get_electricity_market_prices(timeframe: TimeFrame):
-    return price_analytics.get_market_prices(Commodity.ELECTRICITY, timeframe)
+async def get_electricity_market_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _market_prices(request, Commodity.ELECTRICITY, timeframe, max_points)
 
 @app.get("/analytics/market-prices/gas/{timeframe}")
-async def get_gas_market_prices(timeframe: TimeFrame):
-    return price_analytics.get_market_prices(Commodity.GAS, timeframe)
+async def get_gas_market_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _market_prices(request, Commodity.GAS, timeframe, max_points)
 
 @app.get("/analytics/market-prices/heat/{timeframe}")
-async def get_heat_market_prices(timeframe: TimeFrame):
-    return price_analytics.get_market_prices(Commodity.HEAT, timeframe)
+async def get_heat_market_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _market_prices(request, Commodity.HEAT, timeframe, max_points)
 
 @app.get("/analytics/market-prices/hydrogen/{timeframe}")
-async def get_hydrogen_market_prices(timeframe: TimeFrame):
-    return price_analytics.get_market_prices(Commodity.HYDROGEN, timeframe)
+async def get_hydrogen_market_prices(request: Request, timeframe: TimeFrame, max_points: Optional[int] = Query(None, ge=2, le=10000)):
+    return _market_prices(request, Commodity.HYDROGEN, timeframe, max_points)
 
 # Savings calculation endpoints
-@app.get("/analytics/savings/{timeframe}", response_model=SavingsResult)
-async def get_total_savings(timeframe: TimeFrame):
-    return savings_calculator.calculate_savings(
-        trading_system.trade_history,
-        timeframe
+@app.get("/analytics/savings/{timeframe}", responses={200: {"model": SavingsResult}})
+async def get_total_savings(request: Request, timeframe: TimeFrame):
+    return _cached_analytics(
+        request,
+        ("savings", None, timeframe, None),
+        lambda: savings_calculator.calculate_savings(trading_system.trade_history, timeframe)
     )
 
-@app.get("/analytics/savings/company/{company_name}/{timeframe}", response_model=SavingsResult)
-async def get_company_savings(company_name: str, timeframe: TimeFrame):
+@app.get("/analytics/savings/company/{company_name}/{timeframe}", responses={200: {"model": SavingsResult}})
+async def get_company_savings(request: Request, company_name: str, timeframe: TimeFrame):
     if company_name not in trading_system.companies:
         raise HTTPException(status_code=404, detail="Company not found")
     
-    return savings_calculator.calculate_savings(
-        trading_system.trade_history,
-        timeframe,
-        company_name
+    return _cached_analytics(
+        request,
+        ("savings", None, timeframe, company_name),
+        lambda: savings_calculator.calculate_savings(trading_system.trade_history, timeframe, company_name)
     )
 
 @app.post("/trades/offer")
 async def create_offer(trade: Trade):
     if trade.type != TradeType.SELL:
         raise HTTPException(status_code=400, detail="Trade must be of type SELL for offers")
-    trading_system.add_trade(trade)
-    return {"status": "success", "trade": trade}
+    order, fills = await sequencer.submit(trading_system.add_trade, trade)
+    return {"status": "success", "trade": order, "fills": [fill.to_dict() for fill in fills]}
 
 @app.post("/trades/request")
 async def create_request(trade: Trade):
     if trade.type != TradeType.BUY:
         raise HTTPException(status_code=400, detail="Trade must be of type BUY for requests")
-    trading_system.add_trade(trade)
-    return {"status": "success", "trade": trade}
+    order, fills = await sequencer.submit(trading_system.add_trade, trade)
+    return {"status": "success", "trade": order, "fills": [fill.to_dict() for fill in fills]}
 
 @app.get("/companies")
-async def get_companies():
-    return trading_system.get_all_companies()
+async def get_companies(request: Request):
+    return _json_response(
+        request,
+        sequencer.read("companies", lambda: company_list_adapter.dump_json(trading_system.get_all_companies()))
+    )
 
 @app.delete("/companies/{name}")
 async def delete_company(name: str):
     if name not in trading_system.companies:
         raise HTTPException(status_code=404, detail="Company not found")
-    del trading_system.companies[name]
+    await sequencer.submit(trading_system.remove_company, name)
     return {"status": "success", "message": f"Company {name} deleted"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.environ.get("SIPHON_WORKERS", "1"))
+    if workers > 1:
+        # This process becomes the matching engine and uvicorn spawns API
+        # workers that re-import this module with SIPHON_ROLE=api
+        engine = EngineServer(
+            trading_system,
+            market_feed,
+            snapshot_size=int(os.environ.get("SIPHON_SNAPSHOT_SIZE", str(64 * 1024 * 1024))),
+            auction_interval=auction_interval if matching == "auction" else None
+        )
+        engine.start()
+        os.environ.update(engine.environment(), SIPHON_ROLE="api")
+        try:
+            uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+        finally:
+            engine.stop()
+            if trading_system.journal:
+                trading_system.journal.snapshot(trading_system)
+                trading_system.journal.close()
+            led_controller.close()
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,93 @@
+import asyncio
+import itertools
+import json
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Set
+
+class Subscription:
+    """Bounded per-subscriber event buffer.
+
+    Events published with a key replace any still-undelivered event with the
+    same key, so a slow reader only ever sees the latest state of an order or
+    price bucket. The replacement moves to the back of the buffer, so it is
+    still delivered after every event published before it. When the buffer is full the oldest event is dropped and the
+    reader is told to resync from the REST endpoints.
+    """
+
+    def __init__(self, max_events: int = 1000):
+        self.max_events = max_events
+        self.dropped = 0
+        self.coalesced = 0
+        self._events: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._unkeyed = itertools.count()
+        self._dropped_unreported = 0
+        self._wakeup = asyncio.Event()
+
+    def push(self, event: str, key: Optional[Hashable] = None) -> None:
+        if key is not None and key in self._events:
+            self._events[key] = event
+            self._events.move_to_end(key)
+            self.coalesced += 1
+            return
+        if len(self._events) >= self.max_events:
+            self._events.popitem(last=False)
+            self.dropped += 1
+            self._dropped_unreported += 1
+        self._events[key if key is not None else ("event", next(self._unkeyed))] = event
+        self._wakeup.set()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    async def next_batch(self, timeout: float) -> Optional[List[str]]:
+        """Everything buffered so far, or None if nothing arrived within the timeout"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        batch = list(self._events.values())
+        self._events.clear()
+        self._wakeup.clear()
+        if self._dropped_unreported:
+            batch.insert(0, encode_event("resync", {"dropped": self._dropped_unreported}))
+            self._dropped_unreported = 0
+        return batch
+
+def encode_event(event_type: str, data) -> str:
+    """Server-Sent Events wire format for one event"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+class MarketFeed:
+    """Fans incremental market events out to streaming subscribers.
+
+    Each event is encoded once no matter how many subscribers there are, and
+    publishing is a no-op while nobody is subscribed. Must be used from the
+    event loop thread.
+    """
+
+    def __init__(self, max_events_per_subscriber: int = 1000):
+        self.max_events_per_subscriber = max_events_per_subscriber
+        self.subscribers: Set[Subscription] = set()
+        # Called with (event_type, data, key) for every event, e.g. to relay it to other processes
+        self.forwarders: List[Callable] = []
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_events_per_subscriber)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.subscribers or self.forwarders)
+
+    def publish(self, event_type: str, data, key: Optional[Hashable] = None) -> None:
+        for forward in self.forwarders:
+            forward(event_type, data, key)
+        if not self.subscribers:
+            return
+        event = encode_event(event_type, data)
+        for subscription in self.subscribers:
+            subscription.push(event, key)
@@ -0,0 +1,192 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; from sub-millisecond cache hits up to slow full-history dumps
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class Histogram:
+    """Cumulative-bucket histogram; observing is a bisect and three additions"""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metrics:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    Histograms and counters are updated on the hot path and cost a dict
+    lookup and a few additions. Gauges such as book depth are not tracked
+    at all between scrapes; collectors registered with `add_collector`
+    compute them when /metrics is read.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, Tuple[str, str, Optional[Tuple[float, ...]]]] = {}
+        self._series: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, dict, float]]]] = []
+
+    def _declare(self, name: str, kind: str, help: str, buckets=None) -> None:
+        self._families[name] = (kind, help, buckets)
+        self._series.setdefault(name, {})
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self._declare(name, "histogram", help, buckets)
+
+    def counter(self, name: str, help: str) -> None:
+        self._declare(name, "counter", help)
+
+    def gauge(self, name: str, help: str) -> None:
+        self._declare(name, "gauge", help)
+
+    def add_collector(self, collect: Callable[[], Iterable[Tuple[str, dict, float]]]) -> None:
+        """Register a callable yielding (name, labels, value) samples at scrape time"""
+        self._collectors.append(collect)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        series = self._series[name]
+        key = tuple(labels.items())
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self._families[name][2])
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        series = self._series[name]
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0) + amount
+
+    def render(self) -> str:
+        collected: Dict[str, Dict[tuple, float]] = {}
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                collected.setdefault(name, {})[tuple(labels.items())] = value
+
+        lines = []
+        for name, (kind, help, buckets) in self._families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            # Copy so a concurrent first observation cannot break the iteration
+            series = dict(self._series[name])
+            series.update(collected.get(name, {}))
+            for labels, value in series.items():
+                if kind != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), value.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template.
+
+    Routes are labelled by their template (/companies/{name}) rather than the
+    raw path so the number of series stays bounded.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+        metrics.histogram("siphon_http_request_duration_seconds", "Time to produce a complete HTTP response")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.metrics.observe(
+                "siphon_http_request_duration_seconds",
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route.path if route is not None else "unmatched",
+                status=str(status)
+            )
+
+class SamplingProfiler:
+    """Statistical profiler that samples the stacks of all other threads.
+
+    While running, a background thread wakes every `interval` seconds and
+    counts the current stack of every thread, so the cost is independent of
+    how much code runs in between. Results are in the collapsed format read
+    by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self, interval: Optional[float] = None) -> None:
+        if self._running:
+            return
+        if interval:
+            self.interval = interval
+        self.samples.clear()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while self._running:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(names))] += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
@@ -1,7 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from enum import Enum
 from typing import Optional, List
 from datetime import datetime
+from units import unit_factor
 
 class Commodity(str, Enum):
     ELECTRICITY = "Electricity"
@@ -45,6 +46,14 @@ class Trade(BaseModel):
     time: Optional[datetime] = None
     requester_company: str
     fulfiller_company: Optional[str] = None
+    # Pending orders are withdrawn from the book once this time has passed
+    expires_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_unit(self) -> "Trade":
+        # Raises for units that cannot be converted to the commodity's canonical unit
+        unit_factor(self.commodity, self.amount.measurement_unit)
+        return self
     
     def __eq__(self, other):
         if not isinstance(other, Trade):
@@ -59,6 +68,11 @@ class ResourceState(BaseModel):
     status: ResourceStatus
     amount: Amount
 
+    @model_validator(mode="after")
+    def check_unit(self) -> "ResourceState":
+        unit_factor(self.commodity, self.amount.measurement_unit)
+        return self
+
 class Company(BaseModel):
     name: str
     location: str
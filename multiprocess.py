@@ -0,0 +1,491 @@
+import asyncio
+import json
+import os
+import secrets
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener, wait
+from typing import Dict, List, Optional, Tuple
+from models import Trade, Company, Commodity
+from fills import Fill
+from units import canonical_unit
+from history_archive import HistoryArchive
+from trading_system import TradingSystem
+from sequencer import MatchingSequencer
+
+# Sequence number and payload length in front of the snapshot bytes
+HEADER = struct.Struct("=QQ")
+
+class SharedSnapshot:
+    """A bytes payload in shared memory guarded by a seqlock.
+
+    The single writer makes the sequence number odd while it rewrites the
+    payload and even again afterwards. Readers retry until they see the same
+    even number before and after copying, so they never need a lock and
+    never see a torn payload.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+
+    @classmethod
+    def create(cls, size: int) -> "SharedSnapshot":
+        shm = shared_memory.SharedMemory(create=True, size=HEADER.size + size)
+        HEADER.pack_into(shm.buf, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedSnapshot":
+        # Workers are spawned by the engine process and share its resource
+        # tracker, so the segment is still unlinked exactly once, by the owner
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def version(self) -> int:
+        seq, _ = HEADER.unpack_from(self.shm.buf, 0)
+        return seq // 2
+
+    def publish(self, payload: bytes) -> None:
+        if HEADER.size + len(payload) > self.shm.size:
+            raise ValueError(f"Snapshot of {len(payload)} bytes does not fit in shared memory")
+        buf = self.shm.buf
+        seq, _ = HEADER.unpack_from(buf, 0)
+        struct.pack_into("=Q", buf, 0, seq + 1)
+        buf[HEADER.size:HEADER.size + len(payload)] = payload
+        HEADER.pack_into(buf, 0, seq + 1, len(payload))
+        struct.pack_into("=Q", buf, 0, seq + 2)
+
+    def read(self) -> Tuple[int, bytes]:
+        buf = self.shm.buf
+        while True:
+            seq, length = HEADER.unpack_from(buf, 0)
+            if not seq % 2:
+                payload = bytes(buf[HEADER.size:HEADER.size + length])
+                if struct.unpack_from("=Q", buf, 0)[0] == seq:
+                    return seq // 2, payload
+            # The writer is mid-publish; let it run instead of spinning
+            time.sleep(0)
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _dump_trades(trades: List[Trade]) -> List[dict]:
+    return [trade.model_dump(mode="json") for trade in trades]
+
+class EngineServer:
+    """Owns the TradingSystem and serves it to API worker processes.
+
+    Workers forward every write over a command connection and one engine
+    thread applies them, so there is still exactly one writer. After each
+    round of commands the book, companies and top of book are published to a
+    SharedSnapshot. Each commodity's part of the snapshot is encoded once
+    and reused until its book changes, so a round only pays for the books
+    it touched. New fills and feed events are streamed
+    to every replica so workers can answer history and analytics reads
+    locally. Between command rounds the engine also withdraws expired
+    orders and, with an `auction_interval`, runs the call auction itself.
+    """
+
+    def __init__(self, trading_system: TradingSystem, market_feed=None, host: str = "127.0.0.1", snapshot_size: int = 64 * 1024 * 1024, auction_interval: Optional[float] = None):
+        self.trading_system = trading_system
+        self.auction_interval = auction_interval
+        self._next_auction = None
+        self.authkey = secrets.token_bytes(16)
+        self.listener = Listener((host, 0), authkey=self.authkey)
+        self.snapshot = SharedSnapshot.create(snapshot_size)
+        self._running = False
+        self._lock = threading.Lock()
+        self._joining: List[Tuple[str, object]] = []
+        self._command_connections = []
+        self._replicas = []
+        self._outbox = []
+        # Commodity -> (bid version, ask version, encoded snapshot parts)
+        self._encoded_books: Dict[Commodity, Tuple[int, int, Dict[str, bytes]]] = {}
+        self._encoded_companies: Optional[bytes] = None
+
+        trading_system.add_fill_listener(lambda fill: self._outbox.append(("fill", fill.to_dict())))
+        trading_system.trade_history.spill_listeners.append(lambda meta: self._outbox.append(("spill", meta)))
+        if market_feed is not None:
+            market_feed.forwarders.append(
+                lambda event_type, data, key: self._outbox.append(("event", event_type, data, key))
+            )
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that let worker processes find this engine"""
+        host, port = self.listener.address
+        return {
+            "SIPHON_ENGINE_ADDRESS": f"{host}:{port}",
+            "SIPHON_ENGINE_AUTHKEY": self.authkey.hex(),
+            "SIPHON_SNAPSHOT_NAME": self.snapshot.name,
+        }
+
+    def start(self) -> None:
+        self._running = True
+        if self.auction_interval:
+            self._next_auction = time.monotonic() + self.auction_interval
+        self._publish()
+        threading.Thread(target=self._accept, name="engine-accept", daemon=True).start()
+        self._thread = threading.Thread(target=self._serve, name="engine", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._thread.join()
+        self.listener.close()
+        self.snapshot.close()
+
+    def _accept(self) -> None:
+        while self._running:
+            try:
+                connection = self.listener.accept()
+                kind = connection.recv()
+            except (OSError, EOFError):
+                continue
+            with self._lock:
+                self._joining.append((kind, connection))
+
+    def _admit(self) -> None:
+        """Add newly connected workers between command rounds, when the outbox is empty"""
+        with self._lock:
+            joining, self._joining = self._joining, []
+        for kind, connection in joining:
+            if kind == "replica":
+                connection.send(("history", self.trading_system.trade_history.to_columns()))
+                self._replicas.append(connection)
+            else:
+                self._command_connections.append(connection)
+
+    def _serve(self) -> None:
+        while self._running:
+            self._admit()
+            replies = []
+            for connection in wait(self._command_connections, timeout=0.2):
+                try:
+                    name, args = connection.recv()
+                except (EOFError, OSError):
+                    self._command_connections.remove(connection)
+                    continue
+                try:
+                    replies.append((connection, ("ok", self._apply(name, args))))
+                except Exception as e:
+                    replies.append((connection, ("error", repr(e))))
+
+            changed = False
+            due = self.trading_system.next_expiry()
+            if due is not None and due <= time.time():
+                self.trading_system.expire_orders()
+                changed = True
+            if self._next_auction is not None and time.monotonic() >= self._next_auction:
+                self._next_auction = time.monotonic() + self.auction_interval
+                try:
+                    self.trading_system.call_auction()
+                except Exception as e:
+                    print(f"Warning: call auction failed: {e!r}")
+                changed = True
+
+            if replies or changed:
+                self._publish()
+            self._flush()
+            for connection, reply in replies:
+                try:
+                    connection.send(reply)
+                except OSError:
+                    pass
+
+    def _apply(self, name: str, args):
+        trading_system = self.trading_system
+        if name == "add_trade":
+            order, fills = trading_system.add_trade(Trade.model_validate(args))
+            return {"trade": order.model_dump(mode="json"), "fills": [fill.to_dict() for fill in fills]}
+        if name == "add_trades":
+            return trading_system.add_trades([Trade.model_validate(data) for data in args])
+        if name == "call_auction":
+            return trading_system.call_auction()
+        if name == "add_company":
+            self._encoded_companies = None
+            return trading_system.add_company(Company.model_validate(args))
+        if name == "remove_company":
+            self._encoded_companies = None
+            return trading_system.remove_company(args)
+        raise ValueError(f"Unknown engine command {name}")
+
+    def _encode_book(self, commodity: Commodity) -> Dict[str, bytes]:
+        """One commodity's offers, requests, top of book and depth as JSON fragments"""
+        trading_system = self.trading_system
+        book = trading_system.order_books[commodity]
+        match = trading_system.find_matching_trades(commodity)
+        match = {
+            key: value.model_dump(mode="json") if isinstance(value, Trade) else value
+            for key, value in match.items()
+        }
+        return {
+            # Without brackets, so the books can be joined into one list
+            "offers": b",".join(book.asks.json_rows()),
+            "requests": b",".join(book.bids.json_rows()),
+            "matching": json.dumps(match).encode(),
+            "depth": json.dumps(trading_system.market_depth(commodity)).encode(),
+        }
+
+    def _publish(self) -> None:
+        trading_system = self.trading_system
+        parts = {}
+        for commodity in Commodity:
+            book = trading_system.order_books[commodity]
+            cached = self._encoded_books.get(commodity)
+            if cached is None or cached[:2] != (book.bids.version, book.asks.version):
+                cached = self._encoded_books[commodity] = (book.bids.version, book.asks.version, self._encode_book(commodity))
+            parts[commodity] = cached[2]
+        if self._encoded_companies is None:
+            self._encoded_companies = json.dumps(
+                [company.model_dump(mode="json") for company in trading_system.get_all_companies()]
+            ).encode()
+
+        def joined(field: str) -> bytes:
+            return b"[" + b", ".join(part[field] for part in parts.values() if part[field]) + b"]"
+
+        def keyed(field: str) -> bytes:
+            return b"{" + b", ".join(
+                json.dumps(commodity.value).encode() + b": " + part[field] for commodity, part in parts.items()
+            ) + b"}"
+
+        payload = b"".join([
+            b'{"offers": ', joined("offers"),
+            b', "requests": ', joined("requests"),
+            b', "companies": ', self._encoded_companies,
+            b', "matching": ', keyed("matching"),
+            b', "depth": ', keyed("depth"),
+            b"}",
+        ])
+        try:
+            self.snapshot.publish(payload)
+        except ValueError as e:
+            print(f"Warning: {e}")
+
+    def _flush(self) -> None:
+        if not self._outbox:
+            return
+        outbox, self._outbox = self._outbox, []
+        for connection in list(self._replicas):
+            try:
+                connection.send(("batch", outbox))
+            except OSError:
+                self._replicas.remove(connection)
+
+class ReplicaTradingSystem(TradingSystem):
+    """API worker view of a TradingSystem owned by an EngineServer.
+
+    Writes are forwarded to the engine and block until it has applied them.
+    The book and companies are read from the engine's shared memory
+    snapshot. Fills are replicated into a local history, so
+    history and analytics queries run inside the worker.
+    """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes, snapshot_name: str, market_feed=None):
+        # Only the history side of TradingSystem lives in the worker
+        self.trade_history = HistoryArchive(read_only=True)
+        self.fill_listeners = []
+        self.history_listeners = []
+        self.market_feed = market_feed
+        self.journal = None
+
+        self._address = address
+        self._authkey = authkey
+        self._commands = None
+        self._command_lock = threading.Lock()
+        self._snapshot = SharedSnapshot.attach(snapshot_name)
+        self._state_version = -1
+        self._state = None
+        self._replication = None
+
+    @classmethod
+    def from_environment(cls, market_feed=None) -> "ReplicaTradingSystem":
+        host, port = os.environ["SIPHON_ENGINE_ADDRESS"].rsplit(":", 1)
+        return cls(
+            (host, int(port)),
+            bytes.fromhex(os.environ["SIPHON_ENGINE_AUTHKEY"]),
+            os.environ["SIPHON_SNAPSHOT_NAME"],
+            market_feed=market_feed
+        )
+
+    def _client(self, kind: str):
+        connection = Client(self._address, authkey=self._authkey)
+        connection.send(kind)
+        return connection
+
+    def connect(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Open the command and replication connections once the worker is serving.
+
+        Spawned workers import the application module twice, so nothing
+        connects at import time.
+        """
+        self._commands = self._client("commands")
+        self._replication = self._client("replica")
+        # The engine sends its full history before any replicated fill
+        _, columns = self._replication.recv()
+        self.trade_history = HistoryArchive.from_columns(columns)
+        self.restore_history(self.trade_history)
+
+        def receive():
+            while True:
+                try:
+                    message = self._replication.recv()
+                except (EOFError, OSError):
+                    return
+                loop.call_soon_threadsafe(self._apply_replicated, message[1])
+
+        threading.Thread(target=receive, name="replication", daemon=True).start()
+
+    def _call(self, name: str, args):
+        with self._command_lock:
+            self._commands.send((name, args))
+            status, result = self._commands.recv()
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def add_trade(self, trade: Trade) -> Tuple[Trade, List[Fill]]:
+        result = self._call("add_trade", trade.model_dump(mode="json"))
+        return Trade.model_validate(result["trade"]), [Fill.from_dict(data) for data in result["fills"]]
+
+    def add_trades(self, trades: List[Trade]) -> List[dict]:
+        return self._call("add_trades", _dump_trades(trades))
+
+    def call_auction(self) -> List[dict]:
+        return self._call("call_auction", None)
+
+    def add_company(self, company: Company) -> None:
+        self._call("add_company", company.model_dump(mode="json"))
+
+    def remove_company(self, name: str) -> None:
+        self._call("remove_company", name)
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def _read_state(self) -> dict:
+        if self._state_version != self._snapshot.version:
+            version, payload = self._snapshot.read()
+            state = json.loads(payload) if payload else {"offers": [], "requests": [], "companies": [], "matching": {}, "depth": {}}
+            state["offer_dicts"], state["request_dicts"] = state["offers"], state["requests"]
+            state["offers"] = [Trade.model_validate(data) for data in state["offers"]]
+            state["requests"] = [Trade.model_validate(data) for data in state["requests"]]
+            state["companies"] = {data["name"]: Company.model_validate(data) for data in state["companies"]}
+            self._state, self._state_version = state, version
+        return self._state
+
+    @property
+    def offers(self) -> List[Trade]:
+        return self._read_state()["offers"]
+
+    @property
+    def requests(self) -> List[Trade]:
+        return self._read_state()["requests"]
+
+    def offer_dicts(self) -> List[dict]:
+        return self._read_state()["offer_dicts"]
+
+    def request_dicts(self) -> List[dict]:
+        return self._read_state()["request_dicts"]
+
+    @property
+    def companies(self) -> Dict[str, Company]:
+        return self._read_state()["companies"]
+
+    def find_matching_trades(self, commodity: Commodity) -> dict:
+        return self._read_state()["matching"][commodity.value]
+
+    def market_depth(self, commodity: Commodity, levels: Optional[int] = None) -> dict:
+        depth = self._read_state()["depth"].get(commodity.value, {"commodity": commodity, "unit": canonical_unit(commodity), "bids": [], "asks": []})
+        return dict(depth, bids=depth["bids"][:levels], asks=depth["asks"][:levels])
+
+    # The book itself and everything that changes it outside a forwarded
+    # command only exist in the engine process
+
+    @property
+    def order_books(self):
+        raise RuntimeError("The order books live in the engine process; API workers read the snapshot")
+
+    @property
+    def trading_logic(self):
+        raise RuntimeError("Matching runs in the engine process, not in API workers")
+
+    def run_auction(self, orders: List[Trade], reference_prices: Dict[Commodity, float]) -> List[dict]:
+        raise RuntimeError("Auctions run in the engine process; use call_auction")
+
+    def expire_orders(self, commodities=None) -> float:
+        raise RuntimeError("The engine process withdraws expired orders between command rounds")
+
+    def next_expiry(self) -> Optional[float]:
+        # Nothing for a worker to withdraw, see expire_orders
+        return None
+
+    def extend_history(self, trades: List[Trade]) -> None:
+        raise RuntimeError("History is bulk-loaded in the engine process and replicated to API workers")
+
+    def book_depth(self) -> Dict[Commodity, Dict[str, int]]:
+        depth = {commodity: {"bid": 0, "ask": 0} for commodity in Commodity}
+        for trade in self.requests:
+            depth[trade.commodity]["bid"] += 1
+        for trade in self.offers:
+            depth[trade.commodity]["ask"] += 1
+        return depth
+
+    def _apply_replicated(self, items: list) -> None:
+        for item in items:
+            if item[0] == "fill":
+                self.record_fill(Fill.from_dict(item[1]))
+            elif item[0] == "spill":
+                # The engine moved a day to disk; read it from the same segment file
+                self.trade_history.adopt(item[1])
+            elif item[0] == "event" and self.market_feed:
+                self.market_feed.publish(item[1], item[2], key=item[3])
+
+    def close(self) -> None:
+        if self._commands:
+            self._commands.close()
+        if self._replication:
+            self._replication.close()
+        self._snapshot.close()
+
+class ReplicaSequencer(MatchingSequencer):
+    """MatchingSequencer stand-in for API workers.
+
+    Commands run on a thread so waiting for the engine does not block the
+    event loop; ordering is the engine's job. Read snapshots are keyed on the
+    engine snapshot version plus the local history length.
+    """
+
+    def __init__(self, replica: ReplicaTradingSystem):
+        self.replica = replica
+        self._snapshots = {}
+
+    @property
+    def version(self):
+        return (self.replica.version, len(self.replica.trade_history))
+
+    @property
+    def running(self) -> bool:
+        return True
+
+    @property
+    def pending(self) -> int:
+        return 0
+
+    def start(self) -> None:
+        self.replica.connect(asyncio.get_running_loop())
+
+    async def stop(self) -> None:
+        self.replica.close()
+
+    async def submit(self, command, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, command, *args)
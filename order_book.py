@@ -0,0 +1,343 @@
+import heapq
+import itertools
+import orjson
+import sys
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from models import Trade, TradeType, TradeStatus, Commodity, Amount, Price
+from units import unit_factor
+
+# Removed entries a heap may hold beyond its live ones before it is rebuilt
+COMPACT_SLACK = 64
+
+
+class BookEntry:
+    """The matching engine's own record of an order.
+
+    Orders are copied out of the pydantic Trade once, when they enter the
+    engine, into plain slots: company, unit and currency names are interned
+    so the many orders of a company share one string, and the price and
+    amounts are converted to the commodity's canonical unit so orders quoted
+    in different units compare directly. Fills only lower `remaining`, and
+    `view` builds a Trade again for the API and the market feed.
+    """
+    __slots__ = (
+        "id", "commodity", "side", "company", "fulfiller", "time", "expires_at",
+        "unit", "currency", "price", "amount",
+        "seq", "active", "factor", "unit_price", "quantity", "remaining", "completed_at",
+        "_json",
+    )
+
+    def __init__(self, trade: Trade, seq: int, remaining: Optional[float] = None):
+        self.id = trade.id
+        self.commodity = trade.commodity
+        self.side = trade.type
+        self.company = sys.intern(trade.requester_company)
+        self.fulfiller = trade.fulfiller_company
+        self.time = trade.time
+        self.expires_at = trade.expires_at
+        self.unit = sys.intern(trade.amount.measurement_unit)
+        self.currency = sys.intern(trade.price.currency)
+        # Price and amount as submitted, in the order's own unit
+        self.price = trade.price.value
+        self.amount = trade.amount.value
+        self.seq = seq
+        # Whether the entry is resting on a side; set by BookSide.push
+        self.active = False
+        self.factor = unit_factor(self.commodity, self.unit)
+        self.unit_price = self.price / self.factor
+        self.quantity = self.amount * self.factor
+        self.remaining = self.quantity if remaining is None else remaining
+        self.completed_at = None
+        # (remaining, completed_at, encoded to_dict) as of the last to_json
+        self._json = None
+
+    @property
+    def pending(self) -> bool:
+        return self.remaining > 0
+
+    def _open_amount(self) -> float:
+        # Rounded so converting to canonical units and back leaves no float noise
+        return round(self.remaining / self.factor, 9)
+
+    def view(self, submitted: Optional[Trade] = None) -> Trade:
+        """The order as clients see it, in its own unit: the amount still open
+        while pending, or the order as submitted with a completed status and
+        time once filled.
+
+        Passing the Trade the entry was made from, while the caller still
+        has it, lets the view be copied from it instead of built field by
+        field.
+        """
+        if not self.pending:
+            update = {"status": TradeStatus.COMPLETED, "time": self.completed_at}
+        elif self.remaining == self.quantity:
+            update = {}
+        else:
+            update = {"amount": Amount.model_construct(value=self._open_amount(), measurement_unit=self.unit)}
+
+        if submitted is not None:
+            return submitted.model_copy(update=update) if update else submitted
+        return Trade.model_construct(**dict({
+            "id": self.id,
+            "commodity": self.commodity,
+            "type": self.side,
+            "amount": Amount.model_construct(value=self.amount, measurement_unit=self.unit),
+            "price": Price.model_construct(value=self.price, currency=self.currency),
+            "status": TradeStatus.PENDING,
+            "time": self.time,
+            "requester_company": self.company,
+            "fulfiller_company": self.fulfiller,
+            "expires_at": self.expires_at,
+        }, **update))
+
+    def to_dict(self) -> dict:
+        """Same as view().model_dump(mode="json") without building the Trade,
+        for order lists and feed events that are only encoded.
+        """
+        completed = not self.pending
+        return {
+            "id": self.id,
+            "commodity": self.commodity.value,
+            "type": self.side.value,
+            "amount": {
+                "value": self.amount if completed or self.remaining == self.quantity else self._open_amount(),
+                "measurement_unit": self.unit,
+            },
+            "price": {"value": self.price, "currency": self.currency},
+            "status": TradeStatus.COMPLETED.value if completed else TradeStatus.PENDING.value,
+            "time": _iso(self.completed_at if completed else self.time),
+            "requester_company": self.company,
+            "fulfiller_company": self.fulfiller,
+            "expires_at": _iso(self.expires_at),
+        }
+
+    def to_json(self) -> bytes:
+        """to_dict encoded with orjson, kept until the entry is filled again"""
+        cached = self._json
+        if cached is None or cached[0] != self.remaining or cached[1] is not self.completed_at:
+            cached = self._json = (self.remaining, self.completed_at, orjson.dumps(self.to_dict()))
+        return cached[2]
+
+
+def _iso(time: Optional[datetime]) -> Optional[str]:
+    # Formatted the way pydantic dumps datetimes in JSON mode
+    if time is None:
+        return None
+    text = time.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+class BookSide:
+    """One side of an order book kept in price-time priority on a binary heap.
+
+    Bids are keyed on the negated unit price so the best price is always at
+    the top of the heap for both sides. Removed entries are only flagged and skipped
+    lazily when they reach the top.
+
+    Aggregated price levels (total remaining amount and order count per
+    price) are kept next to the heap and updated on every push, removal and
+    fill, with the level keys in a sorted list, so market depth is read
+    without looking at individual orders.
+
+    When removed entries make up most of the heap it is rebuilt from the
+    live ones, so cancelled and expired orders do not keep it growing.
+
+    `version` counts pushes, fills and removals, so callers can tell
+    whether a side changed since they last read it.
+    """
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.version = 0
+        self._heap: List[tuple] = []
+        self._size = 0
+        # Heap key -> [total remaining amount, order count]
+        self._levels: Dict[float, list] = {}
+        self._level_keys: List[float] = []
+
+    def _key(self, entry: BookEntry) -> float:
+        return -entry.unit_price if self.is_bid else entry.unit_price
+
+    def push(self, entry: BookEntry) -> None:
+        self.version += 1
+        entry.active = True
+        key = self._key(entry)
+        heapq.heappush(self._heap, (key, entry.seq, entry))
+        self._size += 1
+        level = self._levels.get(key)
+        if level is None:
+            self._levels[key] = [entry.remaining, 1]
+            insort(self._level_keys, key)
+        else:
+            level[0] += entry.remaining
+            level[1] += 1
+
+    def _leave_level(self, entry: BookEntry) -> None:
+        key = self._key(entry)
+        level = self._levels[key]
+        level[1] -= 1
+        if level[1]:
+            level[0] -= entry.remaining
+        else:
+            # Dropping empty levels also drops any rounding drift in their total
+            del self._levels[key]
+            del self._level_keys[bisect_left(self._level_keys, key)]
+
+    def fill(self, entry: BookEntry, quantity: float) -> None:
+        """Lower an entry's remaining amount, keeping its level total in step while it rests"""
+        if entry.active:
+            self.version += 1
+            self._levels[self._key(entry)][0] -= quantity
+        entry.remaining -= quantity
+
+    def peek(self) -> Optional[BookEntry]:
+        """Return the best resting entry without removing it"""
+        heap = self._heap
+        while heap and not heap[0][2].active:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def pop(self) -> Optional[BookEntry]:
+        """Remove and return the best resting entry"""
+        entry = self.peek()
+        if entry is not None:
+            self.version += 1
+            heapq.heappop(self._heap)
+            entry.active = False
+            self._size -= 1
+            self._leave_level(entry)
+        return entry
+
+    def discard(self, entry: BookEntry) -> None:
+        """Remove an arbitrary entry; it is dropped from the heap lazily"""
+        if entry.active:
+            self.version += 1
+            entry.active = False
+            self._size -= 1
+            self._leave_level(entry)
+            if len(self._heap) > 2 * self._size + COMPACT_SLACK:
+                self._heap = [item for item in self._heap if item[2].active]
+                heapq.heapify(self._heap)
+
+    def crosses(self, price: float) -> bool:
+        """Whether an incoming order at this price can trade with the top of this side"""
+        best = self.best_price()
+        if best is None:
+            return False
+        if self.is_bid:
+            return best >= price
+        return best <= price
+
+    def best_price(self) -> Optional[float]:
+        if not self._level_keys:
+            return None
+        key = self._level_keys[0]
+        return -key if self.is_bid else key
+
+    def depth(self, levels: Optional[int] = None) -> List[Tuple[float, float, int]]:
+        """(unit price, total remaining amount, order count) for the best `levels` prices, best first"""
+        keys = self._level_keys if levels is None else self._level_keys[:levels]
+        sign = -1 if self.is_bid else 1
+        return [(sign * key, *self._levels[key]) for key in keys]
+
+    def trades(self) -> List[Trade]:
+        """Resting orders in priority order, with their remaining amounts"""
+        return [entry.view() for entry in self.entries()]
+
+    def dicts(self) -> List[dict]:
+        """Same as trades, as JSON-ready dicts"""
+        return [entry.to_dict() for entry in self.entries()]
+
+    def json_rows(self) -> List[bytes]:
+        """Same as dicts, each already encoded"""
+        return [entry.to_json() for entry in self.entries()]
+
+    def entries(self) -> List[BookEntry]:
+        return [entry for _, _, entry in sorted(self._heap) if entry.active]
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class OrderBook:
+    """Bid and ask sides for a single commodity.
+
+    Orders with an expiry are also kept on a heap keyed by expiry time, so
+    finding the orders due is a look at its top and each one is withdrawn
+    in O(log n). Orders filled or cancelled before they expire are skipped
+    when they reach the top.
+    """
+
+    def __init__(self, commodity: Commodity):
+        self.commodity = commodity
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self._entries: Dict[str, BookEntry] = {}
+        self._seq = itertools.count()
+        # (expiry epoch seconds, seq, entry)
+        self._expiries: List[tuple] = []
+
+    def side_for(self, trade_type: TradeType) -> BookSide:
+        """The side a trade of this type rests on"""
+        return self.bids if trade_type == TradeType.BUY else self.asks
+
+    def opposite_side(self, trade_type: TradeType) -> BookSide:
+        """The side a trade of this type matches against"""
+        return self.asks if trade_type == TradeType.BUY else self.bids
+
+    def add(self, trade: Trade, remaining: Optional[float] = None) -> BookEntry:
+        return self.rest(BookEntry(trade, -1, remaining))
+
+    def rest(self, entry: BookEntry) -> BookEntry:
+        """Put an entry on its side with the next time priority, e.g. the unfilled rest of an incoming order"""
+        entry.seq = next(self._seq)
+        self._entries[entry.id] = entry
+        self.side_for(entry.side).push(entry)
+        if entry.expires_at is not None:
+            if len(self._expiries) > 2 * len(self._entries) + COMPACT_SLACK:
+                self._expiries = [item for item in self._expiries if self._entries.get(item[2].id) is item[2]]
+                heapq.heapify(self._expiries)
+            heapq.heappush(self._expiries, (entry.expires_at.timestamp(), entry.seq, entry))
+        return entry
+
+    def remove(self, entry: BookEntry) -> None:
+        """Forget an entry that has already been popped or discarded from its side"""
+        if self._entries.get(entry.id) is entry:
+            del self._entries[entry.id]
+
+    def fill(self, entry: BookEntry, quantity: float) -> None:
+        self.side_for(entry.side).fill(entry, quantity)
+
+    def cancel(self, trade_id: str) -> Optional[Trade]:
+        entry = self._entries.pop(trade_id, None)
+        if entry is None:
+            return None
+        self.side_for(entry.side).discard(entry)
+        return entry.view()
+
+    def next_expiry(self) -> Optional[float]:
+        """Epoch seconds of the earliest pending expiry, possibly of an order that is already gone"""
+        return self._expiries[0][0] if self._expiries else None
+
+    def expire(self, now: float) -> List[Trade]:
+        """Cancel every resting order that expires at or before `now` (epoch seconds)"""
+        expired = []
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            entry = heapq.heappop(expiries)[2]
+            if self._entries.get(entry.id) is entry:
+                expired.append(self.cancel(entry.id))
+        return expired
+
+    def best_bid(self) -> Optional[Trade]:
+        entry = self.bids.peek()
+        return entry.view() if entry else None
+
+    def best_ask(self) -> Optional[Trade]:
+        entry = self.asks.peek()
+        return entry.view() if entry else None
+
+    def __len__(self) -> int:
+        return len(self.bids) + len(self.asks)
@@ -0,0 +1,225 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from models import Company, Commodity, TradeType, ResourceStatus
+from price_aggregator import PriceAggregator, bucket_start
+from history_archive import HistoryArchive
+from trade_store import TradeStore, COMMODITIES, TRADE_TYPES, TRADE_TYPE_CODES, NO_TIME
+from units import unit_factor, canonical_unit
+from fills import Fill
+
+class Position:
+    """Running totals of one company's fills in one commodity.
+
+    Volumes are in the commodity's canonical unit and notionals in the fill
+    currency. Savings compare each fill with the market price, the mean of
+    its hourly price bucket: a buyer saves when paying below it and a seller
+    when selling above it. Fills are summed per bucket (quantity bought minus
+    sold, and the notional the other way round), so savings are priced
+    against each bucket as it stands when they are read, no matter whether
+    a fill was recorded live or restored from history.
+    """
+    __slots__ = ("bought", "sold", "buy_notional", "sell_notional", "buckets", "fills", "currency")
+
+    def __init__(self):
+        self.bought = 0.0
+        self.sold = 0.0
+        self.buy_notional = 0.0
+        self.sell_notional = 0.0
+        # Hourly bucket start -> [signed quantity, signed notional]
+        self.buckets: Dict[int, list] = {}
+        self.fills = 0
+        self.currency: Optional[str] = None
+
+    def add(self, side: TradeType, price: float, quantity: float, bucket: Optional[int], currency: str) -> None:
+        notional = price * quantity
+        if side == TradeType.BUY:
+            self.bought += quantity
+            self.buy_notional += notional
+        else:
+            self.sold += quantity
+            self.sell_notional += notional
+            quantity, notional = -quantity, -notional
+        # Fills without a time are taken to be at the market price and save nothing
+        if bucket is not None:
+            totals = self.buckets.get(bucket)
+            if totals is None:
+                self.buckets[bucket] = [quantity, -notional]
+            else:
+                totals[0] += quantity
+                totals[1] -= notional
+        self.fills += 1
+        self.currency = currency
+
+    def savings(self, aggregator: PriceAggregator, commodity: Commodity) -> float:
+        total = 0.0
+        for start, (quantity, notional) in self.buckets.items():
+            bucket = aggregator.bucket(commodity, start)
+            if bucket is not None:
+                total += bucket.mean * quantity + notional
+        return total
+
+    @property
+    def net(self) -> float:
+        """Bought minus sold"""
+        return self.bought - self.sold
+
+    @property
+    def buy_vwap(self) -> Optional[float]:
+        return self.buy_notional / self.bought if self.bought else None
+
+    @property
+    def sell_vwap(self) -> Optional[float]:
+        return self.sell_notional / self.sold if self.sold else None
+
+    @property
+    def vwap(self) -> Optional[float]:
+        volume = self.bought + self.sold
+        return (self.buy_notional + self.sell_notional) / volume if volume else None
+
+
+class PositionBook:
+    """Per-company, per-commodity positions kept up to date on every fill.
+
+    Both sides of a fill are updated with a couple of dict lookups, so a
+    company's running totals never need a scan of the history. The current
+    surplus or deficit is the company's declared status moved by what it has
+    traded since the declaration (its `last_active` time): selling uses up a
+    surplus and buying covers a deficit. That net amount is kept per
+    declaration too. The first read after a company is declared, or declared
+    again, catches up on fills already recorded since then from the history,
+    and from there on the fills keep it current.
+    """
+
+    def __init__(self, aggregator: PriceAggregator):
+        self.aggregator = aggregator
+        self._positions: Dict[str, Dict[Commodity, Position]] = {}
+        # Company -> (declaration time in epoch seconds, net amount traded since per commodity)
+        self._declarations: Dict[str, Tuple[float, Dict[Commodity, float]]] = {}
+
+    def _position(self, company: str, commodity: Commodity) -> Position:
+        positions = self._positions.get(company)
+        if positions is None:
+            positions = self._positions[company] = {}
+        position = positions.get(commodity)
+        if position is None:
+            position = positions[commodity] = Position()
+        return position
+
+    def _add(self, commodity: Commodity, taker_side: TradeType, taker: Optional[str], maker: Optional[str], price: float, quantity: float, epoch: Optional[float], currency: str) -> None:
+        bucket = bucket_start(epoch, "hour") if epoch is not None else None
+        maker_side = TradeType.SELL if taker_side == TradeType.BUY else TradeType.BUY
+        for company, side in ((taker, taker_side), (maker, maker_side)):
+            if company is None:
+                continue
+            self._position(company, commodity).add(side, price, quantity, bucket, currency)
+            declaration = self._declarations.get(company)
+            if declaration is not None and epoch is not None and epoch >= declaration[0]:
+                traded = declaration[1]
+                traded[commodity] = traded.get(commodity, 0.0) + (quantity if side == TradeType.BUY else -quantity)
+
+    def record_fill(self, fill: Fill) -> None:
+        """Apply an execution to the taker's and the maker's positions"""
+        self._add(
+            fill.commodity, fill.taker_side, fill.taker_company, fill.maker_company,
+            fill.price, fill.quantity, fill.time.timestamp() if fill.time else None, fill.currency
+        )
+
+    def record_history(self, history: TradeStore, start: int = 0) -> None:
+        """Apply stored history rows from `start` onwards straight from its columns"""
+        companies = history.companies
+        currencies = history.currencies
+        for code, type_code, requester, fulfiller, epoch_us, price, amount, currency in zip(
+            history.commodities[start:].tolist(),
+            history.types[start:].tolist(),
+            history.requesters[start:].tolist(),
+            history.fulfillers[start:].tolist(),
+            history.times[start:].tolist(),
+            history.prices[start:].tolist(),
+            history.amounts[start:].tolist(),
+            history.currency_codes[start:].tolist()
+        ):
+            self._add(
+                COMMODITIES[code], TRADE_TYPES[type_code], companies.value(requester), companies.value(fulfiller),
+                price, amount, epoch_us / 1_000_000 if epoch_us != NO_TIME else None, currencies.value(currency)
+            )
+
+    def traded_since(self, company: Company, history: HistoryArchive) -> Dict[Commodity, float]:
+        """Net amount bought (positive) or sold (negative) per commodity since the company's declaration"""
+        declared_at = company.last_active.timestamp()
+        declaration = self._declarations.get(company.name)
+        if declaration is None or declaration[0] != declared_at:
+            declaration = self._declarations[company.name] = (declared_at, self._scan_since(company, history))
+        return declaration[1]
+
+    def _scan_since(self, company: Company, history: HistoryArchive) -> Dict[Commodity, float]:
+        buy = TRADE_TYPE_CODES[TradeType.BUY]
+        net = np.zeros(len(COMMODITIES))
+        pages, _ = history.query(company=company.name, start=company.last_active)
+        for store, rows in pages:
+            rows = np.asarray(rows, dtype=np.int64)
+            # A requester trades on the row's side and a fulfiller on the other one
+            bought = (store.types[rows] == buy) == (store.requesters[rows] == store.companies.lookup(company.name))
+            net += np.bincount(
+                store.commodities[rows],
+                weights=np.where(bought, store.amounts[rows], -store.amounts[rows]),
+                minlength=len(COMMODITIES)
+            )
+        return {commodity: float(amount) for commodity, amount in zip(COMMODITIES, net.tolist()) if amount}
+
+    def open_amounts(self, company: Company, history: HistoryArchive) -> Dict[Commodity, float]:
+        """Surplus (positive) or deficit (negative) still open per declared commodity.
+
+        It never exceeds the declaration or changes sign: a surplus that has
+        been sold is closed, not turned into a deficit, and buying on top of a
+        surplus does not grow it.
+        """
+        declared: Dict[Commodity, float] = {}
+        for state in company.statuses:
+            amount = state.amount.value * unit_factor(state.commodity, state.amount.measurement_unit)
+            declared[state.commodity] = declared.get(state.commodity, 0.0) + (
+                amount if state.status == ResourceStatus.SURPLUS else -amount
+            )
+        traded = self.traded_since(company, history)
+        amounts = {}
+        for commodity, amount in declared.items():
+            remaining = amount + traded.get(commodity, 0.0)
+            amounts[commodity] = min(max(remaining, 0.0), amount) if amount > 0 else max(min(remaining, 0.0), amount)
+        return amounts
+
+    def positions(self, company: Company, history: HistoryArchive) -> dict:
+        """Positions of a company in every commodity it has traded or declared a status for"""
+        traded = self._positions.get(company.name, {})
+        open_amounts = self.open_amounts(company, history)
+
+        positions: List[dict] = []
+        total_savings = 0.0
+        currency = None
+        for commodity in Commodity:
+            if commodity not in open_amounts and commodity not in traded:
+                continue
+            position = traded.get(commodity) or Position()
+            open_amount = open_amounts.get(commodity, 0.0)
+            savings = position.savings(self.aggregator, commodity)
+            positions.append({
+                "commodity": commodity,
+                "unit": canonical_unit(commodity),
+                "bought": position.bought,
+                "sold": position.sold,
+                "net": position.net,
+                "buy_vwap": position.buy_vwap,
+                "sell_vwap": position.sell_vwap,
+                "vwap": position.vwap,
+                "realized_savings": savings,
+                "fills": position.fills,
+                "status": ResourceStatus.SURPLUS if open_amount > 0 else ResourceStatus.DEFICIT if open_amount < 0 else None,
+                "open_amount": abs(open_amount),
+            })
+            total_savings += savings
+            currency = currency or position.currency
+
+        return {
+            "company": company.name,
+            "currency": currency or "EUR",
+            "realized_savings": total_savings,
+            "positions": positions,
+        }
@@ -0,0 +1,139 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from models import Trade, Commodity
+
+# Bucket widths in seconds for each maintained resolution
+RESOLUTIONS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+}
+
+# Shift of each resolution's bucket grid from the epoch; weeks start on
+# Monday while the epoch fell on a Thursday
+OFFSETS = {
+    "week": 4 * 86400,
+}
+
+def bucket_start(epoch: float, resolution: str) -> int:
+    """Start epoch of the `resolution` bucket holding `epoch`"""
+    width = RESOLUTIONS[resolution]
+    offset = OFFSETS.get(resolution, 0)
+    return int((epoch - offset) // width) * width + offset
+
+class PriceBucket:
+    """Running OHLC-style statistics for the trades inside one time bucket"""
+    __slots__ = ("start", "count", "total", "minimum", "maximum", "volume", "notional")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+        self.volume = 0.0
+        self.notional = 0.0
+
+    def add(self, price: float, amount: float) -> None:
+        self.count += 1
+        self.total += price
+        if price < self.minimum:
+            self.minimum = price
+        if price > self.maximum:
+            self.maximum = price
+        self.volume += amount
+        self.notional += price * amount
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.start, timezone.utc)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    @property
+    def vwap(self) -> float:
+        return self.notional / self.volume if self.volume else self.mean
+
+class PriceAggregator:
+    """Per-commodity price buckets updated incrementally as trades complete.
+
+    Each (commodity, resolution) pair keeps its buckets in a dict keyed by the
+    bucket start epoch, plus a sorted list of those starts so a timeframe query
+    is a bisect and a slice instead of a scan over the whole history.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[Commodity, str], Dict[int, PriceBucket]] = {}
+        self._starts: Dict[Tuple[Commodity, str], List[int]] = {}
+        for commodity in Commodity:
+            for resolution in RESOLUTIONS:
+                self._buckets[(commodity, resolution)] = {}
+                self._starts[(commodity, resolution)] = []
+
+    def add_trade(self, trade: Trade) -> Optional[PriceBucket]:
+        if trade.time is None:
+            return None
+        return self.add(trade.commodity, trade.time.timestamp(), trade.price.value, trade.amount.value)
+
+    def add(self, commodity: Commodity, epoch: float, price: float, amount: float) -> PriceBucket:
+        """Fold one trade into every resolution and return its hourly bucket"""
+        updated = None
+        for resolution, width in RESOLUTIONS.items():
+            key = (commodity, resolution)
+            buckets = self._buckets[key]
+            offset = OFFSETS.get(resolution, 0)
+            start = int((epoch - offset) // width) * width + offset
+            bucket = buckets.get(start)
+            if bucket is None:
+                bucket = buckets[start] = PriceBucket(start)
+                starts = self._starts[key]
+                # Trades almost always arrive in time order, so appending is the common case
+                if not starts or starts[-1] < start:
+                    starts.append(start)
+                else:
+                    insort(starts, start)
+            bucket.add(price, amount)
+            if updated is None:
+                updated = bucket
+        return updated
+
+    def bucket(self, commodity: Commodity, epoch: float, resolution: str = "hour") -> Optional[PriceBucket]:
+        """The bucket holding `epoch`, if any trade has landed in it"""
+        return self._buckets[(commodity, resolution)].get(bucket_start(epoch, resolution))
+
+    def latest(self, commodity: Commodity, resolution: str = "hour") -> Optional[PriceBucket]:
+        """The most recent bucket of a commodity"""
+        key = (commodity, resolution)
+        starts = self._starts[key]
+        return self._buckets[key][starts[-1]] if starts else None
+
+    def range(
+        self,
+        commodity: Commodity,
+        start_time: datetime,
+        end_time: Optional[datetime] = None,
+        resolution: str = "hour"
+    ) -> List[PriceBucket]:
+        """Buckets overlapping [start_time, end_time) in chronological order"""
+        key = (commodity, resolution)
+        starts = self._starts[key]
+        lo = bisect_left(starts, bucket_start(start_time.timestamp(), resolution))
+        hi = bisect_left(starts, end_time.timestamp()) if end_time else len(starts)
+        buckets = self._buckets[key]
+        return [buckets[start] for start in starts[lo:hi]]
+
+    def series(
+        self,
+        commodity: Commodity,
+        start_time: datetime,
+        resolution: str = "hour"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Bucket start epochs (seconds) and mean prices as parallel arrays"""
+        buckets = self.range(commodity, start_time, resolution=resolution)
+        starts = np.fromiter((bucket.start for bucket in buckets), dtype=np.int64, count=len(buckets))
+        means = np.fromiter((bucket.mean for bucket in buckets), dtype=np.float64, count=len(buckets))
+        return starts, means
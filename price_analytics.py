@@ -1,62 +1,107 @@
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict
-from collections import defaultdict
-import statistics
+from typing import List, Optional, Tuple
+import numpy as np
 from models import Trade, PricePoint, Commodity, TimeFrame
-import json
-from pathlib import Path
+from price_aggregator import PriceAggregator, RESOLUTIONS
+from downsampling import lttb
+from market_feed import MarketFeed
+from trade_store import TradeStore, COMMODITIES, NO_TIME
+from fills import Fill
+
+# Rollup each timeframe's price series is read from when no point limit is given
+TIMEFRAME_RESOLUTIONS = {
+    TimeFrame.DAY: "hour",
+    TimeFrame.WEEK: "hour",
+    TimeFrame.MONTH: "day",
+    TimeFrame.YEAR: "day",
+}
 
 class PriceAnalytics:
-    def __init__(self):
-        json_path = Path(__file__).parent / "demo_trades.json"
-        with open(json_path, 'r') as f:
-            self.trades = json.load(f)
+    def __init__(self, aggregator: Optional[PriceAggregator] = None, market_feed: Optional[MarketFeed] = None):
+        self.aggregator = aggregator or PriceAggregator()
+        self.market_feed = market_feed
+
+    def record_fill(self, fill: Fill) -> None:
+        """Fold an execution into the hourly, daily and weekly price buckets"""
+        if fill.time is None:
+            return
+        bucket = self.aggregator.add(fill.commodity, fill.time.timestamp(), fill.price, fill.quantity)
+        if self.market_feed and self.market_feed.active:
+            self.market_feed.publish(
+                "price_bucket",
+                {
+                    "commodity": fill.commodity.value,
+                    "timestamp": bucket.timestamp.isoformat(),
+                    "count": bucket.count,
+                    "mean": bucket.mean,
+                    "vwap": bucket.vwap,
+                    "min": bucket.minimum,
+                    "max": bucket.maximum,
+                    "volume": bucket.volume
+                },
+                key=("bucket", fill.commodity, bucket.start)
+            )
 
-    def _get_trades_in_timeframe(self, commodity: Commodity, timeframe: TimeFrame) -> List[Dict]:
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - self.get_time_delta(timeframe)
-        
-        filtered_trades = [
-            trade for trade in self.trades
-            if (trade['commodity'].lower() == commodity.value.lower() and
-                datetime.fromisoformat(trade['time'].replace('Z', '+00:00')) >= start_time)
-        ]
-        
-        return filtered_trades
+    def record_history(self, history: TradeStore, start: int = 0) -> None:
+        """Fold stored history rows from `start` onwards into the buckets straight from its columns"""
+        for code, epoch_us, price, amount in zip(
+            history.commodities[start:].tolist(),
+            history.times[start:].tolist(),
+            history.prices[start:].tolist(),
+            history.amounts[start:].tolist()
+        ):
+            if epoch_us != NO_TIME:
+                self.aggregator.add(COMMODITIES[code], epoch_us / 1_000_000, price, amount)
 
     def calculate_average_prices(
         self,
         trades: List[Trade],
         commodity: Commodity,
-        timeframe: TimeFrame
+        timeframe: TimeFrame,
+        max_points: Optional[int] = None
     ) -> List[PricePoint]:
-        relevant_trades = self._get_trades_in_timeframe(commodity, timeframe)
-        
-        # Group trades by hour
-        hourly_prices = defaultdict(list)
-        for trade in relevant_trades:
-            timestamp = datetime.fromisoformat(trade['time'].replace('Z', '+00:00'))
-            # Round to nearest hour, preserving timezone
-            timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
-            hourly_prices[timestamp].append(trade['price']['value'])
-        
-        # Calculate average price for each hour
-        price_points = [
-            PricePoint(
-                timestamp=timestamp,
-                price=statistics.mean(prices) if prices else 0
-            )
-            for timestamp, prices in sorted(hourly_prices.items())
-        ]
-        
-        return price_points
+        """Average price per bucket over the timeframe, read straight from the precomputed rollups.
+
+        Without `max_points` the rollup comes from TIMEFRAME_RESOLUTIONS. With
+        it, the coarsest rollup that still has at least `max_points` buckets in
+        the window is taken and downsampled to that many points with LTTB, so
+        long ranges keep their peaks without sending every hourly bucket.
+        """
+        start_time = datetime.now(timezone.utc) - self.get_time_delta(timeframe)
+        resolution = self.get_resolution(timeframe, max_points)
+        buckets = self.aggregator.range(commodity, start_time, resolution=resolution)
+        if max_points is not None and len(buckets) > max_points:
+            starts = np.fromiter((bucket.start for bucket in buckets), dtype=np.float64, count=len(buckets))
+            means = np.fromiter((bucket.mean for bucket in buckets), dtype=np.float64, count=len(buckets))
+            buckets = [buckets[index] for index in lttb(starts, means, max_points).tolist()]
+        return [PricePoint(timestamp=bucket.timestamp, price=bucket.mean) for bucket in buckets]
 
     def get_market_prices(
         self,
         commodity: Commodity,
-        timeframe: TimeFrame
+        timeframe: TimeFrame,
+        max_points: Optional[int] = None
     ) -> List[PricePoint]:
-        return self.calculate_average_prices([], commodity, timeframe)
+        return self.calculate_average_prices([], commodity, timeframe, max_points)
+
+    @classmethod
+    def get_resolution(cls, timeframe: TimeFrame, max_points: Optional[int] = None) -> str:
+        """Rollup a price series over the timeframe is read from"""
+        if max_points is None:
+            return TIMEFRAME_RESOLUTIONS[timeframe]
+        span = cls.get_time_delta(timeframe).total_seconds()
+        # Finest first, so the last one still holding enough buckets is the coarsest
+        fitting = [resolution for resolution, width in RESOLUTIONS.items() if span / width >= max_points]
+        return fitting[-1] if fitting else min(RESOLUTIONS, key=RESOLUTIONS.get)
+
+    def get_market_price_series(
+        self,
+        commodity: Commodity,
+        timeframe: TimeFrame
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same data as get_market_prices as sorted (epoch seconds, price) arrays"""
+        start_time = datetime.now(timezone.utc) - self.get_time_delta(timeframe)
+        return self.aggregator.series(commodity, start_time)
 
     @staticmethod
     def get_time_delta(timeframe: TimeFrame) -> timedelta:
@@ -65,4 +110,4 @@ class PriceAnalytics:
             TimeFrame.WEEK: timedelta(days=7),
             TimeFrame.MONTH: timedelta(days=30),
             TimeFrame.YEAR: timedelta(days=365)
-        }[timeframe]
\ No newline at end of file
+        }[timeframe]
@@ -1,68 +1,92 @@
-from datetime import datetime
-from typing import List, Optional
-from models import Trade, TimeFrame, SavingsResult, Commodity, PricePoint
+from datetime import datetime, timezone
+from typing import Optional, Union
+import numpy as np
+from models import TimeFrame, SavingsResult, Commodity, TradeStatus
 from price_analytics import PriceAnalytics
+from trade_store import TradeStore, COMMODITIES
+from history_archive import HistoryArchive
 
 class SavingsCalculator:
     def __init__(self, price_analytics: PriceAnalytics):
         self.price_analytics = price_analytics
 
-    def _get_market_price_at_time(self, commodity: Commodity, trade_time: datetime, market_prices: List[PricePoint]) -> float:
-        # Find the closest market price point to the trade time
-        closest_price_point = min(
-            market_prices,
-            key=lambda x: abs((x.timestamp - trade_time).total_seconds()),
-            default=None
-        )
-        return closest_price_point.price if closest_price_point else 0
+    @staticmethod
+    def _nearest_market_prices(trade_times: np.ndarray, market_times: np.ndarray, market_prices: np.ndarray) -> np.ndarray:
+        """Closest market price to each trade time via a batched binary search.
+
+        Both time arrays must share a unit and market_times must be sorted. On
+        a tie the earlier price point wins. Without any market prices every
+        trade is priced at 0.
+        """
+        if not len(market_times):
+            return np.zeros(len(trade_times))
+
+        right = np.searchsorted(market_times, trade_times)
+        left = np.clip(right - 1, 0, len(market_times) - 1)
+        right = np.clip(right, 0, len(market_times) - 1)
+        use_right = np.abs(market_times[right] - trade_times) < np.abs(trade_times - market_times[left])
+        return market_prices[np.where(use_right, right, left)]
 
     def calculate_savings(
         self,
-        trades: List[Trade],
+        trades: Union[TradeStore, HistoryArchive],
         timeframe: TimeFrame,
         company_name: Optional[str] = None
     ) -> SavingsResult:
-        cutoff_time = datetime.now() - self.price_analytics.get_time_delta(timeframe)
-        
-        # Filter trades by time and company if specified
-        relevant_trades = [
-            trade for trade in trades
-            if trade.status == TradeStatus.COMPLETED
-            and trade.time and trade.time >= cutoff_time
-            and (not company_name or 
-                 trade.requester_company == company_name or 
-                 trade.fulfiller_company == company_name)
-        ]
+        """Savings over a TradeStore or a HistoryArchive.
+
+        Only the partitions that overlap the timeframe and hold trades of the
+        company are read.
+        """
+        cutoff_time = datetime.now(timezone.utc) - self.price_analytics.get_time_delta(timeframe)
 
         total_savings = 0
         savings_by_commodity = {commodity: 0 for commodity in Commodity}
-        currency = relevant_trades[0].price.currency if relevant_trades else "EUR"
+        currency = None
+        market_series = {}
 
-        # Calculate savings for each commodity
-        for commodity in Commodity:
-            commodity_trades = [t for t in relevant_trades if t.commodity == commodity]
-            if not commodity_trades:
+        for store in trades.partitions(start=cutoff_time, company=company_name):
+            # Filter trades by time and company if specified
+            relevant_rows = np.flatnonzero(store.mask(
+                start=cutoff_time,
+                company=company_name,
+                status=TradeStatus.COMPLETED
+            ))
+            if not len(relevant_rows):
                 continue
+            if currency is None:
+                currency = store.trade(int(relevant_rows[0])).price.currency
 
-            # Get market prices for the timeframe
-            market_prices = self.price_analytics.get_market_prices(commodity, timeframe)
+            commodity_codes = store.commodities[relevant_rows]
 
-            # Calculate savings for each trade
-            for trade in commodity_trades:
-                market_price = self._get_market_price_at_time(
-                    commodity,
-                    trade.time,
+            # Calculate savings for each commodity
+            for code, commodity in enumerate(COMMODITIES):
+                commodity_rows = relevant_rows[commodity_codes == code]
+                if not len(commodity_rows):
+                    continue
+
+                # Get market prices for the timeframe, in microseconds like the store
+                if commodity not in market_series:
+                    market_times, market_prices = self.price_analytics.get_market_price_series(commodity, timeframe)
+                    market_series[commodity] = (market_times * 1_000_000, market_prices)
+                market_times, market_prices = market_series[commodity]
+                market_prices_at_trade = self._nearest_market_prices(
+                    store.times[commodity_rows],
+                    market_times,
                     market_prices
                 )
-                
-                # Calculate savings (market price - actual price) * amount
-                trade_savings = (market_price - trade.price.value) * trade.amount.value
-                savings_by_commodity[commodity] += trade_savings
-                total_savings += trade_savings
+
+                # Savings are sum((market price - actual price) * amount)
+                commodity_savings = float(np.dot(
+                    market_prices_at_trade - store.prices[commodity_rows],
+                    store.amounts[commodity_rows]
+                ))
+                savings_by_commodity[commodity] += commodity_savings
+                total_savings += commodity_savings
 
         return SavingsResult(
             total_savings=total_savings,
             savings_by_commodity=savings_by_commodity,
-            currency=currency,
+            currency=currency or "EUR",
             timeframe=timeframe
         )
\ No newline at end of file
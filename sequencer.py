@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class MatchingSequencer:
+    """Single writer for a TradingSystem.
+
+    Request handlers never mutate the book themselves. They submit commands
+    to a bounded asyncio queue and await the result. One sequencer task runs
+    the commands strictly in arrival order, so matching stays deterministic
+    and there are no concurrent writers to guard against.
+
+    Every command bumps `version`. Reads go through `read`, which caches a
+    plain-data snapshot per version: repeated reads between writes are served
+    from the cache without locks, and a reader never sees a half-applied
+    command.
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self.max_pending = max_pending
+        self.version = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._snapshots: Dict[Hashable, Tuple[int, Any]] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the sequencer task on the running event loop"""
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Finish the commands already queued, then stop"""
+        if self.running:
+            await self._queue.put(None)
+            await self._task
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, command: Callable, *args) -> Any:
+        """Queue a command and wait until the sequencer has applied it"""
+        if not self.running:
+            # Before startup (e.g. while loading data) there is nothing to race with
+            result = command(*args)
+            self.version += 1
+            return result
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((command, args, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            command, args, future = item
+            try:
+                result = command(*args)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self.version += 1
+
+    def read(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """Snapshot of `build()` for the current version, built at most once per version.
+
+        `build` should return plain data (dicts, lists, numbers) so later
+        commands cannot change a snapshot that is still being sent.
+        """
+        cached = self._snapshots.get(key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        value = build()
+        self._snapshots[key] = (self.version, value)
+        return value
@@ -0,0 +1,136 @@
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from models import Trade, Amount, Price, Commodity, TradeStatus
+from trade_store import TradeStore, COMMODITIES, TRADE_TYPES, TRADE_STATUS_CODES, to_epoch_us
+
+# Same price model as seed_demo_data.js
+COMMODITY_CONFIGS = {
+    Commodity.ELECTRICITY: {"base_price": 27, "unit": "MWh", "volatility": 0.25, "trend_factor": 3},
+    Commodity.HYDROGEN: {"base_price": 6, "unit": "kg", "volatility": 0.35, "trend_factor": 3},
+    Commodity.HEAT: {"base_price": 46.7, "unit": "GJ", "volatility": 0.2, "trend_factor": 3},
+    Commodity.GAS: {"base_price": 8, "unit": "MMBtu", "volatility": 0.3, "trend_factor": 3},
+}
+
+COMPANY_NAMES = [
+    "EcoGrid Solutions",
+    "GreenHydro Corp",
+    "SolarTech Industries",
+    "WindPower Dynamics",
+    "ThermalEnergy Plus",
+    "HydrogenTech Solutions",
+]
+
+HOUR_US = 3600 * 1_000_000
+DAY_US = 24 * HOUR_US
+
+# (age of the period's oldest trade, age of its newest, trades per period in
+# the demo data): every 30 minutes for a day, every 2 hours for a week, every
+# 6 hours for a month and daily for the rest of the year
+DENSITY = [
+    (DAY_US, 0, 48),
+    (7 * DAY_US, DAY_US, 72),
+    (30 * DAY_US, 7 * DAY_US, 92),
+    (365 * DAY_US, 30 * DAY_US, 335),
+]
+
+def _prices(rng: np.random.Generator, commodity_codes: np.ndarray, age_us: np.ndarray) -> np.ndarray:
+    base = np.array([COMMODITY_CONFIGS[commodity]["base_price"] for commodity in COMMODITIES])
+    volatility = np.array([COMMODITY_CONFIGS[commodity]["volatility"] for commodity in COMMODITIES])
+    trend = np.array([COMMODITY_CONFIGS[commodity]["trend_factor"] for commodity in COMMODITIES])
+
+    # Base price increases with trend as we approach today
+    trended = base[commodity_codes] * (1 + (1 - age_us / (365 * DAY_US)) * trend[commodity_codes])
+    prices = trended * (1 + rng.uniform(-1, 1, len(age_us)) * volatility[commodity_codes])
+    # Occasional price spikes (5% chance) of up to 50%
+    spikes = rng.random(len(age_us)) < 0.05
+    prices[spikes] *= 1 + rng.random(int(spikes.sum())) * 0.5
+    return prices
+
+def generate_history(size: int, seed: int = 0, now: Optional[datetime] = None) -> TradeStore:
+    """A year of completed trades shaped like the demo data, at any size.
+
+    Columns are generated with NumPy and loaded into the store directly, so
+    10^7 trades take seconds and no Trade objects are built.
+    """
+    rng = np.random.default_rng(seed)
+    now_us = to_epoch_us(now or datetime.now(timezone.utc))
+
+    # Spread the trades over the periods in the demo data's proportions
+    weights = np.array([count for _, _, count in DENSITY], dtype=float)
+    period = rng.choice(len(DENSITY), size=size, p=weights / weights.sum())
+    oldest = np.array([oldest for oldest, _, _ in DENSITY])[period]
+    newest = np.array([newest for _, newest, _ in DENSITY])[period]
+    age_us = newest + (rng.random(size) * (oldest - newest)).astype(np.int64)
+    age_us.sort()
+    age_us = age_us[::-1]
+
+    commodity_codes = rng.integers(0, len(COMMODITIES), size)
+    requesters = rng.integers(0, len(COMPANY_NAMES), size)
+    # Anyone but the requester
+    fulfillers = (requesters + rng.integers(1, len(COMPANY_NAMES), size)) % len(COMPANY_NAMES)
+
+    return TradeStore.from_columns({
+        "size": size,
+        "columns": {
+            "time": now_us - age_us,
+            "commodity": commodity_codes.astype(np.int8),
+            "type": rng.integers(0, len(TRADE_TYPES), size).astype(np.int8),
+            "status": np.full(size, TRADE_STATUS_CODES[TradeStatus.COMPLETED], dtype=np.int8),
+            "requester": requesters.astype(np.int32),
+            "fulfiller": fulfillers.astype(np.int32),
+            "price": _prices(rng, commodity_codes, age_us),
+            "amount": rng.integers(50, 150, size).astype(np.float64),
+            # Units are stored in commodity order, so the unit code is the commodity code
+            "unit": commodity_codes.astype(np.int16),
+            "currency": np.zeros(size, dtype=np.int16),
+        },
+        "ids": [f"synthetic-{row}" for row in range(size)],
+        "companies": COMPANY_NAMES,
+        "units": [COMMODITY_CONFIGS[commodity]["unit"] for commodity in COMMODITIES],
+        "currencies": ["EUR"],
+    })
+
+def generate_orders(count: int, seed: int = 0) -> List[Trade]:
+    """Pending buy and sell orders priced around today's trended base price.
+
+    Prices on both sides overlap, so roughly half of the orders cross and
+    the rest rest in the book, which exercises both matching and insertion.
+    """
+    rng = np.random.default_rng(seed)
+    commodity_codes = rng.integers(0, len(COMMODITIES), count)
+    prices = _prices(rng, commodity_codes, np.zeros(count)).round(2)
+    types = rng.integers(0, len(TRADE_TYPES), count)
+    amounts = rng.integers(1, 100, count)
+    companies = rng.integers(0, len(COMPANY_NAMES), count)
+
+    orders = []
+    for index in range(count):
+        commodity = COMMODITIES[commodity_codes[index]]
+        orders.append(Trade.model_construct(
+            id=f"order-{seed}-{index}",
+            commodity=commodity,
+            type=TRADE_TYPES[types[index]],
+            amount=Amount.model_construct(
+                value=float(amounts[index]),
+                measurement_unit=COMMODITY_CONFIGS[commodity]["unit"]
+            ),
+            price=Price.model_construct(value=float(prices[index]), currency="EUR"),
+            status=TradeStatus.PENDING,
+            time=None,
+            requester_company=COMPANY_NAMES[companies[index]],
+            fulfiller_company=None
+        ))
+    return orders
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic demo_trades.json of any size")
+    parser.add_argument("size", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Path(__file__).parent / "demo_trades.json")
+    args = parser.parse_args()
+
+    args.output.write_bytes(generate_history(args.size, args.seed).trades_json())
+    print(f"Wrote {args.size} trades to {args.output}")
@@ -0,0 +1,30 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import Trade, Company, ResourceState  # noqa: E402
+
+def order(id: str, side: str, company: str, amount: float, price: float, commodity: str = "Gas", unit: str = "MMBtu") -> Trade:
+    return Trade(
+        id=id,
+        commodity=commodity,
+        type=side,
+        amount={"value": amount, "measurement_unit": unit},
+        price={"value": price, "currency": "EUR"},
+        status="Pending",
+        requester_company=company
+    )
+
+def company(name: str, *statuses, last_active: datetime = None) -> Company:
+    """A company declaring (commodity, "surplus" or "deficit", amount in MMBtu) statuses"""
+    return Company(
+        name=name,
+        location="Amsterdam",
+        statuses=[
+            ResourceState(commodity=commodity, status=status, amount={"value": amount, "measurement_unit": "MMBtu"})
+            for commodity, status, amount in statuses
+        ],
+        last_active=last_active or datetime.now(timezone.utc)
+    )
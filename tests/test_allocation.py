@@ -0,0 +1,57 @@
+import pytest
+from conftest import order
+from trading_system import TradingSystem
+
+def resting(trading_system):
+    return [(trade.id, trade.amount.value) for trade in trading_system.get_offers()]
+
+def test_pro_rata_splits_a_level_by_remaining_amount():
+    trading_system = TradingSystem(allocation="pro_rata")
+    trading_system.add_trade(order("s1", "sell", "A", 6, 10))
+    trading_system.add_trade(order("s2", "sell", "B", 3, 10))
+    trading_system.add_trade(order("s3", "sell", "C", 1, 10))
+    trading_system.add_trade(order("s4", "sell", "C", 4, 11))
+
+    taker, fills = trading_system.add_trade(order("b1", "buy", "D", 5, 11))
+    assert taker.status == "Completed"
+    assert [(fill.maker_order_id, fill.quantity) for fill in fills] == [("s1", 3), ("s2", 1.5), ("s3", 0.5)]
+    assert resting(trading_system) == [("s1", 3), ("s2", 1.5), ("s3", 0.5), ("s4", 4)]
+
+def test_pro_rata_fills_the_whole_level_before_the_next_price():
+    trading_system = TradingSystem(allocation="pro_rata")
+    trading_system.add_trade(order("s1", "sell", "A", 2, 10))
+    trading_system.add_trade(order("s2", "sell", "B", 2, 10))
+    trading_system.add_trade(order("s3", "sell", "C", 4, 11))
+
+    _, fills = trading_system.add_trade(order("b1", "buy", "D", 6, 11))
+    assert [(fill.maker_order_id, fill.quantity, fill.price) for fill in fills] == [("s1", 2, 10), ("s2", 2, 10), ("s3", 2, 11)]
+    assert resting(trading_system) == [("s3", 2)]
+
+def test_pro_rata_skips_the_takers_own_orders():
+    trading_system = TradingSystem(allocation="pro_rata")
+    trading_system.add_trade(order("s1", "sell", "A", 4, 10))
+    trading_system.add_trade(order("s2", "sell", "B", 4, 10))
+
+    _, fills = trading_system.add_trade(order("b1", "buy", "A", 2, 10))
+    assert [(fill.maker_order_id, fill.quantity) for fill in fills] == [("s2", 2)]
+    assert resting(trading_system) == [("s1", 4), ("s2", 2)]
+
+def test_rounding_residue_below_dust_completes_an_order():
+    trading_system = TradingSystem(allocation="pro_rata")
+    for i, company in enumerate("ABC"):
+        trading_system.add_trade(order(f"s{i}", "sell", company, 1, 10))
+
+    # Each order is left with ~3e-13 after its share, which is dust
+    _, fills = trading_system.add_trade(order("b1", "buy", "D", 3 - 1e-12, 10))
+    assert len(fills) == 3
+    assert sum(fill.quantity for fill in fills) == pytest.approx(3)
+    assert resting(trading_system) == []
+
+def test_fills_carry_utc_times_that_match_the_history():
+    trading_system = TradingSystem()
+    trading_system.add_trade(order("s1", "sell", "A", 5, 10))
+    taker, fills = trading_system.add_trade(order("b1", "buy", "B", 5, 10))
+
+    assert fills[0].time.utcoffset().total_seconds() == 0
+    assert taker.time == fills[0].time
+    assert [trade.time for trade in trading_system.get_trade_history()] == [fills[0].time]
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+import pytest
+from fastapi.testclient import TestClient
+from analytics_cache import AnalyticsCache, etag_matches
+
+def test_entries_are_reused_until_invalidated():
+    cache = AnalyticsCache()
+    values = iter(range(10))
+    build = lambda: {"value": next(values)}
+
+    first = cache.get(("prices", "Gas", "24h", None), build)
+    assert cache.get(("prices", "Gas", "24h", None), build) is first
+    cache.invalidate("any", "listener", "arguments")
+    rebuilt = cache.get(("prices", "Gas", "24h", None), build)
+    assert rebuilt.body == b'{"value":1}' and rebuilt.etag != first.etag
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_an_identical_rebuild_keeps_its_etag():
+    cache = AnalyticsCache()
+    first = cache.get(("savings", None, "7d", None), lambda: [1, 2])
+    cache.invalidate()
+    assert cache.get(("savings", None, "7d", None), lambda: [1, 2]).etag == first.etag
+
+def test_entries_expire_and_the_least_recently_used_is_evicted(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("analytics_cache.time.monotonic", lambda: clock[0])
+    cache = AnalyticsCache(max_entries=2, max_age=60)
+    a = cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: 1)
+    cache.get("c", lambda: 3)
+    assert cache.stats()["entries"] == 2
+    cache.get("b", lambda: 2)
+    assert cache.misses == 4
+
+    clock[0] += 61
+    assert cache.get("a", lambda: 1) is not a
+
+def test_if_none_match_forms():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches("", '"abc"')
+
+@pytest.fixture
+def client():
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+def test_unchanged_analytics_answer_304_until_a_trade_lands(client):
+    response = client.get("/analytics/prices/gas/1y")
+    etag = response.headers["etag"]
+    assert response.status_code == 200
+    assert client.get("/analytics/prices/gas/1y", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/trades/offer", json={
+        "id": "cache-test",
+        "commodity": "Gas",
+        "type": "sell",
+        "amount": {"value": 1, "measurement_unit": "MMBtu"},
+        "price": {"value": 999, "currency": "EUR"},
+        "status": "Completed",
+        "time": datetime.now(timezone.utc).isoformat(),
+        "requester_company": "A",
+        "fulfiller_company": "B"
+    })
+    response = client.get("/analytics/prices/gas/1y", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
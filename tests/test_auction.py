@@ -0,0 +1,71 @@
+import random
+from datetime import datetime, timedelta, timezone
+from conftest import order, company
+from models import Commodity, TradeStatus
+from trading_system import TradingSystem
+from price_analytics import PriceAnalytics
+from positions import PositionBook
+from auction import CallAuction
+
+def crossed_between_companies(book) -> bool:
+    bids, asks = book.bids.entries(), book.asks.entries()
+    return any(bid.unit_price >= ask.unit_price and bid.company != ask.company for bid in bids for ask in asks)
+
+def test_self_trade_prevention_leaves_no_cross_between_companies():
+    trading_system = TradingSystem(matching="auction")
+    # The volume-maximizing price (11) ignores that A cannot trade with itself,
+    # so A's bid at 20 and X's ask at 15 are only reachable after the uniform pass
+    for trade in [
+        order("a-ask-1", "sell", "A", 60, 10),
+        order("a-bid-1", "buy", "A", 50, 20),
+        order("x-ask", "sell", "X", 1, 15),
+        order("a-ask-2", "sell", "A", 45, 10),
+        order("d-bid", "buy", "D", 1, 12),
+        order("a-bid-2", "buy", "A", 50, 20),
+    ]:
+        trading_system.add_trade(trade)
+
+    result = trading_system.call_auction()
+    book = trading_system.order_books[Commodity.GAS]
+    assert not crossed_between_companies(book)
+    assert [r["volume"] for r in result if r["commodity"] == Commodity.GAS] == [2]
+
+def test_random_books_are_left_uncrossed_between_companies():
+    rng = random.Random(7)
+    for _ in range(200):
+        trading_system = TradingSystem(matching="auction")
+        for i in range(rng.randint(1, 40)):
+            trading_system.add_trade(order(f"o{i}", rng.choice(["buy", "sell"]), rng.choice("ABCD"), rng.randint(1, 9), rng.randint(10, 20)))
+        trading_system.call_auction()
+        assert not crossed_between_companies(trading_system.order_books[Commodity.GAS])
+
+def test_auction_volume_never_exceeds_the_declared_amounts():
+    trading_system = TradingSystem(matching="auction")
+    price_analytics = PriceAnalytics()
+    position_book = PositionBook(price_analytics.aggregator)
+    trading_system.add_fill_listener(price_analytics.record_fill)
+    trading_system.add_fill_listener(position_book.record_fill)
+    auction = CallAuction(trading_system, position_book, price_analytics.aggregator)
+
+    # Earlier trades give the reference price and must not count towards the declarations
+    for i in range(3):
+        trading_system.add_trade(order(f"h{i}", "sell", "S1", 500, 40).model_copy(
+            update={"status": TradeStatus.COMPLETED, "time": datetime.now(timezone.utc), "fulfiller_company": "D1"}
+        ))
+    declared = {"S1": 50, "S2": 30, "D1": 60, "D2": 10}
+    declared_at = datetime.now(timezone.utc) - timedelta(microseconds=1)
+    trading_system.add_company(company("S1", ("Gas", "surplus", 50), last_active=declared_at))
+    trading_system.add_company(company("S2", ("Gas", "surplus", 30), last_active=declared_at))
+    trading_system.add_company(company("D1", ("Gas", "deficit", 60), last_active=declared_at))
+    trading_system.add_company(company("D2", ("Gas", "deficit", 10), last_active=declared_at))
+
+    fills = []
+    trading_system.add_fill_listener(fills.append)
+    volumes = [sum(r["volume"] for r in auction.run() if r["commodity"] == Commodity.GAS) for _ in range(3)]
+    assert volumes == [70, 0, 0]
+
+    traded = {name: 0.0 for name in declared}
+    for fill in fills:
+        traded[fill.taker_company] += fill.quantity
+        traded[fill.maker_company] += fill.quantity
+    assert all(traded[name] <= amount for name, amount in declared.items())
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from downsampling import lttb
+from models import TimeFrame
+from price_analytics import PriceAnalytics
+
+def series(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64) * 3600, rng.normal(50, 5, n)
+
+@pytest.mark.parametrize("n, points", [(0, 5), (1, 5), (5, 5), (5, 10)])
+def test_short_series_are_kept_whole(n, points):
+    x, y = series(n)
+    assert lttb(x, y, points).tolist() == list(range(n))
+
+@pytest.mark.parametrize("points, expected", [(1, [0]), (2, [0, 99])])
+def test_one_or_two_points_keep_the_ends(points, expected):
+    x, y = series(100)
+    assert lttb(x, y, points).tolist() == expected
+
+@pytest.mark.parametrize("n, points", [(100, 3), (100, 10), (101, 100), (1000, 37), (10000, 500)])
+def test_selection_is_ordered_and_keeps_both_ends(n, points):
+    x, y = series(n, seed=n)
+    selected = lttb(x, y, points)
+    assert len(selected) == points
+    assert selected[0] == 0 and selected[-1] == n - 1
+    assert np.all(np.diff(selected) > 0)
+
+def test_a_single_spike_survives():
+    x, y = series(1000)
+    y[417] = 500
+    y[803] = -400
+    selected = lttb(x, y, 20).tolist()
+    assert 417 in selected and 803 in selected
+
+def test_flat_series_still_yield_the_requested_points():
+    x = np.arange(50, dtype=np.float64)
+    assert len(lttb(x, np.zeros(50), 10)) == 10
+
+def test_resolution_is_the_coarsest_rollup_with_enough_buckets():
+    assert PriceAnalytics.get_resolution(TimeFrame.YEAR) == "day"
+    assert PriceAnalytics.get_resolution(TimeFrame.YEAR, 40) == "week"
+    assert PriceAnalytics.get_resolution(TimeFrame.YEAR, 300) == "day"
+    assert PriceAnalytics.get_resolution(TimeFrame.YEAR, 1000) == "hour"
+    # More points than even hourly buckets: the finest rollup is the best there is
+    assert PriceAnalytics.get_resolution(TimeFrame.DAY, 100) == "hour"
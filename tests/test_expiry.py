@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from conftest import order
+from models import Commodity
+from order_book import COMPACT_SLACK
+from trading_system import TradingSystem
+
+NOW = datetime(2026, 3, 2, 10, 0, tzinfo=timezone.utc)
+
+def expiring(id: str, side: str, company: str, amount: float, price: float, expires_at: datetime):
+    return order(id, side, company, amount, price).model_copy(update={"expires_at": expires_at})
+
+def pinned(trading_system: TradingSystem, time: datetime) -> None:
+    trading_system.trading_logic.clock = lambda: time
+
+def test_orders_are_withdrawn_once_their_expiry_passes():
+    trading_system = TradingSystem()
+    pinned(trading_system, NOW)
+    trading_system.add_trade(expiring("s1", "sell", "A", 5, 10, NOW + timedelta(minutes=1)))
+    trading_system.add_trade(expiring("s2", "sell", "B", 5, 11, NOW + timedelta(minutes=2)))
+    trading_system.add_trade(order("s3", "sell", "C", 5, 12))
+    assert trading_system.next_expiry() == (NOW + timedelta(minutes=1)).timestamp()
+
+    pinned(trading_system, NOW + timedelta(minutes=1))
+    trading_system.expire_orders()
+    assert [trade.id for trade in trading_system.get_offers()] == ["s2", "s3"]
+    assert trading_system.next_expiry() == (NOW + timedelta(minutes=2)).timestamp()
+
+def test_expired_orders_never_trade_even_before_eviction_runs():
+    trading_system = TradingSystem()
+    pinned(trading_system, NOW)
+    trading_system.add_trade(expiring("s1", "sell", "A", 5, 10, NOW + timedelta(minutes=1)))
+    trading_system.add_trade(order("s2", "sell", "B", 5, 11))
+
+    pinned(trading_system, NOW + timedelta(minutes=5))
+    _, fills = trading_system.add_trade(order("b1", "buy", "C", 5, 11))
+    assert [fill.maker_order_id for fill in fills] == ["s2"]
+    assert trading_system.get_offers() == []
+
+def test_orders_that_arrive_expired_are_neither_matched_nor_rested():
+    trading_system = TradingSystem()
+    pinned(trading_system, NOW)
+    trading_system.add_trade(order("s1", "sell", "A", 5, 10))
+    _, fills = trading_system.add_trade(expiring("b1", "buy", "B", 5, 10, NOW - timedelta(seconds=1)))
+    assert fills == [] and trading_system.get_requests() == []
+
+    results = trading_system.add_trades([
+        expiring("b2", "buy", "B", 5, 10, NOW - timedelta(seconds=1)),
+        expiring("b3", "buy", "B", 2, 10, NOW + timedelta(seconds=1)),
+    ])
+    assert [(result["id"], result["status"]) for result in results] == [("b2", "expired"), ("b3", "filled")]
+
+def test_heaps_are_compacted_when_removed_orders_dominate():
+    trading_system = TradingSystem()
+    pinned(trading_system, NOW)
+    for i in range(1000):
+        trading_system.add_trade(expiring(f"s{i}", "sell", "A", 1, 10 + i % 7, NOW + timedelta(seconds=1 + i % 3)))
+    trading_system.add_trade(order("keep", "sell", "A", 1, 20))
+
+    pinned(trading_system, NOW + timedelta(seconds=10))
+    trading_system.expire_orders()
+    asks = trading_system.order_books[Commodity.GAS].asks
+    assert len(asks) == 1
+    assert len(asks._heap) <= 2 * len(asks) + COMPACT_SLACK
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta, timezone
+from history_archive import HistoryArchive
+from synthetic_data import generate_history
+from trading_system import TradingSystem
+from trade_journal import TradeJournal
+from models import Trade, TradeStatus
+from fills import Fill
+
+def completed(id: str, time: datetime) -> Trade:
+    return Trade(
+        id=id,
+        commodity="Gas",
+        type="buy",
+        amount={"value": 1, "measurement_unit": "MMBtu"},
+        price={"value": 10, "currency": "EUR"},
+        status=TradeStatus.COMPLETED,
+        time=time,
+        requester_company="A",
+        fulfiller_company="B"
+    )
+
+def test_full_history_reads_cold_partitions_from_their_encoded_rows(tmp_path, monkeypatch):
+    flat = generate_history(2000, 1)
+    archive = HistoryArchive(tmp_path, hot_days=7)
+    archive.extend_store(flat)
+    expected = sorted(json.loads(flat.trades_json()), key=lambda row: row["id"])
+    assert archive.summary()["cold_partitions"]
+    assert sorted(json.loads(archive.trades_json()), key=lambda row: row["id"]) == expected
+
+    def no_segment_reads(partition):
+        raise AssertionError(f"segment {partition.segment} was decompressed")
+    monkeypatch.setattr(archive, "_read_segment", no_segment_reads)
+    assert sorted(json.loads(archive.trades_json()), key=lambda row: row["id"]) == expected
+
+def test_superseded_segments_are_deleted_after_the_next_snapshot(tmp_path):
+    now = datetime.now(timezone.utc)
+    trading_system = TradingSystem(history=HistoryArchive(tmp_path / "archive", hot_days=1))
+    journal = TradeJournal(tmp_path)
+    journal.attach(trading_system)
+    trading_system.add_trade(completed("old", now - timedelta(days=10)))
+    trading_system.add_trade(completed("new", now))
+    first = sorted(path.name for path in (tmp_path / "archive").glob("*.npz"))
+    assert len(first) == 1
+    journal.snapshot(trading_system)
+
+    # A late trade reopens the cold day, which is spilled again to a new generation
+    trading_system.add_trade(completed("late", now - timedelta(days=10)))
+    trading_system.add_trade(completed("newer", now + timedelta(days=1)))
+    assert (tmp_path / "archive" / first[0]).exists()
+    journal.snapshot(trading_system)
+    segments = sorted(path.name for path in (tmp_path / "archive").glob("*.npz"))
+    # The second generation of the old day plus today's first one
+    assert len(segments) == 2 and first[0] not in segments
+    journal.close()
+
+    recovered = TradingSystem(history=HistoryArchive(tmp_path / "archive", hot_days=1))
+    assert TradeJournal(tmp_path).recover(recovered)
+    assert sorted(trade.id for trade in recovered.trade_history) == ["late", "new", "newer", "old"]
+
+def test_late_trades_do_not_keep_old_days_in_memory(tmp_path):
+    archive = HistoryArchive(tmp_path, hot_days=7)
+    today = datetime(2026, 3, 31, 12, tzinfo=timezone.utc)
+    for days_ago in range(40, -1, -1):
+        archive.append_fill(Fill.from_trade(completed(f"t{days_ago}", today - timedelta(days=days_ago))))
+    # A trickle of backfilled trades into days long outside the hot window
+    for days_ago in range(10, 40):
+        archive.append_fill(Fill.from_trade(completed(f"late{days_ago}", today - timedelta(days=days_ago))))
+    archive.extend_store(generate_history(100, 30, now=today))
+
+    summary = archive.summary()
+    assert summary["hot_partitions"] <= 8
+    assert len(archive) == 41 + 30 + 100
+    assert {trade.id for trade in archive.trades()} >= {f"late{days_ago}" for days_ago in range(10, 40)}
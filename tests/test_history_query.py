@@ -0,0 +1,66 @@
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+from models import Trade, TradeStatus, TradeType, Commodity
+from trading_system import TradingSystem
+
+START = datetime(2026, 3, 2, tzinfo=timezone.utc)
+
+def completed(id: str, rng: random.Random) -> Trade:
+    return Trade(
+        id=id,
+        commodity=rng.choice(["Gas", "Heat"]),
+        type=rng.choice(["buy", "sell"]),
+        amount={"value": 1, "measurement_unit": "GJ"},
+        price={"value": 10, "currency": "EUR"},
+        status=TradeStatus.COMPLETED,
+        # Out of order, with ties
+        time=START + timedelta(minutes=rng.randint(0, 50)),
+        requester_company=rng.choice("ABC"),
+        fulfiller_company=rng.choice("DE")
+    )
+
+@pytest.fixture
+def history():
+    rng = random.Random(7)
+    trades = [completed(f"t{i}", rng) for i in range(200)]
+    trading_system = TradingSystem()
+    for trade in trades:
+        trading_system.add_trade(trade)
+    # Time order, ties in insertion order
+    return trading_system, sorted(trades, key=lambda trade: trade.time)
+
+def pages(trading_system, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        page, cursor = trading_system.query_trade_history(limit=limit, cursor=cursor, **filters)
+        assert len(page) <= limit
+        ids.extend(trade.id for trade in page)
+        if cursor is None:
+            return ids
+
+def test_pages_walk_the_history_in_time_order(history):
+    trading_system, trades = history
+    assert pages(trading_system, 7) == [trade.id for trade in trades]
+    assert pages(trading_system, 7, descending=True) == [trade.id for trade in reversed(trades)]
+    assert pages(trading_system, 1000) == [trade.id for trade in trades]
+
+def test_filters_combine_with_pagination(history):
+    trading_system, trades = history
+    start, end = START + timedelta(minutes=10, seconds=30), START + timedelta(minutes=40, seconds=30)
+    expected = [
+        trade.id for trade in trades
+        if trade.commodity == Commodity.HEAT
+        and "B" in (trade.requester_company, trade.fulfiller_company)
+        and trade.type == TradeType.SELL
+        and start <= trade.time < end
+    ]
+    assert expected
+    assert pages(trading_system, 3, commodity=Commodity.HEAT, company="B", side=TradeType.SELL, start=start, end=end) == expected
+    assert pages(trading_system, 3, company="D") == [trade.id for trade in trades if trade.fulfiller_company == "D"]
+
+@pytest.mark.parametrize("cursor", ["garbage", "1_x", "12"])
+def test_invalid_cursors_are_rejected(history, cursor):
+    trading_system, _ = history
+    with pytest.raises(ValueError):
+        trading_system.query_trade_history(limit=5, cursor=cursor)
@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+from conftest import order
+from trading_system import TradingSystem
+from trade_journal import TradeJournal
+
+def test_replayed_fills_keep_their_live_completion_times(tmp_path):
+    # A clock that moves on every read, like wall time between journaling and matching
+    ticks = iter(datetime(2026, 3, 2, 10, 0) + timedelta(seconds=i) for i in range(1000))
+    trading_system = TradingSystem()
+    trading_system.trading_logic.clock = lambda: next(ticks)
+    journal = TradeJournal(tmp_path)
+    journal.attach(trading_system)
+    trading_system.add_trade(order("s1", "sell", "A", 5, 10))
+    trading_system.add_trade(order("s2", "sell", "A", 5, 11))
+    trading_system.add_trade(order("b1", "buy", "B", 8, 11))
+    trading_system.add_trades([order("b2", "buy", "C", 2, 11), order("s3", "sell", "D", 1, 9)])
+    trading_system.run_auction([order("b3", "buy", "E", 4, 12)], {})
+    journal.close()
+    live = [(trade.id, trade.time) for trade in trading_system.trade_history.trades()]
+    assert len(live) == 5
+
+    recovered = TradingSystem()
+    TradeJournal(tmp_path).recover(recovered)
+    assert [(trade.id, trade.time) for trade in recovered.trade_history.trades()] == live
+    assert [trade.id for trade in recovered.offers] == [trade.id for trade in trading_system.offers]
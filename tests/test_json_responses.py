@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0, deflate", False),
+    ("*;q=0", False),
+    ("identity", False),
+    ("", False),
+])
+def test_accept_encoding_qualities(header, expected):
+    from main import _accepts_gzip
+    assert _accepts_gzip(header) is expected
+
+def test_history_is_gzipped_only_for_clients_that_accept_it(client):
+    plain = client.get("/trades/history", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert "content-encoding" not in client.get("/trades/history", headers={"Accept-Encoding": "gzip;q=0"}).headers
+
+    zipped = client.get("/trades/history", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert zipped.json() == plain.json()
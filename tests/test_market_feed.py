@@ -0,0 +1,15 @@
+import asyncio
+from market_feed import Subscription, encode_event
+
+def test_coalesced_events_keep_publication_order():
+    subscription = Subscription()
+    subscription.push(encode_event("order_added", {"id": "b1"}), key=("order", "b1"))
+    subscription.push(encode_event("fill", {"id": "s1:b1"}))
+    subscription.push(encode_event("order_completed", {"id": "b1"}), key=("order", "b1"))
+
+    batch = asyncio.run(subscription.next_batch(timeout=1))
+    assert batch == [
+        encode_event("fill", {"id": "s1:b1"}),
+        encode_event("order_completed", {"id": "b1"}),
+    ]
+    assert subscription.coalesced == 1
@@ -0,0 +1,73 @@
+import random
+from conftest import order
+from trading_system import TradingSystem
+
+def reference_book(orders):
+    """Resting (id, remaining) per side after matching every order naively against all resting ones"""
+    resting = []
+    for incoming in orders:
+        remaining = incoming.amount.value
+        while remaining:
+            crossing = [
+                entry for entry in resting
+                if entry[0].type != incoming.type
+                and entry[0].requester_company != incoming.requester_company
+                and (entry[0].price.value <= incoming.price.value if incoming.type == "buy" else entry[0].price.value >= incoming.price.value)
+            ]
+            if not crossing:
+                break
+            # Best price first, then earliest; min and max both keep the first of equal keys
+            pick = min if incoming.type == "buy" else max
+            best = pick(crossing, key=lambda entry: entry[0].price.value)
+            quantity = min(remaining, best[1])
+            remaining -= quantity
+            best[1] -= quantity
+            if not best[1]:
+                resting.remove(best)
+        if remaining:
+            resting.append([incoming, remaining])
+    sides = {"sell": [], "buy": []}
+    for trade, remaining in resting:
+        sides[trade.type].append((trade.id, remaining))
+    return sides
+
+def book(trading_system):
+    return {
+        "sell": [(trade.id, trade.amount.value) for trade in trading_system.get_offers()],
+        "buy": [(trade.id, trade.amount.value) for trade in trading_system.get_requests()],
+    }
+
+def test_matching_agrees_with_a_brute_force_reference():
+    for seed in range(20):
+        rng = random.Random(seed)
+        orders = [
+            order(f"o{i}", rng.choice(["buy", "sell"]), rng.choice("ABC"), rng.randint(1, 10), rng.randint(8, 12))
+            for i in range(150)
+        ]
+        trading_system = TradingSystem()
+        for trade in orders:
+            trading_system.add_trade(trade.model_copy(deep=True))
+        expected = reference_book(orders)
+        actual = book(trading_system)
+        # The book lists each side in priority order, the reference in arrival order
+        assert sorted(actual["sell"]) == sorted(expected["sell"])
+        assert sorted(actual["buy"]) == sorted(expected["buy"])
+
+def test_best_price_then_earliest_order_fills_first():
+    trading_system = TradingSystem()
+    trading_system.add_trade(order("s1", "sell", "A", 5, 11))
+    trading_system.add_trade(order("s2", "sell", "B", 5, 10))
+    trading_system.add_trade(order("s3", "sell", "C", 5, 10))
+    trading_system.add_trade(order("b1", "buy", "D", 7, 11))
+    # s2 is filled completely, s3 partially and s1 is not reached
+    assert book(trading_system) == {"sell": [("s3", 3), ("s1", 5)], "buy": []}
+
+def test_own_orders_are_skipped_and_keep_their_priority():
+    trading_system = TradingSystem()
+    trading_system.add_trade(order("s1", "sell", "A", 5, 9))
+    trading_system.add_trade(order("s2", "sell", "B", 5, 10))
+    trading_system.add_trade(order("b1", "buy", "A", 8, 10))
+    assert book(trading_system) == {"sell": [("s1", 5)], "buy": [("b1", 3)]}
+
+    trading_system.add_trade(order("b2", "buy", "C", 2, 10))
+    assert book(trading_system) == {"sell": [("s1", 3)], "buy": [("b1", 3)]}
@@ -0,0 +1,66 @@
+import json
+import pytest
+from conftest import order, company
+from models import Trade, Commodity
+from trading_system import TradingSystem
+from multiprocess import EngineServer, ReplicaTradingSystem
+
+def full_state(trading_system: TradingSystem) -> dict:
+    """The snapshot contents encoded from scratch"""
+    matching = {}
+    for commodity in Commodity:
+        match = trading_system.find_matching_trades(commodity)
+        matching[commodity.value] = {key: value.model_dump(mode="json") if isinstance(value, Trade) else value for key, value in match.items()}
+    return json.loads(json.dumps({
+        "offers": trading_system.offer_dicts(),
+        "requests": trading_system.request_dicts(),
+        "companies": [c.model_dump(mode="json") for c in trading_system.get_all_companies()],
+        "matching": matching,
+        "depth": {commodity.value: trading_system.market_depth(commodity) for commodity in Commodity},
+    }))
+
+@pytest.fixture
+def engine():
+    trading_system = TradingSystem()
+    engine = EngineServer(trading_system, snapshot_size=1 << 20)
+    yield engine
+    engine.listener.close()
+    engine.snapshot.close()
+
+def test_incremental_snapshots_match_a_full_encoding(engine):
+    trading_system = engine.trading_system
+    engine._apply("add_company", company("A", ("Gas", "surplus", 10)).model_dump(mode="json"))
+    engine._publish()
+    for i in range(10):
+        engine._apply("add_trade", order(f"s{i}", "sell", "A", 5, 10 + i % 4).model_dump(mode="json"))
+        engine._apply("add_trade", order(f"h{i}", "sell", "B", 3, 5 + i % 3, commodity="Heat", unit="GJ").model_dump(mode="json"))
+        engine._publish()
+        assert json.loads(engine.snapshot.read()[1]) == full_state(trading_system)
+    engine._apply("add_trade", order("b1", "buy", "C", 12, 12).model_dump(mode="json"))
+    engine._apply("remove_company", "A")
+    engine._publish()
+    assert json.loads(engine.snapshot.read()[1]) == full_state(trading_system)
+    # A partial fill that leaves the order at the top of its side
+    engine._apply("add_trade", order("b2", "buy", "D", 1, 12).model_dump(mode="json"))
+    engine._publish()
+    assert json.loads(engine.snapshot.read()[1]) == full_state(trading_system)
+
+def test_replicas_read_the_book_from_the_snapshot_and_refuse_engine_work(engine):
+    engine._apply("add_trade", order("s1", "sell", "A", 5, 10).model_dump(mode="json"))
+    engine._publish()
+    replica = ReplicaTradingSystem(("127.0.0.1", 0), b"", engine.snapshot.name)
+    try:
+        assert [trade.id for trade in replica.get_offers()] == ["s1"]
+        assert replica.find_matching_trades(Commodity.GAS)["status"] == "no_match"
+        assert replica.next_expiry() is None
+        for call in (
+            lambda: replica.order_books,
+            lambda: replica.trading_logic,
+            lambda: replica.expire_orders(),
+            lambda: replica.run_auction([], {}),
+            lambda: replica.extend_history([]),
+        ):
+            with pytest.raises(RuntimeError):
+                call()
+    finally:
+        replica._snapshot.close()
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from conftest import order, company
+from models import Commodity
+from trading_system import TradingSystem
+from price_analytics import PriceAnalytics
+from positions import PositionBook
+
+@pytest.fixture
+def system():
+    trading_system = TradingSystem()
+    price_analytics = PriceAnalytics()
+    position_book = PositionBook(price_analytics.aggregator)
+    trading_system.add_fill_listener(price_analytics.record_fill)
+    trading_system.add_history_listener(price_analytics.record_history)
+    trading_system.add_fill_listener(position_book.record_fill)
+    trading_system.add_history_listener(position_book.record_history)
+    return trading_system, position_book
+
+def test_fills_before_the_declaration_do_not_count(system):
+    trading_system, position_book = system
+    trading_system.add_trade(order("s1", "sell", "A", 40, 10))
+    trading_system.add_trade(order("b1", "buy", "B", 40, 10))
+
+    trading_system.add_company(company("A", ("Gas", "surplus", 100)))
+    trading_system.add_company(company("B", ("Gas", "deficit", 30)))
+
+    assert position_book.open_amounts(trading_system.companies["A"], trading_system.trade_history) == {Commodity.GAS: 100}
+    assert position_book.open_amounts(trading_system.companies["B"], trading_system.trade_history) == {Commodity.GAS: -30}
+
+def test_fills_after_the_declaration_close_it_without_overshooting(system):
+    trading_system, position_book = system
+    trading_system.add_company(company("A", ("Gas", "surplus", 100), last_active=datetime.now(timezone.utc) - timedelta(seconds=1)))
+    trading_system.add_company(company("B", ("Gas", "deficit", 30), last_active=datetime.now(timezone.utc) - timedelta(seconds=1)))
+    trading_system.add_trade(order("s1", "sell", "A", 40, 10))
+    trading_system.add_trade(order("b1", "buy", "B", 40, 10))
+    history = trading_system.trade_history
+
+    assert position_book.open_amounts(trading_system.companies["A"], history) == {Commodity.GAS: 60}
+    # B bought more than its deficit: closed, not turned into a surplus
+    assert position_book.open_amounts(trading_system.companies["B"], history) == {Commodity.GAS: 0}
+    positions = position_book.positions(trading_system.companies["B"], history)["positions"]
+    assert [(p["bought"], p["open_amount"], p["status"]) for p in positions] == [(40, 0, None)]
+
+def test_undeclared_commodities_have_nothing_open(system):
+    trading_system, position_book = system
+    trading_system.add_company(company("A", last_active=datetime.now(timezone.utc) - timedelta(seconds=1)))
+    trading_system.add_trade(order("s1", "sell", "A", 5, 10, commodity="Heat", unit="GJ"))
+    trading_system.add_trade(order("b1", "buy", "B", 5, 10, commodity="Heat", unit="GJ"))
+
+    assert position_book.open_amounts(trading_system.companies["A"], trading_system.trade_history) == {}
+    positions = position_book.positions(trading_system.companies["A"], trading_system.trade_history)["positions"]
+    assert [(p["commodity"], p["sold"], p["status"]) for p in positions] == [(Commodity.HEAT, 5, None)]
+
+def test_savings_are_the_same_live_and_after_a_restart(system):
+    trading_system, position_book = system
+    # Both fills land in the same hourly bucket, whose mean is 15
+    trading_system.trading_logic.clock = lambda: datetime(2026, 3, 2, 10, 30, tzinfo=timezone.utc)
+    trading_system.add_trade(order("s1", "sell", "A", 5, 10))
+    trading_system.add_trade(order("b1", "buy", "B", 5, 10))
+    trading_system.add_trade(order("s2", "sell", "A", 5, 20))
+    trading_system.add_trade(order("b2", "buy", "C", 5, 20))
+    companies = [company("A"), company("B"), company("C")]
+    live = [position_book.positions(c, trading_system.trade_history)["realized_savings"] for c in companies]
+    assert live == [0.0, 25.0, -25.0]
+
+    restarted = TradingSystem()
+    price_analytics = PriceAnalytics()
+    restored_book = PositionBook(price_analytics.aggregator)
+    restarted.add_history_listener(price_analytics.record_history)
+    restarted.add_history_listener(restored_book.record_history)
+    for store in trading_system.trade_history.partitions():
+        restarted.trade_history.extend_store(store)
+    restarted.restore_history(restarted.trade_history)
+    assert [restored_book.positions(c, restarted.trade_history)["realized_savings"] for c in companies] == live
+
+def test_reads_after_the_first_are_kept_up_to_date_without_the_history(system, monkeypatch):
+    trading_system, position_book = system
+    declared_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    trading_system.add_company(company("A", ("Gas", "surplus", 100), last_active=declared_at))
+    trading_system.add_trade(order("s1", "sell", "A", 10, 10))
+    trading_system.add_trade(order("b1", "buy", "B", 10, 10))
+    history = trading_system.trade_history
+    assert position_book.open_amounts(trading_system.companies["A"], history) == {Commodity.GAS: 90}
+
+    def no_scans(*args, **kwargs):
+        raise AssertionError("open amounts scanned the history")
+    monkeypatch.setattr(history, "query", no_scans)
+    trading_system.add_trade(order("s2", "sell", "A", 15, 10))
+    trading_system.add_trade(order("b2", "buy", "B", 15, 10))
+    assert position_book.open_amounts(trading_system.companies["A"], history) == {Commodity.GAS: 75}
+    monkeypatch.undo()
+
+    # Declaring again starts counting from the new declaration
+    trading_system.add_company(company("A", ("Gas", "surplus", 50)))
+    assert position_book.open_amounts(trading_system.companies["A"], history) == {Commodity.GAS: 50}
@@ -0,0 +1,43 @@
+import pytest
+from pydantic import ValidationError
+from conftest import order
+from trading_system import TradingSystem
+from units import unit_factor, canonical
+
+def test_factors_convert_to_the_canonical_unit():
+    assert unit_factor("Electricity", "MWh") == 1.0
+    assert unit_factor("Electricity", "GJ") == pytest.approx(1 / 3.6)
+    assert unit_factor("Electricity", "kwh") == pytest.approx(0.001)
+    assert unit_factor("Hydrogen", "t") == 1000.0
+    assert unit_factor("Gas", "therm") == pytest.approx(0.1)
+
+def test_units_that_cannot_measure_the_commodity_are_rejected():
+    with pytest.raises(ValueError):
+        unit_factor("Hydrogen", "MWh")
+    with pytest.raises(ValidationError):
+        order("s1", "sell", "A", 5, 10, commodity="Hydrogen", unit="MWh")
+    with pytest.raises(ValidationError):
+        order("s1", "sell", "A", 5, 10, commodity="Gas", unit="litre")
+
+def test_canonical_converts_amount_and_price():
+    trade = canonical(order("s1", "sell", "A", 7.2, 30, commodity="Electricity", unit="GJ"))
+    assert trade.amount.measurement_unit == "MWh"
+    assert trade.amount.value == pytest.approx(2)
+    assert trade.price.value == pytest.approx(108)
+
+def test_orders_in_different_units_match_on_normalized_prices():
+    trading_system = TradingSystem()
+    # 100 EUR/MWh is 27.78 EUR/GJ, so a bid of 28 EUR/GJ crosses it and one of 27 does not
+    trading_system.add_trade(order("s1", "sell", "A", 2, 100, commodity="Electricity", unit="MWh"))
+    _, fills = trading_system.add_trade(order("b1", "buy", "B", 3.6, 27, commodity="Electricity", unit="GJ"))
+    assert fills == []
+    _, fills = trading_system.add_trade(order("b2", "buy", "C", 3.6, 28, commodity="Electricity", unit="GJ"))
+
+    assert [(fill.quantity, fill.price) for fill in fills] == [(pytest.approx(1), 100)]
+    # Remaining amounts are shown in each order's own unit
+    assert [(trade.id, trade.amount.value, trade.amount.measurement_unit) for trade in trading_system.get_offers()] == [
+        ("s1", pytest.approx(1), "MWh")
+    ]
+    assert [(trade.id, trade.amount.value, trade.amount.measurement_unit) for trade in trading_system.get_requests()] == [
+        ("b1", 3.6, "GJ")
+    ]
@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from models import Trade, Company, Commodity
+from trade_store import TradeStore
+
+class TradeJournal:
+    """Append-only write-ahead journal of TradingSystem mutations with snapshots.
+
+    Every mutation is written to journal.log as one JSON line tagged with a
+    sequence number before it is applied. Every `snapshot_every` records the
+    whole state is written to a snapshot directory (hot history partitions
+    and resting orders as NumPy column files, companies as JSON) and the
+    journal is truncated, so a restart loads one snapshot and replays a
+    bounded tail. Cold history partitions are only referenced by their
+    segment files, which are never rewritten.
+    """
+
+    def __init__(self, directory, snapshot_every: int = 10000, fsync: bool = False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.journal_path = self.directory / "journal.log"
+        self.snapshot_path = self.directory / "snapshot"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.seq = 0
+        self._since_snapshot = 0
+        self._file = None
+        self._trading_system = None
+
+    def attach(self, trading_system) -> None:
+        """Start journaling every mutation made through the trading system"""
+        if self._file is None:
+            self._file = open(self.journal_path, "a")
+        self._trading_system = trading_system
+        trading_system.journal = self
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def record_trade(self, trade: Trade) -> None:
+        self._append("trade", trade.model_dump(mode="json"))
+
+    def record_batch(self, trades: List[Trade]) -> None:
+        self._append("batch", [trade.model_dump(mode="json") for trade in trades])
+
+    def record_auction(self, orders: List[Trade], reference_prices: Dict[Commodity, float]) -> None:
+        self._append("auction", {
+            "orders": [trade.model_dump(mode="json") for trade in orders],
+            "reference_prices": {commodity.value: price for commodity, price in reference_prices.items()},
+        })
+
+    def record_company(self, company: Company) -> None:
+        self._append("company", company.model_dump(mode="json"))
+
+    def record_company_removal(self, name: str) -> None:
+        self._append("remove_company", name)
+
+    def _append(self, op: str, data) -> None:
+        # Records before this one are all applied, so this is a consistent point to snapshot
+        if self._since_snapshot >= self.snapshot_every and self._trading_system:
+            self.snapshot(self._trading_system)
+
+        self.seq += 1
+        # Commands pin the clock while they run, so this is the time their fills are stamped with
+        now = self._trading_system.trading_logic.clock() if self._trading_system else datetime.now(timezone.utc)
+        record = {"seq": self.seq, "op": op, "time": now.isoformat(), "data": data}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._since_snapshot += 1
+
+    def snapshot(self, trading_system) -> None:
+        """Write the current state to a fresh snapshot and truncate the journal"""
+        start = time.perf_counter()
+        staging = self.directory / "snapshot.tmp"
+        previous = self.directory / "snapshot.old"
+        if staging.exists():
+            shutil.rmtree(staging)
+
+        trading_system.trade_history.save(staging / "history")
+        orders = trading_system.get_offers() + trading_system.get_requests()
+        book = TradeStore()
+        book.extend(orders)
+        book.save(staging / "book")
+        state = {
+            "seq": self.seq,
+            "companies": [company.model_dump(mode="json") for company in trading_system.get_all_companies()],
+            # The book columns have no expiry, so it is kept here by order id
+            "expiries": {trade.id: trade.expires_at.isoformat() for trade in orders if trade.expires_at},
+        }
+        (staging / "state.json").write_text(json.dumps(state))
+
+        # Swap directories so a crash always leaves one complete snapshot behind
+        if self.snapshot_path.exists():
+            if previous.exists():
+                shutil.rmtree(previous)
+            self.snapshot_path.rename(previous)
+        staging.rename(self.snapshot_path)
+        if previous.exists():
+            shutil.rmtree(previous)
+        # Only the new snapshot is left, and it refers to current segments only
+        trading_system.trade_history.release_segments()
+
+        if self._file:
+            self._file.close()
+        self._file = open(self.journal_path, "w")
+        self._since_snapshot = 0
+        print(f"Snapshot at seq {self.seq} written in {time.perf_counter() - start:.3f}s")
+
+    def _latest_snapshot(self) -> Optional[Path]:
+        for path in (self.snapshot_path, self.directory / "snapshot.old"):
+            if (path / "state.json").exists():
+                return path
+        return None
+
+    def recover(self, trading_system) -> bool:
+        """Restore state from the latest snapshot plus the journal tail.
+
+        Returns False when there is nothing on disk yet. Must be called before
+        attach so replayed mutations are not journaled a second time.
+        """
+        start = time.perf_counter()
+        snapshot = self._latest_snapshot()
+        has_journal = self.journal_path.exists() and self.journal_path.stat().st_size > 0
+        if snapshot is None and not has_journal:
+            return False
+
+        if snapshot is not None:
+            state = json.loads((snapshot / "state.json").read_text())
+            self.seq = state["seq"]
+            for company_data in state["companies"]:
+                company = Company.model_validate(company_data)
+                trading_system.companies[company.name] = company
+            # Loaded in place so the archive keeps its segment directory and hot window
+            trading_system.trade_history.load(snapshot / "history")
+            trading_system.restore_history(trading_system.trade_history)
+            # Orders were saved in priority order, so re-adding them keeps time priority
+            expiries = state.get("expiries", {})
+            for trade in TradeStore.load(snapshot / "book"):
+                if trade.id in expiries:
+                    trade = trade.model_copy(update={"expires_at": datetime.fromisoformat(expiries[trade.id])})
+                trading_system.order_books[trade.commodity].add(trade)
+
+        replayed = self._replay(trading_system) if has_journal else 0
+        self._since_snapshot = replayed
+        print(
+            f"Recovered {len(trading_system.trade_history)} historical trades and "
+            f"replayed {replayed} journal records in {time.perf_counter() - start:.3f}s"
+        )
+        return True
+
+    def _replay(self, trading_system) -> int:
+        logic = trading_system.trading_logic
+        clock = logic.clock
+        replayed = 0
+        good_offset = 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    # A line without a newline is a write torn by a crash
+                    if not line.endswith(b"\n"):
+                        break
+                    record = json.loads(line)
+                    good_offset += len(line)
+                    if record["seq"] <= self.seq:
+                        continue
+
+                    recorded_at = datetime.fromisoformat(record["time"])
+                    logic.clock = lambda: recorded_at
+                    if record["op"] == "trade":
+                        trading_system.add_trade(Trade.model_validate(record["data"]))
+                    elif record["op"] == "batch":
+                        trading_system.add_trades([Trade.model_validate(data) for data in record["data"]])
+                    elif record["op"] == "auction":
+                        trading_system.run_auction(
+                            [Trade.model_validate(data) for data in record["data"]["orders"]],
+                            {Commodity(name): price for name, price in record["data"]["reference_prices"].items()}
+                        )
+                    elif record["op"] == "company":
+                        trading_system.add_company(Company.model_validate(record["data"]))
+                    elif record["op"] == "remove_company":
+                        trading_system.remove_company(record["data"])
+                    self.seq = record["seq"]
+                    replayed += 1
+        finally:
+            logic.clock = clock
+
+        with open(self.journal_path, "r+b") as f:
+            f.truncate(good_offset)
+        return replayed
@@ -0,0 +1,366 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from models import Trade, Amount, Price, Commodity, TradeType, TradeStatus
+from fills import Fill
+
+COMMODITIES = list(Commodity)
+TRADE_TYPES = list(TradeType)
+TRADE_STATUSES = list(TradeStatus)
+COMMODITY_CODES = {commodity: code for code, commodity in enumerate(COMMODITIES)}
+TRADE_TYPE_CODES = {trade_type: code for code, trade_type in enumerate(TRADE_TYPES)}
+TRADE_STATUS_CODES = {status: code for code, status in enumerate(TRADE_STATUSES)}
+
+# Stored in the time column for trades without a timestamp
+NO_TIME = np.iinfo(np.int64).min
+
+def to_epoch_us(time: Optional[datetime]) -> int:
+    """Microseconds since the epoch; naive datetimes are taken as local time"""
+    if time is None:
+        return NO_TIME
+    return int(round(time.timestamp() * 1_000_000))
+
+def from_epoch_us(epoch_us: int) -> Optional[datetime]:
+    if epoch_us == NO_TIME:
+        return None
+    return datetime.fromtimestamp(epoch_us / 1_000_000, timezone.utc)
+
+class Categories:
+    """Interns repeated strings such as company names as small integer codes"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int:
+        """Code of an existing value, or -1 if it has never been stored"""
+        return self._codes.get(value, -1)
+
+    def value(self, code: int) -> Optional[str]:
+        return self.values[code] if code >= 0 else None
+
+class TradeStore:
+    """Columnar trade history backed by NumPy arrays.
+
+    Timestamps are int64 epoch microseconds, enums and strings are stored as
+    integer codes and price/amount as float64. Filters are evaluated as
+    vectorized boolean masks and Trade objects are only built when rows are
+    handed back to the API.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self.ids: List[str] = []
+        self.companies = Categories()
+        self.units = Categories()
+        self.currencies = Categories()
+        self._time = np.empty(capacity, dtype=np.int64)
+        self._commodity = np.empty(capacity, dtype=np.int8)
+        self._type = np.empty(capacity, dtype=np.int8)
+        self._status = np.empty(capacity, dtype=np.int8)
+        self._requester = np.empty(capacity, dtype=np.int32)
+        self._fulfiller = np.empty(capacity, dtype=np.int32)
+        self._price = np.empty(capacity, dtype=np.float64)
+        self._amount = np.empty(capacity, dtype=np.float64)
+        self._unit = np.empty(capacity, dtype=np.int16)
+        self._currency = np.empty(capacity, dtype=np.int16)
+        # Serialized JSON per row, filled in lazily by trades_json
+        self._encoded: List[Optional[bytes]] = []
+
+    _COLUMNS = (
+        "_time", "_commodity", "_type", "_status", "_requester",
+        "_fulfiller", "_price", "_amount", "_unit", "_currency",
+    )
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = len(self._time)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def append(self, trade: Trade) -> int:
+        """Store a trade and return its row number"""
+        self._reserve(1)
+        row = self._size
+        self.ids.append(trade.id)
+        self._time[row] = to_epoch_us(trade.time)
+        self._commodity[row] = COMMODITY_CODES[trade.commodity]
+        self._type[row] = TRADE_TYPE_CODES[trade.type]
+        self._status[row] = TRADE_STATUS_CODES[trade.status]
+        self._requester[row] = self.companies.code(trade.requester_company)
+        self._fulfiller[row] = self.companies.code(trade.fulfiller_company)
+        self._price[row] = trade.price.value
+        self._amount[row] = trade.amount.value
+        self._unit[row] = self.units.code(trade.amount.measurement_unit)
+        self._currency[row] = self.currencies.code(trade.price.currency)
+        self._size += 1
+        return row
+
+    def append_fill(self, fill: Fill) -> int:
+        """Store an execution as one completed row and return its row number.
+
+        The taker is the requester and the maker the fulfiller, the type is
+        the taker's side, and price and amount are what was executed.
+        """
+        self._reserve(1)
+        row = self._size
+        self.ids.append(fill.id)
+        self._time[row] = to_epoch_us(fill.time)
+        self._commodity[row] = COMMODITY_CODES[fill.commodity]
+        self._type[row] = TRADE_TYPE_CODES[fill.taker_side]
+        self._status[row] = TRADE_STATUS_CODES[TradeStatus.COMPLETED]
+        self._requester[row] = self.companies.code(fill.taker_company)
+        self._fulfiller[row] = self.companies.code(fill.maker_company)
+        self._price[row] = fill.price
+        self._amount[row] = fill.quantity
+        self._unit[row] = self.units.code(fill.unit)
+        self._currency[row] = self.currencies.code(fill.currency)
+        self._size += 1
+        return row
+
+    def extend_from(self, other: "TradeStore", rows: np.ndarray) -> int:
+        """Copy rows of another store onto the end of this one and return the first new row.
+
+        Category codes are translated through the value tables, so the two
+        stores do not need to share them.
+        """
+        self._reserve(len(rows))
+        lo = self._size
+        hi = lo + len(rows)
+        for name in ("_time", "_commodity", "_type", "_status", "_price", "_amount"):
+            getattr(self, name)[lo:hi] = getattr(other, name)[rows]
+        for name, categories, other_categories in (
+            ("_requester", self.companies, other.companies),
+            ("_fulfiller", self.companies, other.companies),
+            ("_unit", self.units, other.units),
+            ("_currency", self.currencies, other.currencies),
+        ):
+            # The extra last entry maps the "no value" code -1 to itself
+            mapping = np.array([categories.code(value) for value in other_categories.values] + [-1])
+            getattr(self, name)[lo:hi] = mapping[getattr(other, name)[rows]]
+        self.ids.extend(other.ids[row] for row in rows.tolist())
+        self._size = hi
+        return lo
+
+    def extend(self, trades: List[Trade]) -> None:
+        """Store many trades, filling each column with one slice assignment"""
+        self._reserve(len(trades))
+        lo = self._size
+        hi = lo + len(trades)
+        companies = self.companies.code
+        self.ids.extend(trade.id for trade in trades)
+        self._time[lo:hi] = [to_epoch_us(trade.time) for trade in trades]
+        self._commodity[lo:hi] = [COMMODITY_CODES[trade.commodity] for trade in trades]
+        self._type[lo:hi] = [TRADE_TYPE_CODES[trade.type] for trade in trades]
+        self._status[lo:hi] = [TRADE_STATUS_CODES[trade.status] for trade in trades]
+        self._requester[lo:hi] = [companies(trade.requester_company) for trade in trades]
+        self._fulfiller[lo:hi] = [companies(trade.fulfiller_company) for trade in trades]
+        self._price[lo:hi] = [trade.price.value for trade in trades]
+        self._amount[lo:hi] = [trade.amount.value for trade in trades]
+        self._unit[lo:hi] = [self.units.code(trade.amount.measurement_unit) for trade in trades]
+        self._currency[lo:hi] = [self.currencies.code(trade.price.currency) for trade in trades]
+        self._size = hi
+
+    # Read-only views of the filled part of each column
+    @property
+    def times(self) -> np.ndarray:
+        return self._time[:self._size]
+
+    @property
+    def commodities(self) -> np.ndarray:
+        return self._commodity[:self._size]
+
+    @property
+    def types(self) -> np.ndarray:
+        return self._type[:self._size]
+
+    @property
+    def requesters(self) -> np.ndarray:
+        return self._requester[:self._size]
+
+    @property
+    def fulfillers(self) -> np.ndarray:
+        return self._fulfiller[:self._size]
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._price[:self._size]
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self._amount[:self._size]
+
+    @property
+    def currency_codes(self) -> np.ndarray:
+        return self._currency[:self._size]
+
+    def mask(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        commodity: Optional[Commodity] = None,
+        company: Optional[str] = None,
+        status: Optional[TradeStatus] = None
+    ) -> np.ndarray:
+        """Boolean row mask for the given filters; a company matches either side"""
+        n = self._size
+        mask = np.ones(n, dtype=bool)
+        if start is not None:
+            mask &= self._time[:n] >= to_epoch_us(start)
+        if end is not None:
+            mask &= self._time[:n] < to_epoch_us(end)
+            mask &= self._time[:n] != NO_TIME
+        if commodity is not None:
+            mask &= self._commodity[:n] == COMMODITY_CODES[commodity]
+        if status is not None:
+            mask &= self._status[:n] == TRADE_STATUS_CODES[status]
+        if company is not None:
+            code = self.companies.lookup(company)
+            if code < 0:
+                mask[:] = False
+            else:
+                mask &= (self._requester[:n] == code) | (self._fulfiller[:n] == code)
+        return mask
+
+    def trade(self, row: int) -> Trade:
+        """Build the API model for a single row"""
+        return Trade.model_construct(
+            id=self.ids[row],
+            commodity=COMMODITIES[self._commodity[row]],
+            type=TRADE_TYPES[self._type[row]],
+            amount=Amount.model_construct(
+                value=float(self._amount[row]),
+                measurement_unit=self.units.value(int(self._unit[row]))
+            ),
+            price=Price.model_construct(
+                value=float(self._price[row]),
+                currency=self.currencies.value(int(self._currency[row]))
+            ),
+            status=TRADE_STATUSES[self._status[row]],
+            time=from_epoch_us(int(self._time[row])),
+            requester_company=self.companies.value(int(self._requester[row])),
+            fulfiller_company=self.companies.value(int(self._fulfiller[row]))
+        )
+
+    def trades(self, rows=None) -> List[Trade]:
+        """Trades for a boolean mask or an array of row numbers, or every trade"""
+        if rows is None:
+            rows = range(self._size)
+        elif isinstance(rows, np.ndarray) and rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        return [self.trade(int(row)) for row in rows]
+
+    def trades_json(self, rows=None) -> bytes:
+        """JSON array of the given rows (or every row), as the API would encode them"""
+        return b"[" + b",".join(self.encoded_rows(rows)) + b"]"
+
+    def encoded_rows(self, rows=None) -> List[bytes]:
+        """JSON encoding of each of the given rows (or every row).
+
+        Stored rows never change, so each row is serialized at most once and
+        later responses only join the cached bytes.
+        """
+        encoded = self._encoded
+        if len(encoded) < self._size:
+            encoded.extend([None] * (self._size - len(encoded)))
+        if rows is None:
+            rows = range(self._size)
+        parts = []
+        for row in rows:
+            row = int(row)
+            data = encoded[row]
+            if data is None:
+                data = encoded[row] = self.trade(row).model_dump_json().encode()
+            parts.append(data)
+        return parts
+
+    def save(self, directory: Path) -> None:
+        """Write every column as a .npy file plus the category tables"""
+        directory.mkdir(parents=True, exist_ok=True)
+        n = self._size
+        for name in self._COLUMNS:
+            np.save(directory / f"{name[1:]}.npy", getattr(self, name)[:n])
+        np.save(directory / "ids.npy", np.array(self.ids, dtype=str))
+        meta = {
+            "size": n,
+            "companies": self.companies.values,
+            "units": self.units.values,
+            "currencies": self.currencies.values,
+        }
+        (directory / "meta.json").write_text(json.dumps(meta))
+
+    @classmethod
+    def load(cls, directory: Path) -> "TradeStore":
+        """Read a store written by save.
+
+        The column files are memory-mapped only while they are copied into
+        the store's own arrays, which keep growing as trades are appended.
+        """
+        meta = json.loads((directory / "meta.json").read_text())
+        meta["columns"] = {
+            name[1:]: np.load(directory / f"{name[1:]}.npy", mmap_mode="r")
+            for name in cls._COLUMNS
+        }
+        meta["ids"] = np.load(directory / "ids.npy").tolist() if meta["size"] else []
+        return cls.from_columns(meta)
+
+    def to_columns(self) -> dict:
+        """Column arrays and category tables as plain data, e.g. to send to another process"""
+        n = self._size
+        return {
+            "size": n,
+            "columns": {name[1:]: getattr(self, name)[:n].copy() for name in self._COLUMNS},
+            "ids": list(self.ids),
+            "companies": list(self.companies.values),
+            "units": list(self.units.values),
+            "currencies": list(self.currencies.values),
+        }
+
+    @classmethod
+    def from_columns(cls, data: dict) -> "TradeStore":
+        n = data["size"]
+        store = cls(capacity=max(n, 1024))
+        for name in cls._COLUMNS:
+            getattr(store, name)[:n] = data["columns"][name[1:]]
+        store.ids = list(data["ids"])
+        for field in ("companies", "units", "currencies"):
+            categories = getattr(store, field)
+            for value in data[field]:
+                categories.code(value)
+        store._size = n
+        return store
+
+    def partitions(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        commodity: Optional[Commodity] = None,
+        company: Optional[str] = None
+    ) -> Iterator["TradeStore"]:
+        """The store as its own single partition, so it can stand in for a HistoryArchive"""
+        yield self
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Trade]:
+        for row in range(self._size):
+            yield self.trade(row)
@@ -1,107 +1,236 @@
-from datetime import datetime
-from typing import List
-from models import Trade, TradeStatus
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+from models import TradeType
+from fills import Fill
+from order_book import BookEntry
+from units import canonical_unit
+from metrics import COUNT_BUCKETS
 
-class TradingLogic:
-    def __init__(self, led_controller=None):
-        self.led_controller = led_controller
-
-    def sort_request_list(self, requests: List[Trade]) -> List[Trade]:
-        """Sort requests by price in descending order (highest first)"""
-        return sorted(requests, key=lambda x: x.price.value, reverse=True)
-
-    def sort_offer_list(self, offers: List[Trade]) -> List[Trade]:
-        """Sort offers by price in ascending order (lowest first)"""
-        return sorted(offers, key=lambda x: x.price.value)
-
-    def check_compatible_trades(self, trading_system) -> None:
-        """Match compatible trades and update their status"""
-        sorted_requests = self.sort_request_list(trading_system.requests)
-        sorted_offers = self.sort_offer_list(trading_system.offers)
+# Remaining amounts at or below this are rounding residue from pro-rata splits
+DUST = 1e-9
 
-        # Update the main lists with sorted versions
-        trading_system.requests = sorted_requests
-        trading_system.offers = sorted_offers
-
-        offers_to_remove = set()
-        requests_to_remove = set()
+# How an incoming order is shared between resting orders at the same price
+ALLOCATIONS = ("fifo", "pro_rata")
 
+class TradingLogic:
+    def __init__(self, led_controller=None, market_feed=None, metrics=None, allocation: str = "fifo"):
+        if allocation not in ALLOCATIONS:
+            raise ValueError(f"Unknown allocation {allocation!r}, expected one of {', '.join(ALLOCATIONS)}")
+        self.led_controller = led_controller
+        self.market_feed = market_feed
+        self.metrics = metrics
+        self.allocation = allocation
+        if metrics:
+            metrics.histogram("siphon_matching_pass_seconds", "Time spent matching one incoming order")
+            metrics.histogram(
+                "siphon_matching_pairs_examined",
+                "Resting orders looked at while matching one incoming order",
+                buckets=COUNT_BUCKETS
+            )
+        # Source of completion timestamps; pinned while a journaled command runs or is replayed
+        self.clock = lambda: datetime.now(timezone.utc)
+
+    def check_compatible_trades(self, trading_system, taker: BookEntry) -> List[Fill]:
+        """Match an incoming order against the top of the opposite side of its order book.
+
+        Resting orders are filled in price-time priority, or pro rata to their
+        remaining amounts within each price level, until the incoming order is
+        filled or the best opposite price no longer crosses. Orders from the
+        same company are skipped and put back with their original priority
+        afterwards. Returns the fills in the order they were executed.
+        """
+        start = time.perf_counter()
+        pairs = 0
+        fills = []
+        book = trading_system.order_books[taker.commodity]
+        opposite = book.opposite_side(taker.side)
+        company = taker.company
+        skipped = []
+
+        while taker.pending and opposite.crosses(taker.unit_price):
+            if self.allocation == "pro_rata":
+                level = self._pop_level(opposite, company, skipped)
+                pairs += len(level)
+                if level:
+                    fills.extend(self._allocate_pro_rata(trading_system, book, opposite, taker, level))
+                continue
 
-        for offer in sorted_offers:
-            if offer in offers_to_remove:
+            pairs += 1
+            maker = opposite.peek()
+            if maker.company == company:
+                skipped.append(opposite.pop())
                 continue
 
-            for request in sorted_requests:
-                if request in requests_to_remove:
-                    continue
-
-                # Check if commodities match
-                if offer.commodity != request.commodity:
-                    continue
-
-                # Check if price is compatible
-                if request.price.value / request.amount.value < offer.price.value / offer.amount.value:
-                    continue
-
-                if offer.requester_company == request.requester_company:
-                    continue
-
-                if offer.status == TradeStatus.COMPLETED or request.status == TradeStatus.COMPLETED:
-                    continue
-
-                current_time = datetime.now()
-
-                # Handle matching based on amounts
-                if offer.amount.value > request.amount.value:
-                    # Complete the request
-                    request.status = TradeStatus.COMPLETED
-                    request.time = current_time
-                    trading_system.trade_history.append(request)
-                    requests_to_remove.add(request)
-                    
-                    # Update offer amount
-                    offer.amount.value -= request.amount.value
-                    # offer.price.value = offer.price.value * (offer.amount.value - request.amount.value) / offer.amount.value
-
-                    # Visualize the trade
-                    if self.led_controller:
-                        self.led_controller.visualize_trade(offer, request)
-
-                elif request.amount.value > offer.amount.value:
-                    # Complete the offer
-                    offer.status = TradeStatus.COMPLETED
-                    offer.time = current_time
-                    trading_system.trade_history.append(offer)
-                    offers_to_remove.add(offer)
-                    
-                    # Update request amount
-                    request.amount.value -= offer.amount.value
-                    # request.price.value = request.price.value * (request.amount.value - offer.amount.value) / request.amount.value
-
-                    # Visualize the trade
-                    if self.led_controller:
-                        self.led_controller.visualize_trade(offer, request)
-
-                else:  # Equal amounts
-                    # Complete both trades
-                    offer.status = TradeStatus.COMPLETED
-                    request.status = TradeStatus.COMPLETED
-                    offer.time = current_time
-                    request.time = current_time
-                    trading_system.trade_history.extend([offer, request])
-                    offers_to_remove.add(offer)
-                    requests_to_remove.add(request)
-
-                    # Visualize the trade
-                    if self.led_controller:
-                        self.led_controller.visualize_trade(offer, request)
-
-        # Remove completed trades from original lists
-        trading_system.offers = [
-            offer for offer in trading_system.offers 
-            if offer not in offers_to_remove
-        ]
-        trading_system.requests = [
-            request for request in trading_system.requests 
-            if request not in requests_to_remove
-        ]
\ No newline at end of file
+            fills.append(self._execute(trading_system, taker, maker, min(taker.remaining, maker.remaining)))
+            if not maker.pending:
+                opposite.pop()
+                book.remove(maker)
+
+        for entry in skipped:
+            opposite.push(entry)
+
+        if self.metrics:
+            self.metrics.observe("siphon_matching_pass_seconds", time.perf_counter() - start)
+            self.metrics.observe("siphon_matching_pairs_examined", pairs)
+        return fills
+
+    @staticmethod
+    def _pop_level(side, company: str, skipped: List[BookEntry]) -> List[BookEntry]:
+        """Take every order at the best price off a side, setting aside the given company's"""
+        price = side.peek().unit_price
+        level = []
+        while True:
+            entry = side.peek()
+            if entry is None or entry.unit_price != price:
+                return level
+            side.pop()
+            (skipped if entry.company == company else level).append(entry)
+
+    def _allocate_pro_rata(self, trading_system, book, side, taker: BookEntry, level: List[BookEntry]) -> List[Fill]:
+        """Split the taker's amount over one price level in proportion to each order's remaining amount.
+
+        When the level holds less than the taker wants every order in it is
+        filled completely. Otherwise the last order in time priority gets
+        whatever rounding left over, so the fills add up to the taker's amount.
+        """
+        total = sum(maker.remaining for maker in level)
+        wanted = taker.remaining
+        allocated = 0.0
+        fills = []
+        for index, maker in enumerate(level):
+            if wanted >= total:
+                quantity = maker.remaining
+            elif index == len(level) - 1:
+                quantity = min(maker.remaining, wanted - allocated)
+            else:
+                quantity = wanted * maker.remaining / total
+            if quantity > 0:
+                allocated += quantity
+                fills.append(self._execute(trading_system, taker, maker, quantity))
+            if maker.pending:
+                side.push(maker)
+            else:
+                book.remove(maker)
+        return fills
+
+    def match_book(self, trading_system, book) -> None:
+        """Uncross a whole order book in one pass, e.g. after a batch insert.
+
+        While the best bid and ask cross, the newer of the two is taken out and
+        matched as if it had just arrived. If it is still pending afterwards it
+        only crosses orders from its own company, so it is set aside until the
+        pass ends.
+        """
+        set_aside = []
+        while True:
+            bid = book.bids.peek()
+            ask = book.asks.peek()
+            if bid is None or ask is None or bid.unit_price < ask.unit_price:
+                break
+
+            side = book.bids if bid.seq > ask.seq else book.asks
+            entry = side.pop()
+            self.check_compatible_trades(trading_system, entry)
+            if entry.pending:
+                set_aside.append((side, entry))
+            else:
+                book.remove(entry)
+
+        for side, entry in set_aside:
+            side.push(entry)
+
+    def uncross_at(self, trading_system, book, price: float) -> List[Fill]:
+        """Execute every crossing order in a book at one uniform price, e.g. to clear a call auction.
+
+        Bids at or above the price are paired with asks at or below it in
+        price-time priority, the newer order of each pair being the taker,
+        until one side runs out. Orders from the same company are never
+        paired. The clearing price does not know about that, so orders of
+        different companies can still cross afterwards; those are then
+        matched at the maker's price until no such cross is left.
+        """
+        fills = self._walk(trading_system, book, price)
+        return fills + self._walk(trading_system, book, None)
+
+    def _walk(self, trading_system, book, price: Optional[float]) -> List[Fill]:
+        """Pair crossing bids and asks once in priority order, at `price` or else at the maker's price.
+
+        Each bid skips past its own company's asks to the best eligible one;
+        the skipped asks stay available to the bids after it. A bid that only
+        crosses its own company's asks is set aside and put back at the end.
+        """
+        fills = []
+        set_aside = []
+        while True:
+            bid = book.bids.peek()
+            if bid is None or (price is not None and bid.unit_price < price):
+                break
+            limit = bid.unit_price if price is None else price
+            skipped = []
+            ask = book.asks.peek()
+            while ask is not None and ask.unit_price <= limit and ask.company == bid.company:
+                skipped.append(book.asks.pop())
+                ask = book.asks.peek()
+            if ask is None or ask.unit_price > limit:
+                if not skipped:
+                    break
+                set_aside.append(book.bids.pop())
+            else:
+                taker, maker = (bid, ask) if bid.seq > ask.seq else (ask, bid)
+                fills.append(self._execute(trading_system, taker, maker, min(bid.remaining, ask.remaining), price))
+                for side, entry in ((book.bids, bid), (book.asks, ask)):
+                    if not entry.pending:
+                        side.pop()
+                        book.remove(entry)
+            for entry in skipped:
+                book.asks.push(entry)
+
+        for entry in set_aside:
+            book.bids.push(entry)
+        return fills
+
+    def _execute(self, trading_system, taker: BookEntry, maker: BookEntry, quantity: float, price: Optional[float] = None) -> Fill:
+        """Trade `quantity` canonical units between two orders and record the fill.
+
+        The price is the maker's unless a uniform auction price is given.
+        """
+        current_time = self.clock()
+        book = trading_system.order_books[taker.commodity]
+        for entry in (taker, maker):
+            book.fill(entry, quantity)
+            if entry.remaining <= DUST:
+                book.fill(entry, entry.remaining)
+                entry.completed_at = current_time
+
+        fill = Fill(
+            id=f"{taker.id}:{maker.id}",
+            commodity=taker.commodity,
+            price=maker.unit_price if price is None else price,
+            quantity=quantity,
+            maker_order_id=maker.id,
+            taker_order_id=taker.id,
+            maker_company=maker.company,
+            taker_company=taker.company,
+            taker_side=taker.side,
+            unit=canonical_unit(taker.commodity),
+            currency=maker.currency,
+            time=current_time
+        )
+        trading_system.record_fill(fill)
+
+        # Publish the fill and the new state of both orders
+        if self.market_feed and self.market_feed.active:
+            self.market_feed.publish("fill", fill.to_dict())
+            for entry in (taker, maker):
+                event = "partial_fill" if entry.pending else "order_completed"
+                self.market_feed.publish(event, entry.to_dict(), key=("order", entry.id))
+
+        # Visualize the trade
+        if self.led_controller:
+            if taker.side == TradeType.SELL:
+                self.led_controller.visualize_trade(taker.company, maker.company)
+            else:
+                self.led_controller.visualize_trade(maker.company, taker.company)
+
+        return fill
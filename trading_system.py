@@ -1,26 +1,267 @@
-from typing import List, Dict, Optional
-from models import Trade, Company, TradeType, TradeStatus, Commodity
+from functools import wraps
+from typing import Callable, List, Dict, Optional, Tuple, Union
+import orjson
+from models import Trade, Company, TradeStatus, Commodity
 from trading_logic import TradingLogic
 from led_controller import LEDController
+from market_feed import MarketFeed
+from order_book import OrderBook, BookEntry
+from fills import Fill
+from units import canonical, canonical_unit
+from trade_store import TradeStore
+from history_archive import HistoryArchive
+from metrics import Metrics
+from auction import MATCHING_MODES, clearing_price
+
+def pinned_clock(method):
+    """Run a journaled mutation with the clock read once.
+
+    Fills, expiries and the journal record all see that one time, and replay
+    pins the clock to the recorded time, so a replayed command runs exactly
+    as it did live.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        logic = self.trading_logic
+        clock = logic.clock
+        now = clock()
+        logic.clock = lambda: now
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            logic.clock = clock
+    return wrapper
 
 class TradingSystem:
-    def __init__(self, led_controller: Optional[LEDController] = None):
-        self.offers: List[Trade] = []
-        self.requests: List[Trade] = []
-        self.trade_history: List[Trade] = []
+    def __init__(self, led_controller: Optional[LEDController] = None, market_feed: Optional[MarketFeed] = None, metrics: Optional[Metrics] = None, allocation: str = "fifo", history: Optional[HistoryArchive] = None, matching: str = "continuous"):
+        if matching not in MATCHING_MODES:
+            raise ValueError(f"Unknown matching mode {matching!r}, expected one of {', '.join(MATCHING_MODES)}")
+        self.matching = matching
+        self.order_books: Dict[Commodity, OrderBook] = {
+            commodity: OrderBook(commodity) for commodity in Commodity
+        }
+        self.trade_history = history if history is not None else HistoryArchive()
         self.companies: Dict[str, Company] = {}
-        self.trading_logic = TradingLogic(led_controller=led_controller)
+        self.market_feed = market_feed
+        self.trading_logic = TradingLogic(led_controller=led_controller, market_feed=market_feed, metrics=metrics, allocation=allocation)
+        self.fill_listeners: List[Callable[[Fill], None]] = []
+        self.history_listeners: List[Callable[[TradeStore, int], None]] = []
+        # Optional TradeJournal that every mutation is written to before it is applied
+        self.journal = None
+        # Optional CallAuction that generates orders for call_auction
+        self.auction = None
+
+    @pinned_clock
+    def add_trade(self, trade: Trade) -> Tuple[Trade, List[Fill]]:
+        """Match or record a trade.
+
+        Returns the order as it stands afterwards (remaining amount, and
+        status and time once completed) together with the fills it took part
+        in. The passed Trade itself is left untouched. In auction mode pending
+        orders only rest in the book until the next auction. An order that
+        has already expired is not matched or rested at all.
+        """
+        if self.journal:
+            self.journal.record_trade(trade)
+        if trade.status != TradeStatus.PENDING:
+            self.record_trade(trade)
+            return trade, []
+        # Expired orders must never trade, even if the eviction task has not run yet
+        now = self.expire_orders([trade.commodity])
+        if self._expired(trade, now):
+            return trade, []
+        if self.matching == "auction":
+            self.order_books[trade.commodity].add(trade)
+            self._publish_order_added(trade)
+            return trade, []
+
+        # Match against the opposite side before resting the remainder
+        entry = BookEntry(trade, -1)
+        fills = self.trading_logic.check_compatible_trades(self, entry)
+        order = entry.view(trade)
+        if entry.pending:
+            self.order_books[trade.commodity].rest(entry)
+            self._publish_order_added(order)
+        return order, fills
 
-    def add_trade(self, trade: Trade) -> None:
-        if trade.status == TradeStatus.PENDING:
-            if trade.type == TradeType.SELL:
-                self.offers.append(trade)
+    @pinned_clock
+    def add_trades(self, trades: List[Trade]) -> List[dict]:
+        """Insert a batch of trades and run one matching pass per affected commodity.
+
+        Returns one result per trade: "recorded" for completed history,
+        "expired" for orders whose expiry had already passed, otherwise
+        "filled", "partially_filled" or "resting" with the amount left in the
+        book.
+        """
+        if self.journal:
+            self.journal.record_batch(trades)
+
+        now = self.expire_orders({trade.commodity for trade in trades if trade.status == TradeStatus.PENDING})
+        entries: List[Optional[BookEntry]] = []
+        touched = set()
+        for trade in trades:
+            if trade.status != TradeStatus.PENDING:
+                self.record_trade(trade)
+                entries.append(None)
+            elif self._expired(trade, now):
+                entries.append(None)
             else:
-                self.requests.append(trade)
-            # Check for compatible trades after adding a new one
-            self.trading_logic.check_compatible_trades(self)
-        else:
-            self.trade_history.append(trade)
+                entries.append(self.order_books[trade.commodity].add(trade))
+                touched.add(trade.commodity)
+
+        if self.matching == "continuous":
+            for commodity in touched:
+                self.trading_logic.match_book(self, self.order_books[commodity])
+
+        results = []
+        for trade, entry in zip(trades, entries):
+            if entry is None and trade.status == TradeStatus.PENDING:
+                status, remaining = "expired", trade.amount.value
+            elif entry is None:
+                status, remaining = "recorded", 0
+            elif entry.pending:
+                order = entry.view(trade)
+                self._publish_order_added(order)
+                status = "partially_filled" if entry.remaining < entry.quantity else "resting"
+                remaining = order.amount.value
+            else:
+                status, remaining = "filled", 0
+            results.append({"id": trade.id, "status": status, "remaining": remaining})
+        return results
+
+    @pinned_clock
+    def run_auction(self, orders: List[Trade], reference_prices: Dict[Commodity, float]) -> List[dict]:
+        """Clear every order book at one uniform price per commodity.
+
+        `orders` take part in this auction only: they are added to the books
+        first and whatever is left of them afterwards is withdrawn. The
+        reference price of a commodity settles the clearing price when several
+        prices would execute the same volume. Returns the clearing price,
+        executed volume and fill count per commodity, with no price where
+        nothing crossed. Fills that only became possible because self-trade
+        prevention kept the uniform pass from reaching them execute at the
+        maker's price instead.
+        """
+        if self.journal:
+            self.journal.record_auction(orders, reference_prices)
+        self.expire_orders()
+        for trade in orders:
+            self.order_books[trade.commodity].add(trade)
+
+        results = []
+        for commodity, book in self.order_books.items():
+            cleared = clearing_price(
+                [(price, amount) for price, amount, _ in book.bids.depth()],
+                [(price, amount) for price, amount, _ in book.asks.depth()],
+                reference_prices.get(commodity)
+            )
+            price, fills = None, []
+            if cleared:
+                price = cleared[0]
+                fills = self.trading_logic.uncross_at(self, book, price)
+            results.append({
+                "commodity": commodity,
+                "price": price,
+                "volume": sum(fill.quantity for fill in fills),
+                "fills": len(fills)
+            })
+            if fills and self.market_feed and self.market_feed.active:
+                self.market_feed.publish("auction", dict(results[-1], commodity=commodity.value, unit=canonical_unit(commodity)))
+
+        for trade in orders:
+            self.order_books[trade.commodity].cancel(trade.id)
+        return results
+
+    def call_auction(self) -> List[dict]:
+        """Run the attached CallAuction, or clear the resting orders alone without one"""
+        if self.auction is None:
+            return self.run_auction([], {})
+        return self.auction.run()
+
+    def expire_orders(self, commodities=None) -> float:
+        """Withdraw the resting orders whose expiry has passed and publish an order_expired event for each.
+
+        Only the given commodities' books are checked, or all of them.
+        Returns the time checked against, in epoch seconds. Books with nothing
+        due cost a single comparison.
+        """
+        now = self.trading_logic.clock().timestamp()
+        for commodity in self.order_books if commodities is None else commodities:
+            for trade in self.order_books[commodity].expire(now):
+                self._publish_order_expired(trade)
+        return now
+
+    def next_expiry(self) -> Optional[float]:
+        """Epoch seconds at which expire_orders may next have something to do"""
+        expiries = [expiry for expiry in (book.next_expiry() for book in self.order_books.values()) if expiry is not None]
+        return min(expiries) if expiries else None
+
+    def _expired(self, trade: Trade, now: float) -> bool:
+        if trade.expires_at is None or trade.expires_at.timestamp() > now:
+            return False
+        self._publish_order_expired(trade)
+        return True
+
+    def _publish_order_expired(self, trade: Trade) -> None:
+        if self.market_feed and self.market_feed.active:
+            self.market_feed.publish("order_expired", trade.model_dump(mode="json"), key=("order", trade.id))
+
+    def _publish_order_added(self, trade: Trade) -> None:
+        if self.market_feed and self.market_feed.active:
+            self.market_feed.publish("order_added", trade.model_dump(mode="json"), key=("order", trade.id))
+
+    def record_fill(self, fill: Fill) -> None:
+        """Append an execution to the history and notify listeners"""
+        self.trade_history.append_fill(fill)
+        for listener in self.fill_listeners:
+            listener(fill)
+
+    def record_trade(self, trade: Trade) -> None:
+        """Record a trade that was submitted as already completed"""
+        self.record_fill(Fill.from_trade(trade))
+
+    def add_fill_listener(self, listener: Callable[[Fill], None]) -> None:
+        self.fill_listeners.append(listener)
+
+    def restore_history(self, history: Union[TradeStore, HistoryArchive]) -> None:
+        """Replace the history wholesale and notify history listeners.
+
+        Pass a TradeStore to replace the archive's contents with it, or the
+        archive itself after loading it in place, e.g. from a snapshot.
+        Listeners are called once per partition, so a cold partition is only
+        read back while it is being handed to them.
+        """
+        if history is not self.trade_history:
+            self.trade_history.clear()
+            self.trade_history.extend_store(history)
+        for store in self.trade_history.partitions():
+            for listener in self.history_listeners:
+                listener(store, 0)
+
+    def extend_history(self, trades: List[Trade]) -> None:
+        """Bulk-append completed trades without matching, stored in canonical units.
+
+        History listeners are told once which rows are new instead of fill
+        listeners being called for every trade.
+        """
+        if self.journal:
+            self.journal.record_batch(trades)
+        batch = TradeStore(capacity=max(len(trades), 1))
+        batch.extend([canonical(trade) for trade in trades])
+        self.trade_history.extend_store(batch)
+        for listener in self.history_listeners:
+            listener(batch, 0)
+
+    def add_history_listener(self, listener: Callable[[TradeStore, int], None]) -> None:
+        self.history_listeners.append(listener)
+
+    @property
+    def offers(self) -> List[Trade]:
+        return [trade for book in self.order_books.values() for trade in book.asks.trades()]
+
+    @property
+    def requests(self) -> List[Trade]:
+        return [trade for book in self.order_books.values() for trade in book.bids.trades()]
 
     def get_offers(self) -> List[Trade]:
         return self.offers
@@ -28,10 +269,60 @@ class TradingSystem:
     def get_requests(self) -> List[Trade]:
         return self.requests
 
+    def offer_dicts(self) -> List[dict]:
+        """Resting offers as JSON-ready dicts, without building a Trade for each"""
+        return [data for book in self.order_books.values() for data in book.asks.dicts()]
+
+    def request_dicts(self) -> List[dict]:
+        """Resting requests as JSON-ready dicts, without building a Trade for each"""
+        return [data for book in self.order_books.values() for data in book.bids.dicts()]
+
+    def get_offers_json(self) -> bytes:
+        return orjson.dumps(self.offer_dicts())
+
+    def get_requests_json(self) -> bytes:
+        return orjson.dumps(self.request_dicts())
+
+    def book_depth(self) -> Dict[Commodity, Dict[str, int]]:
+        """Number of resting orders per commodity and side"""
+        return {
+            commodity: {"bid": len(book.bids), "ask": len(book.asks)}
+            for commodity, book in self.order_books.items()
+        }
+
+    def market_depth(self, commodity: Commodity, levels: Optional[int] = None) -> dict:
+        """Aggregated price levels on both sides of a book, best price first.
+
+        Prices and amounts are per and in the commodity's canonical unit.
+        """
+        book = self.order_books[commodity]
+        return {
+            "commodity": commodity,
+            "unit": canonical_unit(commodity),
+            "bids": [{"price": price, "amount": amount, "orders": orders} for price, amount, orders in book.bids.depth(levels)],
+            "asks": [{"price": price, "amount": amount, "orders": orders} for price, amount, orders in book.asks.depth(levels)],
+        }
+
     def get_trade_history(self) -> List[Trade]:
-        return self.trade_history
+        return self.trade_history.trades()
+
+    def get_trade_history_json(self) -> bytes:
+        """The whole history as a JSON array, reusing each row's cached encoding"""
+        return self.trade_history.trades_json()
+
+    def query_trade_history(self, limit: Optional[int] = None, cursor: Optional[str] = None, **filters) -> Tuple[List[Trade], Optional[str]]:
+        """One page of filtered history in time order and the cursor of the next page"""
+        pages, next_cursor = self.trade_history.query(cursor=cursor, limit=limit, **filters)
+        return [trade for store, rows in pages for trade in store.trades(rows)], next_cursor
+
+    def query_trade_history_json(self, limit: Optional[int] = None, cursor: Optional[str] = None, **filters) -> Tuple[bytes, Optional[str]]:
+        """Same as query_trade_history with the page already encoded as a JSON array"""
+        pages, next_cursor = self.trade_history.query(cursor=cursor, limit=limit, **filters)
+        return b"[" + b",".join(part for store, rows in pages for part in store.encoded_rows(rows)) + b"]", next_cursor
 
     def add_company(self, company: Company) -> None:
+        if self.journal:
+            self.journal.record_company(company)
         self.companies[company.name] = company
 
     def get_company(self, name: str) -> Optional[Company]:
@@ -44,31 +335,25 @@ class TradingSystem:
         """
         Find the lowest offer price and highest request price for a given commodity
         """
-        relevant_offers = [
-            trade for trade in self.offers 
-            if trade.commodity == commodity
-        ]
-        relevant_requests = [
-            trade for trade in self.requests 
-            if trade.commodity == commodity
-        ]
-
-        if not relevant_offers or not relevant_requests:
+        book = self.order_books[commodity]
+        lowest_offer = book.best_ask()
+        highest_request = book.best_bid()
+
+        if not lowest_offer or not highest_request:
             return {
                 "status": "no_match",
                 "lowest_offer": None,
                 "highest_request": None
             }
 
-        lowest_offer = min(relevant_offers, key=lambda x: x.price.value)
-        highest_request = max(relevant_requests, key=lambda x: x.price.value)
-
         return {
-            "status": "match_found" if lowest_offer.price.value <= highest_request.price.value else "no_match",
+            "status": "match_found" if book.asks.best_price() <= book.bids.best_price() else "no_match",
             "lowest_offer": lowest_offer,
             "highest_request": highest_request
         }
 
     def remove_company(self, name: str) -> None:
         if name in self.companies:
+            if self.journal:
+                self.journal.record_company_removal(name)
             del self.companies[name]
\ No newline at end of file
@@ -0,0 +1,68 @@
+from typing import Dict
+
+# Unit every commodity is matched and stored in, keyed by Commodity value
+CANONICAL_UNITS = {
+    "Electricity": "MWh",
+    "Hydrogen": "kg",
+    "Heat": "GJ",
+    "Gas": "MMBtu",
+}
+
+# Size of each accepted unit in GJ (energy) or kg (mass), by lower-cased name
+ENERGY_UNITS = {
+    "kwh": 0.0036,
+    "mwh": 3.6,
+    "gwh": 3600.0,
+    "mj": 0.001,
+    "gj": 1.0,
+    "tj": 1000.0,
+    "therm": 0.1055056,
+    "mmbtu": 1.055056,
+}
+MASS_UNITS = {
+    "g": 0.001,
+    "kg": 1.0,
+    "t": 1000.0,
+    "tonne": 1000.0,
+}
+UNIT_SYSTEMS = {
+    "Electricity": ENERGY_UNITS,
+    "Hydrogen": MASS_UNITS,
+    "Heat": ENERGY_UNITS,
+    "Gas": ENERGY_UNITS,
+}
+
+_factors: Dict[tuple, float] = {}
+
+def canonical_unit(commodity: str) -> str:
+    return CANONICAL_UNITS[commodity]
+
+def unit_factor(commodity: str, unit: str) -> float:
+    """Canonical units in one `unit` of a commodity, e.g. 1/3.6 for Electricity in GJ.
+
+    Amounts are multiplied by the factor and per-unit prices divided by it.
+    Raises ValueError for units that cannot measure the commodity.
+    """
+    key = (commodity, unit)
+    factor = _factors.get(key)
+    if factor is None:
+        system = UNIT_SYSTEMS[commodity]
+        size = system.get(unit.lower())
+        if size is None:
+            raise ValueError(
+                f"{getattr(commodity, 'value', commodity)} cannot be measured in {unit!r}; "
+                f"use one of {', '.join(sorted(system))}"
+            )
+        factor = _factors[key] = size / system[CANONICAL_UNITS[commodity].lower()]
+    return factor
+
+def canonical(trade):
+    """The trade with its amount and per-unit price in the commodity's canonical unit"""
+    factor = unit_factor(trade.commodity, trade.amount.measurement_unit)
+    unit = CANONICAL_UNITS[trade.commodity]
+    if factor == 1.0 and trade.amount.measurement_unit == unit:
+        return trade
+    return trade.model_copy(update={
+        "amount": trade.amount.model_copy(update={"value": trade.amount.value * factor, "measurement_unit": unit}),
+        "price": trade.price.model_copy(update={"value": trade.price.value / factor}),
+    })